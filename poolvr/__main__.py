@@ -62,6 +62,24 @@ def parse_args():
     parser.add_argument('--render-method', metavar='<render method name>',
                         help='OpenGL rendering method/style to use, one of: "ega", "lambert", "billboards", "raycast"',
                         default='lambert')
+    parser.add_argument('--no-instancing',
+                        help='draw each ball and ball shadow with separate draw calls (for the "ega" and "lambert" render methods)',
+                        action='store_true')
+    parser.add_argument('--no-single-pass-stereo',
+                        help='render the VR view by drawing the scene once for each eye, rather than in a single pass for both eyes',
+                        action='store_true')
+    parser.add_argument('--pose-sample-rate', metavar='<rate>', type=float,
+                        help='rate (in Hz) at which VR controller poses are sampled by a background thread (0 to disable); default is 500',
+                        default=500.0)
+    parser.add_argument('--profile',
+                        help='measure CPU and GPU times of the stages of each frame; their rolling percentiles are shown in the window title and logged on exit',
+                        action='store_true')
+    parser.add_argument('--profile-csv', metavar='<file>',
+                        help='write the CPU and GPU times of every frame to the specified CSV file (implies --profile)',
+                        default=None)
+    parser.add_argument('--import-profile', metavar='<file>', nargs='?', const='-', default=None,
+                        help='''on exit, write "python -X importtime"-style timings of all module imports
+                        (including those deferred until first use) to the specified file (default: stderr)''')
     args = parser.parse_args()
     args.msaa = int(args.msaa)
     args.balls_on_table = [int(n) for n in args.balls_on_table.split(',')]
@@ -85,6 +103,20 @@ def parse_args():
 
 def main():
     args = parse_args()
+    import_profiler = None
+    if args.import_profile:
+        from .import_profile import ImportProfiler
+        import_profiler = ImportProfiler()
+        import_profiler.start()
+    try:
+        run(args)
+    finally:
+        if import_profiler is not None:
+            import_profiler.stop()
+            import_profiler.write(args.import_profile)
+
+
+def run(args):
     if args.verbose:
         logging.basicConfig(format=_DEBUG_LOGGING_FORMAT, level=logging.DEBUG)
     else:
@@ -105,6 +137,11 @@ def main():
                     glyphs=args.glyphs,
                     balls_on_table=args.balls_on_table,
                     render_method=args.render_method,
+                    instanced_balls=not args.no_instancing,
+                    single_pass_stereo=not args.no_single_pass_stereo,
+                    pose_sample_rate=args.pose_sample_rate,
+                    profile=args.profile,
+                    profile_csv=args.profile_csv,
                     # use_quartic_solver=args.use_quartic_solver,
                     use_quartic_solver=True,
                     collision_search_time_forward=args.collision_search_time_forward,
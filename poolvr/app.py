@@ -10,15 +10,9 @@ _logger = logging.getLogger('poolvr')
 
 
 from .glfw_app import setup_glfw
-from .gl_rendering import OpenGLRenderer, set_quaternion_from_matrix, set_matrix_from_quaternion
+from .gl_rendering import OpenGLRenderer, set_quaternion_from_matrix
 from .gl_techniques import LAMBERT_TECHNIQUE, EGA_TECHNIQUE
 # from .gl_text import TexturedText
-try:
-    from .pyopenvr_renderer import openvr, OpenVRRenderer
-except ImportError as err:
-    _logger.warning('could not import pyopenvr_renderer:\n%s', err)
-    _logger.warning('\n\n\n**** VR FEATURES ARE NOT AVAILABLE! ****\n\n\n')
-    OpenVRRenderer = None
 from .physics import PoolPhysics
 from .table import PoolTable
 from .cue import PoolCue
@@ -26,14 +20,20 @@ from .game import PoolGame
 from .keyboard_controls import (init_keyboard, set_on_keydown_callback, key_state,
                                 KEY_LEFT, KEY_RIGHT, KEY_W, KEY_S, KEY_A, KEY_D, KEY_Q, KEY_Z)
 from .mouse_controls import init_mouse
-from .sound import init_sound
+from . import sound
+from .sound import init_sound, CollisionSoundScheduler
 from .room import floor_mesh
+from .asset_loader import AssetLoader
+from .frame_scheduler import FrameScheduler
 
 
 KB_TURN_SPEED = 0.5
 KB_MOVE_SPEED = 0.5
 KB_CUE_MOVE_SPEED = 0.2
 KB_CUE_ROTATE_SPEED = 0.1
+SIMULATION_TICK = 1.0 / 240
+POSE_HISTORY_DURATION = 0.03
+PROFILE_REPORT_INTERVAL = 90
 
 
 def main(window_size=(800,600),
@@ -48,11 +48,21 @@ def main(window_size=(800,600),
          balls_on_table=None,
          use_quartic_solver=False,
          render_method='raycast',
+         instanced_balls=True,
+         single_pass_stereo=True,
+         extra_games=(),
+         pose_sample_rate=500.0,
+         profile=False,
+         profile_csv=None,
          **kwargs):
     """
     The main routine.
 
     Performs initializations/setups; starts the render loop; performs shutdowns on exit.
+
+    :param extra_games: :ref:`PoolGame`s (e.g. replays) to show on additional tables beside the player's
+                        (for the "ega" and "lambert" render methods with instanced balls) -- they are
+                        stepped along with the player's game, but are otherwise driven by the caller
     """
     _logger.debug('configuration:\n%s',
                   '\n'.join('%s: %s' % it for it in
@@ -61,17 +71,25 @@ def main(window_size=(800,600),
                                            double_buffered=novr,
                                            multisample=multisample,
                                            fullscreen=fullscreen)
-    if not novr and OpenVRRenderer is not None:
+    renderer = fallback_renderer
+    if not novr:
+        # the VR modules (and openvr) are only imported when VR is requested:
         try:
-            renderer = OpenVRRenderer(window_size=window_size, multisample=multisample)
-            renderer.init_gl()
-            global _window_renderer
-            _window_renderer = renderer
-        except Exception as err:
-            renderer = fallback_renderer
-            _logger.error('could not initialize OpenVRRenderer: %s', err)
-    else:
-        renderer = fallback_renderer
+            from .pyopenvr_renderer import openvr, OpenVRRenderer
+        except ImportError as err:
+            _logger.warning('could not import pyopenvr_renderer:\n%s', err)
+            _logger.warning('\n\n\n**** VR FEATURES ARE NOT AVAILABLE! ****\n\n\n')
+        else:
+            try:
+                renderer = OpenVRRenderer(window_size=window_size, multisample=multisample,
+                                          single_pass_stereo=single_pass_stereo)
+                renderer.init_gl()
+                global _window_renderer
+                _window_renderer = renderer
+            except Exception as err:
+                renderer = fallback_renderer
+                _logger.error('could not initialize OpenVRRenderer: %s', err)
+    vr = renderer is not fallback_renderer
 
     init_sound()
 
@@ -104,28 +122,52 @@ def main(window_size=(800,600),
     cue = PoolCue()
     game.physics.add_cue(cue)
     game.reset(balls_on_table=balls_on_table)
+    # the event-based engine knows the times of collisions in advance, so their sounds are scheduled from its events
+    # (the ODE engine plays them as they are simulated):
+    sound_scheduler = None
+    if sound.mixer is not None and isinstance(physics, PoolPhysics):
+        sound_scheduler = CollisionSoundScheduler(sound.mixer, sound.ballBall_sample)
     if render_method == 'lambert':
         technique = LAMBERT_TECHNIQUE
     elif render_method == 'ega':
         technique = EGA_TECHNIQUE
-    table_mesh = game.table.export_mesh(surface_technique=technique,
-                                        cushion_technique=technique,
-                                        rail_technique=technique)
-    ball_meshes = game.table.export_ball_meshes(technique=technique,
-                                                use_bb_particles=render_method == 'billboards')
-    # textured_text = TexturedText()
-    # if use_bb_particles:
+    instanced_balls = instanced_balls and render_method in ('lambert', 'ega')
+    # the vertex arrays of the table and balls are built (and textures are loaded) in the background,
+    # each group of meshes is drawn, in the order of the groups, as soon as it has been initialized:
+    asset_loader = AssetLoader()
+    mesh_groups = []
+    def load_meshes(build, on_ready=None):
+        group = []
+        mesh_groups.append(group)
+        def _on_ready(meshes):
+            group.extend(meshes)
+            if on_ready is not None:
+                on_ready(meshes)
+        asset_loader.submit_meshes(build, on_ready=_on_ready)
+    def build_table_mesh():
+        return game.table.export_mesh(surface_technique=technique,
+                                      cushion_technique=technique,
+                                      rail_technique=technique)
+    scene = None
+    stepped = game
+    billboard_particles = None
+    if cube_map and render_method not in ('billboards', 'raycast'):
+        from .room import skybox_mesh
+        load_meshes(lambda: [skybox_mesh])
+    if render_method != 'raycast':
+        load_meshes(lambda: [floor_mesh])
 
     if render_method == 'billboards':
-        billboard_particles = ball_meshes[0]
-        ball_mesh_positions = billboard_particles.primitive.attributes['translate']
-        ball_mesh_rotations = np.array(game.num_balls * [np.eye(3)])
-        meshes = [floor_mesh, table_mesh] + ball_meshes + [cue.shadow_mesh, cue]
+        def build_billboards():
+            ball_meshes = game.table.export_ball_meshes(technique=technique, use_bb_particles=True)
+            ball_meshes[0].primitive.attributes['translate'] = game.ball_mesh_positions
+            return [build_table_mesh()] + ball_meshes
+        def on_billboards_ready(meshes):
+            nonlocal billboard_particles
+            billboard_particles = meshes[1]
+        load_meshes(build_billboards, on_ready=on_billboards_ready)
 
     elif render_method == 'raycast':
-        ball_mesh_positions = np.zeros((game.num_balls, 3), dtype=np.float32)
-        ball_quaternions = np.zeros((game.num_balls, 4), dtype=np.float32)
-        ball_quaternions[:,3] = 1
         from poolvr.gl_rendering import FragBox
         def on_use(material,
                    camera_matrix=None,
@@ -141,32 +183,53 @@ def main(window_size=(800,600),
         fragbox = FragBox(os.path.join(os.path.dirname(poolvr.__file__),
                                        'shaders', 'sphere_projection_fs.glsl'),
                           on_use=on_use)
-        fragbox.material.values['ball_positions'] = ball_mesh_positions
-        fragbox.material.values['ball_quaternions'] = ball_quaternions
+        fragbox.material.values['ball_positions'] = game.ball_mesh_positions
+        fragbox.material.values['ball_quaternions'] = game.ball_quaternions
         fragbox.material.values['cue_world_matrix'] = cue.world_matrix
         fragbox.material.values['cue_length'] = cue.length
         fragbox.material.values['cue_radius'] = cue.radius
-        meshes = [table_mesh, fragbox]
+        load_meshes(lambda: [build_table_mesh(), fragbox])
+
+    elif instanced_balls:
+        from .scene import PoolScene, calc_table_matrices
+        games = [game] + list(extra_games)
+        built_scene = None
+        def build_scene():
+            nonlocal built_scene
+            table_matrices = calc_table_matrices(len(games), table)
+            table_matrices[:,3,0] -= table_matrices[0,3,0]
+            built_scene = PoolScene(table_matrices, table=table, games=games,
+                                    technique=technique, table_mesh=build_table_mesh())
+            built_scene.set_visible(0, [j in balls_on_table for j in range(game.num_balls)])
+            for i, extra_game in enumerate(extra_games):
+                built_scene.set_visible(i+1, [j in extra_game.physics.balls_on_table
+                                              for j in range(extra_game.num_balls)])
+            return built_scene.meshes
+        def on_scene_ready(meshes):
+            # from now on the extra games are stepped too:
+            nonlocal scene, stepped
+            scene = stepped = built_scene
+        load_meshes(build_scene, on_ready=on_scene_ready)
 
     else:
-        ball_shadow_meshes = [mesh.shadow_mesh for mesh in ball_meshes]
-        ball_mesh_positions = [mesh.world_matrix[3,:3] for mesh in ball_meshes]
-        ball_mesh_rotations = [mesh.world_matrix[:3,:3].T for mesh in ball_meshes]
-        ball_shadow_mesh_positions = [mesh.world_matrix[3,:3] for mesh in ball_shadow_meshes]
-        meshes = [floor_mesh, table_mesh] + ball_meshes + ball_shadow_meshes + [cue.shadow_mesh, cue]
-        if cube_map:
-            from .room import skybox_mesh
-            meshes.insert(0, skybox_mesh)
+        def build_balls():
+            ball_meshes = game.table.export_ball_meshes(technique=technique)
+            ball_shadow_meshes = [mesh.shadow_mesh for mesh in ball_meshes]
+            for i, (mesh, shadow_mesh) in enumerate(zip(ball_meshes, ball_shadow_meshes)):
+                mesh.bind_world_matrix(game.ball_world_matrices[i])
+                shadow_mesh.bind_world_matrix(game.ball_world_matrices[i])
+                if i not in balls_on_table:
+                    mesh.visible = False
+                    shadow_mesh.visible = False
+            return [build_table_mesh()] + ball_meshes + ball_shadow_meshes
+        load_meshes(build_balls)
 
-    for mesh in meshes:
-        mesh.init_gl()
+    if render_method != 'raycast':
+        load_meshes(lambda: [cue.shadow_mesh, cue])
     cue.shadow_mesh.update(c=table.H+0.001)
     cue.position[1] = game.table.H + 0.001
     cue.position[2] += game.table.L * 0.1
-    for i, mesh in enumerate(ball_meshes):
-        if i not in balls_on_table:
-            mesh.visible = False
-            ball_shadow_meshes[i].visible = False
+    cue.last_world_matrix[:] = cue.world_matrix
     camera_world_matrix = fallback_renderer.camera_matrix
     camera_position = camera_world_matrix[3,:3]
     camera_position[1] = game.table.H + 0.6
@@ -180,6 +243,7 @@ def main(window_size=(800,600),
         cue.position[0] = 0
         cue.position[1] = game.table.H + 0.001
         cue.position[2] = game.table.L * 0.3
+        cue.last_world_matrix[:] = cue.world_matrix
     process_mouse_input = init_mouse(window)
     init_keyboard(window)
     def on_keydown(window, key, scancode, action, mods):
@@ -204,9 +268,15 @@ def main(window_size=(800,600),
         glfw.PollEvents()
         process_keyboard_input(dt, camera_world_matrix)
         process_mouse_input(dt, cue)
-    if isinstance(renderer, OpenVRRenderer):
-        from .vr_input import calc_cue_transformation, calc_cue_contact_velocity, axis_callbacks, button_press_callbacks
+    pose_sampler = None
+    if vr:
+        from .vr_input import (calc_cue_transformation, calc_cue_contact_velocity, estimate_cue_contact_velocity,
+                               axis_callbacks, button_press_callbacks)
         button_press_callbacks[openvr.k_EButton_ApplicationMenu] = reset
+        if pose_sample_rate:
+            from .vr_pose_sampler import PoseSampler
+            pose_sampler = PoseSampler(renderer.vr_system, renderer._controller_indices, rate=pose_sample_rate)
+            pose_sampler.start()
         if use_ode and ODEPoolPhysics is not None:
             def on_cue_ball_collision(renderer=renderer, game=game, physics=physics, impact_speed=None):
                 if impact_speed > 0.0015:
@@ -224,100 +294,136 @@ def main(window_size=(800,600),
     import gc
     gc.collect()
 
-    last_contact_t = float('-inf')
-    contact_last_frame = False
-    nframes = 0
-    max_frame_time = 0.0
-    lt = glfw.GetTime()
+    frame_data = None
+    on_table = np.array(sorted(balls_on_table), dtype=np.int64)
+    def check_cue_contact(dt, s0, s1):
+        """
+        Strike the first ball (if any) which the cue contacts during the next *dt* of game time,
+        in which the cue moves from fraction *s0* to fraction *s1* of its motion in the current frame.
+        """
+        nonlocal last_contact_t
+        if game.t - last_contact_t < 2:
+            return
+        positions0 = game.ball_positions[on_table]
+        positions1 = positions0 + dt * game.ball_velocities[on_table]
+        for j, s, r_c in cue.swept_contacts(positions0, positions1, physics.ball_radius, s0=s0, s1=s1):
+            i = on_table[j]
+            t_c = game.t + s * dt
+            v_c = None
+            if pose_sampler is not None:
+                # estimate the impact velocity from the recent high-rate samples of the stroke:
+                v_c = estimate_cue_contact_velocity(pose_sampler.buffer.history(duration=POSE_HISTORY_DURATION),
+                                                    r_c, cue.world_matrix)
+            if v_c is None:
+                if vr and frame_data and len(frame_data['controller_poses']) == 2:
+                    pose_0, pose_1 = frame_data['controller_poses']
+                    r_0, r_1 = pose_0[:,3], pose_1[:,3]
+                    v_0, v_1 = frame_data['controller_velocities']
+                    v_c = calc_cue_contact_velocity(r_c, r_0, r_1, v_0, v_1)
+                else:
+                    v_c = cue.velocity
+            physics.strike_ball(t_c, i, positions0[j] + s * (positions1[j] - positions0[j]), r_c, v_c, cue.mass)
+            last_contact_t = t_c
+            if vr:
+                renderer.vr_system.triggerHapticPulse(renderer._controller_indices[0],
+                                                      0, int(np.linalg.norm(cue.velocity)**2 / 1.7 * 2700))
+            break
+    # the simulation and cue contact detection run at a fixed tick, the drawn state is interpolated:
+    scheduler = FrameScheduler(tick=SIMULATION_TICK,
+                               frame_time_budget=1.0/90 if vr else 1.0/60,
+                               clock=glfw.GetTime)
+    profiler = None
+    if profile or profile_csv:
+        from .frame_profiler import FrameProfiler
+        profiler = FrameProfiler(csv_file=profile_csv)
+        renderer.render_queue.gpu_timer = profiler.gpu_timer
     glyph_meshes = []
+    meshes = None
     while not glfw.WindowShouldClose(window):
-        t = glfw.GetTime()
-        dt = t - lt
-        lt = t
-        process_input(dt)
-        if glyphs:
-            glyph_meshes = physics.glyph_meshes(game.t)
-        with renderer.render(meshes=meshes+glyph_meshes) as frame_data:
-            if isinstance(renderer, OpenVRRenderer) and frame_data:
-                renderer.process_input(dt, button_press_callbacks=button_press_callbacks,
-                                       axis_callbacks=axis_callbacks)
-                hmd_pose = frame_data['hmd_pose']
-                camera_position[:] = hmd_pose[:, 3]
-                controller_poses = frame_data['controller_poses']
-                if len(controller_poses) > 0:
-                    if len(controller_poses) == 2:
-                        pose_0, pose_1 = controller_poses
-                    else:
-                        controller_indices = frame_data['controller_indices']
-                        if controller_indices[0] == 0:
-                            pose_0 = controller_poses[0]
-                            pose_1 = np.zeros((3,4), dtype=np.float64)
-                            pose_1[0,0] = pose_1[1,1] = pose_1[2,2] = 1
-                        else:
-                            pose_0 = np.zeros((3,4), dtype=np.float64)
-                            pose_0[0,0] = pose_0[1,1] = pose_0[2,2] = 1
-                            pose_1 = controller_poses[0]
-                    calc_cue_transformation(pose_0, pose_1, out=cue.world_matrix)
-                    cue.velocity = frame_data['controller_velocities'][0]
-                    cue.angular_velocity = frame_data['controller_angular_velocities'][0]
-                    if use_ode and isinstance(physics, ODEPoolPhysics):
-                        set_quaternion_from_matrix(pose_0[:, :3], cue.quaternion)
-            elif isinstance(renderer, OpenGLRenderer):
-                if use_ode and isinstance(physics, ODEPoolPhysics):
-                    set_quaternion_from_matrix(cue.rotation.dot(cue.world_matrix[:3, :3].T),
-                                               cue.quaternion)
-            if render_method == 'billboards':
-                billboard_particles.update_gl()
-            elif render_method == 'raycast':
-                for i, (pos, quat) in enumerate(zip(game.ball_positions, game.ball_quaternions)):
-                    ball_mesh_positions[i][:] = pos
-                    ball_quaternions[i][:] = quat
+        dt = scheduler.begin_frame()
+        with scheduler.phase('input'):
+            process_input(dt)
+        with scheduler.phase('upload'):
+            if meshes is None:
+                asset_loader.process_uploads()
+                ready_meshes = list(chain.from_iterable(mesh_groups))
+                if asset_loader.done:
+                    meshes = ready_meshes
             else:
-                for i, (pos, quat) in enumerate(zip(game.ball_positions, game.ball_quaternions)):
-                    ball_mesh_positions[i][:] = pos
-                    ball_shadow_mesh_positions[i][0::2] = pos[0::2]
-                    set_matrix_from_quaternion(quat, ball_mesh_rotations[i])
-                cue.shadow_mesh.update()
-            # sdf_text.set_text("%9.3f" % dt)
-            # sdf_text.update_gl()
-        glfw.SwapBuffers(window)
-
-        if not contact_last_frame:
-            if game.t - last_contact_t >= 2:
-                for i, position in cue.aabb_check(game.ball_positions[:1], physics.ball_radius):
-                    r_c = cue.contact(position, physics.ball_radius)
-                    if r_c is not None:
-                        if isinstance(renderer, OpenVRRenderer) and frame_data and len(frame_data['controller_poses']) == 2:
-                            pose_0, pose_1 = frame_data['controller_poses']
-                            r_0, r_1 = pose_0[:,3], pose_1[:,3]
-                            v_0, v_1 = frame_data['controller_velocities']
-                            v_c = calc_cue_contact_velocity(r_c, r_0, r_1, v_0, v_1)
+                ready_meshes = meshes
+            # the ball states were interpolated in the previous frame's physics phase:
+            if billboard_particles is not None:
+                billboard_particles.update_gl()
+            elif scene is not None:
+                scene.update_gl()
+        with scheduler.phase('render'):
+            if glyphs:
+                glyph_meshes = physics.glyph_meshes(game.t)
+            with renderer.render(meshes=ready_meshes+glyph_meshes) as frame_data:
+                if vr and frame_data:
+                    renderer.process_input(dt, button_press_callbacks=button_press_callbacks,
+                                           axis_callbacks=axis_callbacks)
+                    hmd_pose = frame_data['hmd_pose']
+                    camera_position[:] = hmd_pose[:, 3]
+                    controller_poses = frame_data['controller_poses']
+                    if len(controller_poses) > 0:
+                        if len(controller_poses) == 2:
+                            pose_0, pose_1 = controller_poses
                         else:
-                            v_c = cue.velocity
-                        physics.strike_ball(game.t, i, game.ball_positions[i], r_c, v_c, cue.mass)
-                        last_contact_t = game.t
-                        contact_last_frame = True
-                        if isinstance(renderer, OpenVRRenderer):
-                            renderer.vr_system.triggerHapticPulse(renderer._controller_indices[0],
-                                                                  0, int(np.linalg.norm(cue.velocity)**2 / 1.7 * 2700))
-                        break
-        else:
-            contact_last_frame = False
-
-        game.step(speed*dt)
-
-        max_frame_time = max(max_frame_time, dt)
-        if nframes == 0:
-            st = glfw.GetTime()
-        nframes += 1
+                            controller_indices = frame_data['controller_indices']
+                            if controller_indices[0] == 0:
+                                pose_0 = controller_poses[0]
+                                pose_1 = np.zeros((3,4), dtype=np.float64)
+                                pose_1[0,0] = pose_1[1,1] = pose_1[2,2] = 1
+                            else:
+                                pose_0 = np.zeros((3,4), dtype=np.float64)
+                                pose_0[0,0] = pose_0[1,1] = pose_0[2,2] = 1
+                                pose_1 = controller_poses[0]
+                        calc_cue_transformation(pose_0, pose_1, out=cue.world_matrix)
+                        cue.velocity = frame_data['controller_velocities'][0]
+                        cue.angular_velocity = frame_data['controller_angular_velocities'][0]
+                        if use_ode and isinstance(physics, ODEPoolPhysics):
+                            set_quaternion_from_matrix(pose_0[:, :3], cue.quaternion)
+                elif isinstance(renderer, OpenGLRenderer):
+                    if use_ode and isinstance(physics, ODEPoolPhysics):
+                        set_quaternion_from_matrix(cue.rotation.dot(cue.world_matrix[:3, :3].T),
+                                                   cue.quaternion)
+                # sdf_text.set_text("%9.3f" % dt)
+                # sdf_text.update_gl()
+        with scheduler.phase('swap'):
+            glfw.SwapBuffers(window)
+        with scheduler.phase('physics'):
+            # the cue is swept from its pose at the end of the previous frame to its current pose:
+            num_ticks = scheduler.num_pending_ticks
+            for k, tick_dt in enumerate(scheduler.ticks()):
+                check_cue_contact(speed*tick_dt, k / num_ticks, (k + 1) / num_ticks)
+                stepped.step(speed*tick_dt)
+            if num_ticks:
+                cue.last_world_matrix[:] = cue.world_matrix
+            stepped.interpolate_render_state(scheduler.alpha)
+            if sound_scheduler is not None:
+                sound_scheduler.update(physics.events, game.t, speed=speed)
+        scheduler.end_frame()
+        if profiler is not None:
+            profiler.end_frame(scheduler.frame_times)
+            if profiler.frame % PROFILE_REPORT_INTERVAL == 0:
+                glfw.SetWindowTitle(window, 'poolvr.py - %s' % profiler.summary())
+                _logger.debug('frame timings:\n%s', profiler.format())
 
-    if nframes > 1:
-        _logger.info('...exited render loop: average FPS: %f, maximum frame time: %f, average frame time: %f',
-                     (nframes - 1) / (t - st), max_frame_time, (t - st) / (nframes - 1))
+    if scheduler.num_frames > 1:
+        _logger.info('...exited render loop: %s', scheduler.format_stats())
+        _logger.info('last frame draw calls / state changes: %s',
+                     ', '.join('%s: %d' % item for item in renderer.frame_stats.items()))
+    if profiler is not None:
+        _logger.info('frame timings (last %d frames):\n%s', profiler.window, profiler.format())
+        profiler.close()
 
     from .physics.events import PhysicsEvent
     _logger.debug(PhysicsEvent.events_str(physics.events))
 
+    if pose_sampler is not None:
+        pose_sampler.stop()
+    asset_loader.shutdown()
     renderer.shutdown()
     _logger.info('...shut down renderer')
     glfw.DestroyWindow(window)
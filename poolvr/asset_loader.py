@@ -0,0 +1,154 @@
+"""
+Background loading of assets: CPU work (decoding images, reading buffers, building vertex arrays)
+runs on a thread pool, while the GL uploads which depend on it are performed on the GL thread,
+a bounded amount per frame (see :meth:`AssetLoader.process_uploads`).
+"""
+import logging
+import time
+import inspect
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
+
+
+_logger = logging.getLogger(__name__)
+
+
+def iter_textures(node):
+    """
+    Iterate over the textures used by the materials of a :ref:`Mesh` (or of any node with a ``material``).
+    """
+    materials = []
+    if hasattr(node, 'primitives') and isinstance(node.primitives, dict):
+        materials.extend(node.primitives.keys())
+    if getattr(node, 'material', None) is not None:
+        materials.append(node.material)
+    for material in materials:
+        yield from material.textures.values()
+
+
+class AssetLoader(object):
+    UPLOAD_TIME_BUDGET = 0.004
+    def __init__(self, max_workers=None, upload_time_budget=UPLOAD_TIME_BUDGET):
+        """
+        :param max_workers: number of worker threads (defaults to that of :class:`ThreadPoolExecutor`)
+        :param upload_time_budget: time (in seconds) per frame to spend on GL uploads -- at least one
+                                   upload (step) is performed per frame regardless
+        """
+        self.upload_time_budget = upload_time_budget
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._pending = deque()
+        self._ready = set()
+    def submit(self, prepare, upload=None, on_ready=None):
+        """
+        Call *prepare* on a worker thread; once it has returned, call *upload* with its result
+        on the GL thread (in :meth:`process_uploads`), then *on_ready* with the result of *upload*.
+        *upload* may also be a generator function, in which case each of its steps (up to a ``yield``)
+        is a separate upload, so that the steps may be spread over several frames, and *on_ready*
+        is called with its return value.
+        If *prepare* raises an exception, it is logged and the load is dropped.
+
+        :returns: the :class:`concurrent.futures.Future` of *prepare*
+        """
+        future = self._executor.submit(prepare)
+        self._pending.append((future, upload, on_ready))
+        return future
+    def submit_mesh(self, mesh, build=None, on_ready=None):
+        """
+        Load the textures of a mesh on a worker thread, then initialize it on the GL thread.
+
+        :param mesh: a :ref:`Mesh` (or anything else with an ``init_gl`` method)
+        :param build: optional function which is called on the worker thread before loading
+                      the textures and returns the mesh (in which case *mesh* may be ``None``)
+        """
+        def prepare():
+            _mesh = build() if build is not None else mesh
+            for texture in iter_textures(_mesh):
+                texture.load()
+            return _mesh
+        def upload(mesh):
+            mesh.init_gl()
+            self._ready.add(id(mesh))
+            return mesh
+        return self.submit(prepare, upload, on_ready=on_ready)
+    def submit_meshes(self, build, on_ready=None):
+        """
+        Like :meth:`submit_mesh`, for the list of meshes returned by *build* (which is called on a worker thread).
+        Each mesh is initialized by a separate upload, and *on_ready* is called with the list
+        once all of them have been.
+        """
+        def prepare():
+            meshes = build()
+            for mesh in meshes:
+                for texture in iter_textures(mesh):
+                    texture.load()
+            return meshes
+        def upload(meshes):
+            for mesh in meshes:
+                mesh.init_gl()
+                self._ready.add(id(mesh))
+                yield
+            return meshes
+        return self.submit(prepare, upload, on_ready=on_ready)
+    def is_ready(self, mesh):
+        """
+        Whether a mesh submitted with :meth:`submit_mesh` (or :meth:`submit_meshes`) has been initialized.
+        """
+        return id(mesh) in self._ready
+    @property
+    def done(self):
+        return not self._pending
+    def process_uploads(self, time_budget=None):
+        """
+        Perform the GL uploads of completed loads, until *time_budget* seconds
+        (by default, ``upload_time_budget``) have passed.  Must be called on the GL thread.
+
+        :returns: the number of uploads performed
+        """
+        if time_budget is None:
+            time_budget = self.upload_time_budget
+        t0 = time.perf_counter()
+        num_uploads = 0
+        pending = self._pending
+        # unfinished loads are rotated to the back, a partially performed upload stays in front:
+        num_unfinished = 0
+        while num_unfinished < len(pending):
+            future, upload, on_ready = pending[0]
+            if not future.done():
+                pending.rotate(-1)
+                num_unfinished += 1
+                continue
+            if future.exception() is not None:
+                pending.popleft()
+                _logger.error('failed to load asset: %s', future.exception(), exc_info=future.exception())
+                continue
+            if inspect.isgeneratorfunction(upload):
+                upload = upload(future.result())
+                pending[0] = (future, upload, on_ready)
+            if inspect.isgenerator(upload):
+                try:
+                    next(upload)
+                except StopIteration as stop:
+                    pending.popleft()
+                    if on_ready is not None:
+                        on_ready(stop.value)
+                    continue
+            else:
+                pending.popleft()
+                result = future.result()
+                if upload is not None:
+                    result = upload(result)
+                if on_ready is not None:
+                    on_ready(result)
+            num_uploads += 1
+            if time.perf_counter() - t0 >= time_budget:
+                break
+        return num_uploads
+    def wait(self):
+        """
+        Block until all submitted loads have completed and have been uploaded.
+        """
+        while self._pending:
+            wait([self._pending[0][0]])
+            self.process_uploads(time_budget=float('inf'))
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,89 @@
+import numpy as np
+import OpenGL.GL as gl
+
+
+from .gl_rendering import Mesh, Material
+from .gl_primitives import SpherePrimitive
+from .gl_techniques import BALL_INSTANCED_TECHNIQUE, BALL_SHADOW_INSTANCED_TECHNIQUE
+
+
+def hex_to_rgba(colors):
+    return np.array([[(c & 0xff0000) / 0xff0000,
+                      (c & 0x00ff00) / 0x00ff00,
+                      (c & 0x0000ff) / 0x0000ff, 0.0]
+                     for c in colors], dtype=np.float32)
+
+
+class InstancedBallMesh(Mesh):
+    def __init__(self, ball_positions, ball_quaternions, ball_colors, ball_radius,
+                 striped_balls=(), shadow_height=0.0, light_position=None, lambert=True,
+                 technique=BALL_INSTANCED_TECHNIQUE,
+                 shadow_technique=BALL_SHADOW_INSTANCED_TECHNIQUE):
+        """
+        Draws any number of pool balls with a single instanced draw call (and their shadows with another one).
+
+        Each ball is an instance of one sphere primitive, with per-instance position, orientation,
+        color, stripe and visibility attributes.  The shadows are drawn from the same primitive (and
+        per-instance buffers), projected onto the plane of the shadows by the vertex shader.
+
+        :param ball_positions: float32 array of shape (*N*, 3) (e.g. :ref:`PoolGame.ball_mesh_positions`),
+                               whose current contents are uploaded by :meth:`update_gl`
+        :param ball_quaternions: float32 array of shape (*N*, 4) (e.g. :ref:`PoolGame.ball_quaternions`),
+                                 whose current contents are uploaded by :meth:`update_gl`
+        :param ball_colors: base color (as a hex integer) of each ball; the first is also used
+                            as the color of the unstriped parts of striped balls
+        :param striped_balls: indices of the balls which are striped
+        :param shadow_height: height of the plane on which the ball shadows are drawn
+        :param light_position: homogeneous position of the light which casts the shadows
+                               (defaults to that of *shadow_technique*)
+        """
+        num_balls = len(ball_positions)
+        self.num_balls = num_balls
+        self.ball_radius = ball_radius
+        self.ball_positions = ball_positions
+        self.ball_quaternions = ball_quaternions
+        self.ball_colors = hex_to_rgba(ball_colors)
+        self.ball_stripes = np.array([1.0 if i in striped_balls else 0.0 for i in range(num_balls)],
+                                     dtype=np.float32).reshape(-1,1)
+        self.ball_visible = np.ones((num_balls, 1), dtype=np.float32)
+        sphere_prim = SpherePrimitive(radius=ball_radius)
+        sphere_prim.attributes['a_position'] = sphere_prim.attributes['vertices']
+        sphere_prim.attributes.update({'a_translate': ball_positions,
+                                       'a_quaternion': ball_quaternions,
+                                       'a_color': self.ball_colors,
+                                       'a_stripe': self.ball_stripes,
+                                       'a_visible': self.ball_visible})
+        sphere_prim.attribute_usage.update({'a_translate': gl.GL_DYNAMIC_DRAW,
+                                            'a_quaternion': gl.GL_DYNAMIC_DRAW})
+        sphere_prim.num_instances = num_balls
+        self.material = Material(technique,
+                                 values={'u_base_color': self.ball_colors[0],
+                                         'u_stripe_half_width': 0.5 * ball_radius,
+                                         'u_lambert': 1.0 if lambert else 0.0})
+        super().__init__({self.material: [sphere_prim]})
+        self.primitive = sphere_prim
+        shadow_values = {'u_shadow_plane': np.array([0.0, 1.0, 0.0, -shadow_height], dtype=np.float32)}
+        if light_position is not None:
+            shadow_values['u_light_position'] = np.array(light_position, dtype=np.float32)
+        self.shadow_material = Material(shadow_technique, values=shadow_values)
+        self.shadow_mesh = Mesh({self.shadow_material: [sphere_prim]})
+        self.shadow_primitive = sphere_prim
+    def init_gl(self, force=False):
+        super().init_gl(force=force)
+        # the sphere primitive's buffers have just been initialized, only the shadow's VAO remains:
+        self.shadow_mesh.init_gl()
+    def update_gl(self):
+        """
+        Upload the current ball positions and orientations.
+        """
+        self.primitive.update_buffer_data('a_translate')
+        self.primitive.update_buffer_data('a_quaternion')
+    def set_visible(self, ball_visible):
+        """
+        Set which balls (and their shadows) are drawn.
+
+        :param ball_visible: boolean sequence of length *N*
+        """
+        self.ball_visible[:,0] = ball_visible
+        if self.primitive.buffers is not None:
+            self.primitive.update_buffer_data('a_visible')
@@ -3,7 +3,6 @@ import os.path
 from ctypes import c_void_p
 import numpy as np
 import OpenGL.GL as gl
-import OpenGL.error
 
 
 from .gl_rendering import Node, Technique, Material, Program, DTYPE_COMPONENT_TYPE, Texture
@@ -20,14 +19,26 @@ TEXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
 
 
 class BillboardParticles(Node):
-    technique = Technique(Program(pkgutil.get_data('poolvr', 'shaders/bb_particles_vs.glsl').decode(),
-                                  pkgutil.get_data('poolvr', 'shaders/bb_particles_fs.glsl').decode()))
+    # the technique and default textures are shared by all instances, and created when first needed:
+    technique = None
+    _default_texture = None
+    _default_normal_map = None
     _modelview = np.eye(4, dtype=np.float32)
-    def __init__(self,
-                 texture=Texture(os.path.join(TEXTURES_DIR, 'sphere_bb_alpha.png')),
-                 normal_map=Texture(os.path.join(TEXTURES_DIR, 'sphere_bb_normal.png')),
+    def __init__(self, texture=None, normal_map=None,
                  num_particles=1, scale=1.0, color=None, translate=None):
         Node.__init__(self)
+        cls = BillboardParticles
+        if cls.technique is None:
+            cls.technique = Technique(Program(pkgutil.get_data('poolvr', 'shaders/bb_particles_vs.glsl').decode(),
+                                              pkgutil.get_data('poolvr', 'shaders/bb_particles_fs.glsl').decode()))
+        if texture is None:
+            if cls._default_texture is None:
+                cls._default_texture = Texture(os.path.join(TEXTURES_DIR, 'sphere_bb_alpha.png'))
+            texture = cls._default_texture
+        if normal_map is None:
+            if cls._default_normal_map is None:
+                cls._default_normal_map = Texture(os.path.join(TEXTURES_DIR, 'sphere_bb_normal.png'))
+            normal_map = cls._default_normal_map
         self.texture = texture
         self.normal_map = normal_map
         self.material = Material(self.technique, textures={'map': texture, 'u_normal': normal_map})
@@ -51,13 +62,7 @@ class BillboardParticles(Node):
         self._initialized = True
     def update_gl(self):
         if not self._initialized: self.init_gl()
-        translate = self.primitive.attributes['translate']
-        values = translate.tobytes()
-        try:
-            gl.glNamedBufferSubData(self.primitive.buffers['translate'], 0, len(values), values)
-        except OpenGL.error.NullFunctionError as e:
-            gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.primitive.buffers['translate'])
-            gl.glBufferSubData(gl.GL_ARRAY_BUFFER, 0, len(values), values)
+        self.primitive.update_buffer_data('translate')
     def draw(self, view=None, projection=None, frame_data=None):
         self.material.use()
         if view is not None:
@@ -67,12 +72,13 @@ class BillboardParticles(Node):
             gl.glUniformMatrix4fv(self.technique.uniform_locations['u_projection'], 1, False, projection)
         for attribute_name, location in self.technique.attribute_locations.items():
             attribute = self.primitive.attributes[attribute_name]
+            stream = self.primitive.streams.get(attribute_name)
             gl.glEnableVertexAttribArray(location)
             gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.primitive.buffers[attribute_name])
             gl.glVertexAttribPointer(location, attribute.shape[-1],
                                      DTYPE_COMPONENT_TYPE[attribute.dtype], False,
                                      attribute.dtype.itemsize * attribute.shape[-1],
-                                     NULL_PTR)
+                                     c_void_p(stream.offset) if stream else NULL_PTR)
             if attribute_name == 'translate' or attribute_name == 'color':
                 gl.glVertexAttribDivisor(location, 1)
             else:
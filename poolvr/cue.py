@@ -5,10 +5,12 @@ import numpy as np
 
 from .gl_rendering import Material, Mesh
 from .gl_primitives import CylinderPrimitive, ProjectedMesh
-from .gl_techniques import LAMBERT_TECHNIQUE, EGA_TECHNIQUE
+from .gl_techniques import LAMBERT_TECHNIQUE, PLANAR_SHADOW_TECHNIQUE
 
 
 class PoolCue(Mesh):
+    SWEEP_TOLERANCE = 1e-5
+    SWEEP_MAX_ITERATIONS = 32
     rotation = np.array([[1.0,  0.0, 0.0],
                          [0.0,  0.0, 1.0],
                          [0.0, -1.0, 0.0]], dtype=np.float32)
@@ -23,7 +25,7 @@ class PoolCue(Mesh):
                              : [cylinder]})
         self.update_world_matrices()
         self.shadow_mesh = ProjectedMesh(self,
-                                         Material(EGA_TECHNIQUE, values={'u_color': [0.0, 0x12/0xff, 0.0, 0.0]}))
+                                         Material(PLANAR_SHADOW_TECHNIQUE, values={'u_color': [0.0, 0x12/0xff, 0.0, 0.0]}))
         self.position = self.world_matrix[3,:3]
         self.velocity = np.zeros(3, dtype=np.float64)
         self.quaternion = np.zeros(4, dtype=np.float64); self.quaternion[3] = 1
@@ -32,6 +34,7 @@ class PoolCue(Mesh):
                             [radius, 0.5*length, radius]], dtype=np.float32)
         self._positions = None
         self.y_local = self.world_matrix[1,:3]
+        self.last_world_matrix = self.world_matrix.copy()
     def aabb_check(self, positions, ball_radius):
         """
         Perform axis-aligned bounding-box (AABB) check for each ball position specified in world coordinates.
@@ -80,3 +83,106 @@ class PoolCue(Mesh):
                     poc = position + ball_radius * n
         if poc is not None:
             return self.world_matrix[:3,:3].T.dot(poc) + self.position
+    def interpolate_pose(self, s):
+        """
+        The rotation (an orthonormal 3x3 matrix) and position of the cue at fraction *s* of its motion
+        from :attr:`last_world_matrix` to :attr:`world_matrix`.
+        """
+        m0, m1 = self.last_world_matrix, self.world_matrix
+        position = (1 - s) * m0[3,:3] + s * m1[3,:3]
+        if (m0[:3,:3] == m1[:3,:3]).all():
+            return m1[:3,:3], position
+        rotation = (1 - s) * m0[:3,:3] + s * m1[:3,:3]
+        if s != 0 and s != 1:
+            u, _, vt = np.linalg.svd(rotation)
+            rotation = u.dot(vt)
+        return rotation, position
+    def swept_contacts(self, positions0, positions1, ball_radius, s0=0.0, s1=1.0):
+        """
+        Continuous contact detection between the moving cue and moving balls.
+
+        Over the time interval considered, the cue moves from its pose at fraction *s0* to its pose
+        at fraction *s1* of its motion from :attr:`last_world_matrix` to :attr:`world_matrix`
+        (see :meth:`interpolate_pose`), while the balls move linearly from *positions0* to *positions1*
+        (arrays of shape (*N*, 3) in world coordinates).  The relative motion of each ball is
+        approximated as linear in the cue's frame, in which the swept sphere is traced against the
+        rounded cylinder (the cylinder grown by *ball_radius*); all balls are traced at once.
+
+        Balls which already intersect the cue at the start of the interval are in contact at fraction 0.
+
+        :returns: list of ``(i, s, r_c)`` tuples, one for each ball *i* which contacts the cue,
+                  where *s* in [0, 1] is the fraction of the interval at which contact first occurs
+                  and *r_c* is the point of contact in world coordinates, ordered by *s*
+        """
+        positions0 = np.asarray(positions0, dtype=np.float64)
+        positions1 = np.asarray(positions1, dtype=np.float64)
+        rotation0, position0 = self.interpolate_pose(s0)
+        rotation1, position1 = self.interpolate_pose(s1)
+        a = (positions0 - position0).dot(rotation0.T)
+        seg = (positions1 - position1).dot(rotation1.T) - a
+        length = np.sqrt(np.einsum('ij,ij->i', seg, seg))
+        s = np.zeros(len(a))
+        d = self._sdf(a, ball_radius)
+        active = (d > self.SWEEP_TOLERANCE) & (length > 0)
+        hit = d <= self.SWEEP_TOLERANCE
+        for _ in range(self.SWEEP_MAX_ITERATIONS):
+            if not active.any():
+                break
+            # sphere tracing: the distance to the (convex) shape is a safe step along the path
+            s[active] += d[active] / length[active]
+            active &= s <= 1
+            d[active] = self._sdf(a[active] + s[active,np.newaxis] * seg[active], ball_radius)
+            reached = active & (d <= self.SWEEP_TOLERANCE)
+            hit |= reached
+            active &= ~reached
+        if active.any():
+            # sphere tracing takes ever smaller steps along paths which graze the shape, so it may not have
+            # decided them: as the distance to the (convex) shape is a convex function along the path, the
+            # rest of each such path is checked by a ternary search for its closest approach, and the first
+            # contact (if any) is then found by bisection
+            i = np.flatnonzero(active)
+            def sdf(i, s):
+                return self._sdf(a[i] + s[:,np.newaxis] * seg[i], ball_radius)
+            lo, hi = s[i], np.ones(len(i))
+            for _ in range(self.SWEEP_MAX_ITERATIONS):
+                m0, m1 = lo + (hi - lo) / 3, hi - (hi - lo) / 3
+                closer = sdf(i, m0) < sdf(i, m1)
+                lo, hi = np.where(closer, lo, m0), np.where(closer, m1, hi)
+            s_min = 0.5 * (lo + hi)
+            reached = sdf(i, s_min) <= self.SWEEP_TOLERANCE
+            i, lo, hi = i[reached], s[i[reached]], s_min[reached]
+            for _ in range(self.SWEEP_MAX_ITERATIONS):
+                mid = 0.5 * (lo + hi)
+                inside = sdf(i, mid) <= self.SWEEP_TOLERANCE
+                lo, hi = np.where(inside, lo, mid), np.where(inside, mid, hi)
+            s[i] = hi
+            hit[i] = True
+        contacts = []
+        for i in np.flatnonzero(hit)[np.argsort(s[hit], kind='stable')]:
+            c = a[i] + s[i] * seg[i]
+            n = self._sdf_normal(c)
+            rotation, _ = self.interpolate_pose(s0 + s[i] * (s1 - s0))
+            n = n.dot(rotation)
+            r_i = positions0[i] + s[i] * (positions1[i] - positions0[i])
+            contacts.append((i, s[i], r_i - ball_radius * n / np.linalg.norm(n)))
+        return contacts
+    def _sdf(self, positions, ball_radius):
+        # signed distance of ball centers (in cue local coordinates) to the cylinder grown by ball_radius:
+        qx = np.sqrt(positions[:,0]**2 + positions[:,2]**2) - self.radius
+        qy = abs(positions[:,1]) - 0.5*self.length
+        return np.hypot(np.maximum(qx, 0), np.maximum(qy, 0)) + np.minimum(np.maximum(qx, qy), 0) - ball_radius
+    def _sdf_normal(self, position):
+        # outward normal of the cylinder at the point closest to position (in cue local coordinates):
+        x, y, z = position
+        r = np.sqrt(x**2 + z**2)
+        qx, qy = r - self.radius, abs(y) - 0.5*self.length
+        if qx <= 0 and qy <= 0:
+            if qx > qy and r > 0:
+                qx, qy = 1.0, 0.0
+            else:
+                qx, qy = 0.0, 1.0
+        u, v = max(qx, 0.0), max(qy, 0.0)
+        n = np.array([0.0, np.copysign(v, y), 0.0])
+        if r > 0:
+            n[::2] = u / r * position[::2]
+        return n
@@ -0,0 +1,76 @@
+"""
+Headless OpenGL contexts via EGL (e.g. for benchmarking or testing with Mesa's llvmpipe
+software renderer when no window system is available).
+
+This module must be imported before any other module imports :mod:`OpenGL.GL`,
+since PyOpenGL selects its platform (``PYOPENGL_PLATFORM``) on first import.
+"""
+import os
+import logging
+import ctypes
+os.environ.setdefault('PYOPENGL_PLATFORM', 'egl')
+os.environ.setdefault('EGL_PLATFORM', 'surfaceless')
+import OpenGL
+from OpenGL import EGL # PyOpenGL's EGL bindings must be imported with error checking enabled
+OpenGL.ERROR_CHECKING = False
+OpenGL.ERROR_LOGGING = False
+OpenGL.ERROR_ON_COPY = True
+import OpenGL.GL as gl
+
+
+_logger = logging.getLogger('poolvr')
+
+
+from .gl_rendering import OpenGLRenderer
+
+
+def setup_egl(window_size=(800,600)):
+    """
+    Create an OpenGL (compatibility profile) context rendering to an offscreen pbuffer surface
+    of size *window_size* and make it current.
+
+    :returns: ``(egl_context, renderer)``, where *egl_context* is a tuple ``(display, surface, context)``
+              which should eventually be passed to :func:`shutdown_egl`.
+    """
+    display = EGL.eglGetDisplay(EGL.EGL_DEFAULT_DISPLAY)
+    major, minor = EGL.EGLint(), EGL.EGLint()
+    if not EGL.eglInitialize(display, ctypes.pointer(major), ctypes.pointer(minor)):
+        raise Exception('failed to initialize EGL')
+    config_attribs = (EGL.EGLint * 13)(EGL.EGL_SURFACE_TYPE, EGL.EGL_PBUFFER_BIT,
+                                       EGL.EGL_RED_SIZE, 8,
+                                       EGL.EGL_GREEN_SIZE, 8,
+                                       EGL.EGL_BLUE_SIZE, 8,
+                                       EGL.EGL_DEPTH_SIZE, 24,
+                                       EGL.EGL_RENDERABLE_TYPE, EGL.EGL_OPENGL_BIT,
+                                       EGL.EGL_NONE)
+    config = EGL.EGLConfig()
+    num_configs = EGL.EGLint()
+    if not EGL.eglChooseConfig(display, config_attribs, ctypes.pointer(config), 1,
+                               ctypes.pointer(num_configs)) or num_configs.value == 0:
+        raise Exception('failed to choose EGL config')
+    width, height = window_size
+    surface = EGL.eglCreatePbufferSurface(display, config,
+                                          (EGL.EGLint * 5)(EGL.EGL_WIDTH, width,
+                                                           EGL.EGL_HEIGHT, height,
+                                                           EGL.EGL_NONE))
+    if not surface:
+        raise Exception('failed to create EGL pbuffer surface')
+    EGL.eglBindAPI(EGL.EGL_OPENGL_API)
+    context = EGL.eglCreateContext(display, config, EGL.EGL_NO_CONTEXT, None)
+    if not context:
+        raise Exception('failed to create EGL context')
+    if not EGL.eglMakeCurrent(display, surface, surface, context):
+        raise Exception('failed to make EGL context current')
+    _logger.info('EGL %d.%d, GL_VERSION: %s, GL_RENDERER: %s', major.value, minor.value,
+                 gl.glGetString(gl.GL_VERSION), gl.glGetString(gl.GL_RENDERER))
+    renderer = OpenGLRenderer(window_size=(width, height), znear=0.1, zfar=1000)
+    renderer.init_gl()
+    return (display, surface, context), renderer
+
+
+def shutdown_egl(egl_context):
+    display, surface, context = egl_context
+    EGL.eglMakeCurrent(display, EGL.EGL_NO_SURFACE, EGL.EGL_NO_SURFACE, EGL.EGL_NO_CONTEXT)
+    EGL.eglDestroyContext(display, context)
+    EGL.eglDestroySurface(display, surface)
+    EGL.eglTerminate(display)
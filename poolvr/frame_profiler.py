@@ -0,0 +1,173 @@
+"""
+Per-stage frame timing: GPU times of the draw calls of each technique (measured by ``GL_TIME_ELAPSED``
+queries, see :class:`GPUTimerQueries`) and CPU times of the stages of the render loop, aggregated into
+rolling percentiles and optionally written to a CSV file (one row per frame, stage and measurement)
+for diagnosing dropped frames.
+"""
+import csv
+import logging
+from collections import defaultdict, deque
+import numpy as np
+import OpenGL.GL as gl
+
+
+_logger = logging.getLogger(__name__)
+
+
+class RollingPercentiles(object):
+    def __init__(self, window=300):
+        """
+        Percentiles of the last *window* values added.
+        """
+        self.values = np.zeros(window, dtype=np.float64)
+        self.count = 0
+    def add(self, value):
+        self.values[self.count % len(self.values)] = value
+        self.count += 1
+    def percentiles(self, ps=(50, 95, 99)):
+        n = min(self.count, len(self.values))
+        if not n:
+            return [0.0] * len(ps)
+        return list(np.percentile(self.values[:n], ps))
+    @property
+    def max(self):
+        n = min(self.count, len(self.values))
+        return self.values[:n].max() if n else 0.0
+
+
+class GPUTimerQueries(object):
+    MAX_FRAMES_IN_FLIGHT = 4
+    def __init__(self, max_frames_in_flight=MAX_FRAMES_IN_FLIGHT):
+        """
+        Measures the GPU time of named sections of each frame with ``GL_TIME_ELAPSED`` queries.
+
+        Sections may not be nested (only one ``GL_TIME_ELAPSED`` query may be active at a time):
+        :meth:`begin` ends the active section, if any.  Sections with the same name in a frame
+        (e.g. those of both eyes) are summed.
+
+        Results are read back without stalling, when they become available (typically a frame or
+        two later); only if more than *max_frames_in_flight* frames are pending does :meth:`end_frame`
+        wait for the oldest one.
+        """
+        self.max_frames_in_flight = max_frames_in_flight
+        self.frame = 0
+        self._free_queries = []
+        self._frame_queries = []
+        self._pending = deque()
+        self._active = False
+        self._result = np.zeros(1, dtype=np.uint32)
+        self._available = np.zeros(1, dtype=np.int32)
+    def begin(self, name):
+        if self._active:
+            gl.glEndQuery(gl.GL_TIME_ELAPSED)
+        query = self._free_queries.pop() if self._free_queries else gl.glGenQueries(1)[0]
+        gl.glBeginQuery(gl.GL_TIME_ELAPSED, query)
+        self._frame_queries.append((name, query))
+        self._active = True
+    def end(self):
+        if self._active:
+            gl.glEndQuery(gl.GL_TIME_ELAPSED)
+            self._active = False
+    def end_frame(self):
+        """
+        Finish the sections of the current frame.
+
+        :returns: list of ``(frame, times)`` pairs for the frames whose results have become available,
+                  where *times* maps section names to GPU times in seconds
+        """
+        self.end()
+        self._pending.append((self.frame, self._frame_queries))
+        self._frame_queries = []
+        self.frame += 1
+        results = []
+        while self._pending:
+            frame, queries = self._pending[0]
+            # queries complete in order, so the frame is complete when its last query is:
+            if queries and len(self._pending) <= self.max_frames_in_flight:
+                gl.glGetQueryObjectiv(queries[-1][1], gl.GL_QUERY_RESULT_AVAILABLE, self._available)
+                if not self._available[0]:
+                    break
+            self._pending.popleft()
+            times = defaultdict(float)
+            for name, query in queries:
+                # (32 bits suffice for sections shorter than 4 seconds)
+                gl.glGetQueryObjectuiv(query, gl.GL_QUERY_RESULT, self._result)
+                times[name] += 1e-9 * float(self._result[0])
+                self._free_queries.append(query)
+            results.append((frame, dict(times)))
+        return results
+    def delete(self):
+        queries = self._free_queries + [query for _, queries in self._pending for query in queries] \
+                  + [query for _, query in self._frame_queries]
+        if queries:
+            gl.glDeleteQueries(len(queries), queries)
+        self._free_queries, self._pending, self._frame_queries = [], deque(), []
+
+
+class FrameProfiler(object):
+    WINDOW = 300
+    PERCENTILES = (50, 95, 99)
+    def __init__(self, window=WINDOW, csv_file=None, gpu_timers=True):
+        """
+        :param window: number of frames over which percentiles are computed
+        :param csv_file: optional path of a CSV file to which all measurements are written,
+                         with columns ``frame``, ``source`` (``cpu`` or ``gpu``), ``stage`` and ``milliseconds``
+        :param gpu_timers: whether to create :attr:`gpu_timer` (requires a current GL context), which should
+                           be assigned to the renderer's :ref:`RenderQueue` to measure GPU times
+        """
+        self.window = window
+        self.gpu_timer = GPUTimerQueries() if gpu_timers else None
+        self.cpu_times = {}
+        self.gpu_times = {}
+        self.frame = 0
+        self._csv_file = None
+        self._csv_writer = None
+        if csv_file is not None:
+            self._csv_file = open(csv_file, 'w', newline='')
+            self._csv_writer = csv.writer(self._csv_file)
+            self._csv_writer.writerow(('frame', 'source', 'stage', 'milliseconds'))
+    def end_frame(self, cpu_times):
+        """
+        Record the CPU times (a dict mapping stage names to seconds) of the current frame,
+        and the GPU times of previous frames which have become available.
+        """
+        self._add(self.cpu_times, 'cpu', self.frame, cpu_times)
+        if self.gpu_timer is not None:
+            for frame, gpu_times in self.gpu_timer.end_frame():
+                self._add(self.gpu_times, 'gpu', frame, gpu_times)
+        self.frame += 1
+    def _add(self, stats, source, frame, times):
+        for name, t in times.items():
+            if name not in stats:
+                stats[name] = RollingPercentiles(self.window)
+            stats[name].add(t)
+            if self._csv_writer is not None:
+                self._csv_writer.writerow((frame, source, name, '%.4f' % (1e3*t)))
+    def summary(self, stage='frame'):
+        """
+        A one-line summary: percentiles of the CPU time of *stage* and of the total GPU time.
+        """
+        text = '%s p50/p95/p99: %s ms' % (stage, '/'.join('%.1f' % (1e3*t) for t in
+                                                         self.cpu_times[stage].percentiles(self.PERCENTILES))) \
+               if stage in self.cpu_times else ''
+        if self.gpu_times:
+            gpu_total = sum(stats.percentiles((50,))[0] for stats in self.gpu_times.values())
+            text += ', GPU p50: %.1f ms' % (1e3*gpu_total)
+        return text
+    def format(self):
+        """
+        A multi-line report of the rolling percentiles of every measured stage.
+        """
+        lines = ['%-4s %-24s %s   max (ms)' % ('', 'stage', '  '.join('p%-5d' % p for p in self.PERCENTILES))]
+        for source, stats in (('cpu', self.cpu_times), ('gpu', self.gpu_times)):
+            for name in sorted(stats):
+                lines.append('%-4s %-24s %s  %6.2f' % (source, name, ' '.join('%6.2f' % (1e3*t) for t in
+                                                                              stats[name].percentiles(self.PERCENTILES)),
+                                                      1e3*stats[name].max))
+        return '\n'.join(lines)
+    def close(self):
+        if self.gpu_timer is not None:
+            self.gpu_timer.delete()
+        if self._csv_file is not None:
+            self._csv_file.close()
+            self._csv_file = self._csv_writer = None
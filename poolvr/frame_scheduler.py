@@ -0,0 +1,207 @@
+"""
+Frame pacing for the render loop: the simulation (and cue contact detection) is advanced at a
+fixed tick, independent of the frame rate, while the presented state is interpolated between
+the last two ticks.  The time of each frame is split between the input, physics, upload (of GL
+resources), render and (buffer) swap phases, each of which has a share of the frame time budget; per-frame timings are kept in
+:attr:`FrameScheduler.frame_stats` and accumulated in :class:`FrameTimeHistogram` instances.
+
+Typical use::
+
+    scheduler = FrameScheduler(tick=1/240, frame_time_budget=1/90)
+    while running:
+        dt = scheduler.begin_frame()
+        with scheduler.phase('input'):
+            process_input(dt)
+        with scheduler.phase('physics'):
+            for tick_dt in scheduler.ticks():
+                game.step(tick_dt)
+            game.interpolate_render_state(scheduler.alpha)
+        with scheduler.phase('render'):
+            render()
+        scheduler.end_frame()
+"""
+import time
+from contextlib import contextmanager
+import numpy as np
+
+
+class FrameTimeHistogram(object):
+    BIN_WIDTH = 0.001
+    NUM_BINS = 50
+    def __init__(self, bin_width=BIN_WIDTH, num_bins=NUM_BINS):
+        """
+        Histogram of frame (or phase) times.
+
+        :param bin_width: width (in seconds) of each bin
+        :param num_bins: number of bins -- longer times are counted in an additional overflow bin
+        """
+        self.bin_width = bin_width
+        self.num_bins = num_bins
+        self.counts = np.zeros(num_bins + 1, dtype=np.int64)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+    def add(self, dt):
+        self.counts[min(int(dt / self.bin_width), self.num_bins)] += 1
+        self.count += 1
+        self.total += dt
+        if dt > self.max:
+            self.max = dt
+    def reset(self):
+        self.counts[:] = 0
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+    def percentile(self, p):
+        """
+        The *p*-th percentile (0 <= *p* <= 100) of the recorded times, to the resolution of the bins
+        (i.e. the upper edge of the bin containing it; the overflow bin is represented by the maximum time).
+        """
+        if not self.count:
+            return 0.0
+        i = int(np.searchsorted(np.cumsum(self.counts), p / 100 * self.count))
+        if i >= self.num_bins:
+            return self.max
+        return min((i + 1) * self.bin_width, self.max)
+    def format(self, width=40):
+        """
+        A multi-line text representation: summary statistics followed by a bar for each non-empty bin.
+        """
+        lines = ['%d frames: mean %.2f ms, p50 %.2f ms, p90 %.2f ms, p99 %.2f ms, max %.2f ms'
+                 % (self.count, 1e3*self.mean, 1e3*self.percentile(50), 1e3*self.percentile(90),
+                    1e3*self.percentile(99), 1e3*self.max)]
+        if self.count:
+            max_count = self.counts.max()
+            for i in np.flatnonzero(self.counts):
+                count = self.counts[i]
+                if i < self.num_bins:
+                    label = '%5.1f - %5.1f ms' % (1e3*i*self.bin_width, 1e3*(i+1)*self.bin_width)
+                else:
+                    label = '   >= %5.1f ms' % (1e3*i*self.bin_width)
+                lines.append('%s | %-*s %d' % (label, width, '#' * max(1, int(width * count / max_count)), count))
+        return '\n'.join(lines)
+
+
+class FrameScheduler(object):
+    TICK = 1.0 / 240
+    MAX_TICKS_PER_FRAME = 16
+    PHASE_BUDGET_FRACTIONS = {'input': 0.1, 'physics': 0.3, 'upload': 0.1, 'render': 0.45, 'swap': 0.05}
+    def __init__(self, tick=TICK,
+                 frame_time_budget=1.0/90,
+                 max_ticks_per_frame=MAX_TICKS_PER_FRAME,
+                 phase_budget_fractions=PHASE_BUDGET_FRACTIONS,
+                 clock=time.perf_counter):
+        """
+        :param tick: fixed simulation time step (in seconds)
+        :param frame_time_budget: target frame time (in seconds), e.g. the display refresh period
+        :param max_ticks_per_frame: maximum number of ticks per frame -- after a stall (e.g. while
+                                    loading), the time which would exceed it is dropped rather than
+                                    simulated, so that a slow frame does not cause slower ones
+        :param phase_budget_fractions: share of the frame time budget of each phase (phases should not
+                                       be nested, or the time of the inner ones is counted twice)
+        :param clock: function returning the current time (in seconds)
+        """
+        self.tick = tick
+        self.frame_time_budget = frame_time_budget
+        self.max_ticks_per_frame = max_ticks_per_frame
+        self.phase_budgets = {name: fraction * frame_time_budget
+                              for name, fraction in phase_budget_fractions.items()}
+        self.clock = clock
+        self.histogram = FrameTimeHistogram()
+        self.phase_histograms = {name: FrameTimeHistogram() for name in self.phase_budgets}
+        self.frame_stats = {}
+        self.num_frames = 0
+        self.num_over_budget = 0
+        self.phase_over_budget = {name: 0 for name in self.phase_budgets}
+        self.dropped_time = 0.0
+        self._accumulator = 0.0
+        self._last_frame_t = None
+        self._phase_times = {}
+    @property
+    def alpha(self):
+        """
+        Interpolation factor for presentation: the fraction of a tick by which real time
+        is ahead of the last completed tick.
+        """
+        return self._accumulator / self.tick
+    @property
+    def frame_times(self):
+        """
+        The time since the previous frame and the time spent in each phase (so far) of the current frame.
+        """
+        return dict(self._phase_times, frame=self.frame_stats.get('frame_time', 0.0))
+    def begin_frame(self):
+        """
+        Start timing a frame.
+
+        :returns: the time (in seconds) since the previous frame was started (0 for the first frame)
+        """
+        t = self.clock()
+        dt = 0.0 if self._last_frame_t is None else t - self._last_frame_t
+        self._last_frame_t = t
+        self._accumulator += dt
+        max_time = self.max_ticks_per_frame * self.tick
+        if self._accumulator > max_time:
+            self.dropped_time += self._accumulator - max_time
+            self._accumulator = max_time
+        self._phase_times = {name: 0.0 for name in self.phase_budgets}
+        self.frame_stats = {'frame_time': dt, 'ticks': 0}
+        return dt
+    @property
+    def num_pending_ticks(self):
+        """
+        The number of ticks which :meth:`ticks` will yield in the current frame.
+        """
+        return int(self._accumulator // self.tick)
+    def ticks(self):
+        """
+        Iterate over the fixed ticks which are due in the current frame, yielding the tick length each time.
+        """
+        for _ in range(self.num_pending_ticks):
+            self._accumulator -= self.tick
+            self.frame_stats['ticks'] += 1
+            yield self.tick
+    @contextmanager
+    def phase(self, name):
+        """
+        Context manager which adds the time spent in its body to that of phase *name* of the current frame.
+        """
+        t0 = self.clock()
+        try:
+            yield
+        finally:
+            self._phase_times[name] = self._phase_times.get(name, 0.0) + self.clock() - t0
+    def end_frame(self):
+        """
+        Finish timing a frame, updating :attr:`frame_stats` and the histograms.
+        """
+        stats = self.frame_stats
+        stats.update(self._phase_times)
+        stats['alpha'] = self.alpha
+        if self.num_frames > 0:
+            # the first frame has no frame time:
+            self.histogram.add(stats['frame_time'])
+            if stats['frame_time'] > self.frame_time_budget:
+                self.num_over_budget += 1
+        for name, t in self._phase_times.items():
+            if name in self.phase_histograms:
+                self.phase_histograms[name].add(t)
+                if t > self.phase_budgets[name]:
+                    self.phase_over_budget[name] += 1
+        self.num_frames += 1
+        return stats
+    def format_stats(self):
+        """
+        A multi-line text report of the frame time histogram and the time spent in each phase.
+        """
+        lines = ['frame time (budget %.2f ms, exceeded by %d frames, %.3f s dropped):'
+                 % (1e3*self.frame_time_budget, self.num_over_budget, self.dropped_time),
+                 self.histogram.format()]
+        for name, histogram in self.phase_histograms.items():
+            lines.append('%s: mean %.2f ms, p99 %.2f ms, max %.2f ms (budget %.2f ms, exceeded by %d frames)'
+                         % (name, 1e3*histogram.mean, 1e3*histogram.percentile(99), 1e3*histogram.max,
+                            1e3*self.phase_budgets[name], self.phase_over_budget[name]))
+        return '\n'.join(lines)
@@ -9,12 +9,27 @@ INCH2METER = 0.0254
 
 from .table import PoolTable
 from .physics import PoolPhysics
+from .rotations import set_matrix_from_quaternion
 
 
 class PoolGame(object):
     """
     Game state for a pool "game".
 
+    Besides the (double precision) ball state which is evaluated from the physics engine,
+    the game owns preallocated, renderer-ready (single precision) state buffers
+    which are updated in place on every :meth:`step`:
+
+      - ``ball_quaternions``: shape (*N*, 4) ball orientations
+      - ``ball_mesh_positions``: shape (*N*, 3) ball positions
+      - ``ball_world_matrices``: shape (*N*, 4, 4) ball world transformations
+      - ``ball_rotation_matrices``: shape (*N*, 3, 3) view of the rotation blocks of ``ball_world_matrices``
+
+    Renderers should bind these arrays directly (e.g. via :meth:`Node.bind_world_matrix`)
+    rather than copy from them.  When the game is stepped at a fixed tick, the buffers may
+    instead be set to a state interpolated between the last two ticks
+    (see :meth:`interpolate_render_state`).
+
     :param ball_colors: array defining a base color for each ball
     :
     """
@@ -44,10 +59,18 @@ class PoolGame(object):
         self.ball_positions = self.table.calc_racked_positions()
         self.ball_velocities = np.zeros((self.num_balls, 3), dtype=np.float64)
         self.ball_angular_velocities = np.zeros((self.num_balls, 3), dtype=np.float64)
-        self.ball_quaternions = np.zeros((self.num_balls, 4), dtype=np.float64)
-        self.ball_quaternions[:,3] = 1
+        self._ball_quaternions = np.zeros((self.num_balls, 4), dtype=np.float64)
+        self._ball_quaternions[:,3] = 1
+        self._last_ball_positions = self.ball_positions.copy()
+        self._last_ball_quaternions = self._ball_quaternions.copy()
+        self.ball_quaternions = np.empty((self.num_balls, 4), dtype=np.float32)
+        self.ball_mesh_positions = np.empty((self.num_balls, 3), dtype=np.float32)
+        self.ball_world_matrices = np.empty((self.num_balls, 4, 4), dtype=np.float32)
+        self.ball_world_matrices[:] = np.eye(4, dtype=np.float32)
+        self.ball_rotation_matrices = self.ball_world_matrices[:,:3,:3].transpose(0,2,1)
         self.t = 0.0
         self.ntt = 0.0
+        self.update_render_state()
 
     def reset(self, **kwargs):
         """
@@ -58,10 +81,13 @@ class PoolGame(object):
         self.ball_positions[:] = self.table.calc_racked_positions()
         self.ball_velocities[:] = 0
         self.ball_angular_velocities[:] = 0
-        self.ball_quaternions[:] = 0
-        self.ball_quaternions[:,3] = 1
+        self._ball_quaternions[:] = 0
+        self._ball_quaternions[:,3] = 1
+        self._last_ball_positions[:] = self.ball_positions
+        self._last_ball_quaternions[:] = self._ball_quaternions
         self.t = 0.0
         self.ntt = 0.0
+        self.update_render_state()
         _logger.debug('game reset')
 
     @property
@@ -70,12 +96,42 @@ class PoolGame(object):
 
     def step(self, dt, **kwargs):
         self.t += dt
+        self._last_ball_positions[:] = self.ball_positions
+        self._last_ball_quaternions[:] = self._ball_quaternions
         self.physics.step(dt, **kwargs)
         self.physics.eval_positions(self.t, out=self.ball_positions)
         self.physics.eval_velocities(self.t, out=self.ball_velocities)
         self.physics.eval_angular_velocities(self.t, out=self.ball_angular_velocities)
-        for q, omega in zip(self.ball_quaternions, self.ball_angular_velocities):
-            q_w = q[3]
-            q[3] -= 0.5 * dt * omega.dot(q[:3])
-            q[:3] += 0.5 * dt * (q_w * omega + np.cross(omega, q[:3]))
-            q /= np.sqrt(np.dot(q, q))
+        q, omega = self._ball_quaternions, self.ball_angular_velocities
+        q_w = q[:,3].copy()
+        q[:,3] -= 0.5 * dt * np.einsum('ij,ij->i', omega, q[:,:3])
+        q[:,:3] += 0.5 * dt * (q_w[:,np.newaxis] * omega + np.cross(omega, q[:,:3]))
+        q /= np.sqrt(np.einsum('ij,ij->i', q, q))[:,np.newaxis]
+        self.update_render_state()
+
+    def update_render_state(self):
+        """
+        Update the renderer-ready state buffers from the current (double precision) ball state.
+        """
+        self.ball_mesh_positions[:] = self.ball_positions
+        self.ball_quaternions[:] = self._ball_quaternions
+        self._update_matrices()
+
+    def interpolate_render_state(self, alpha):
+        """
+        Update the renderer-ready state buffers to the ball state interpolated between the
+        previous step (*alpha* = 0) and the current one (*alpha* = 1).
+        """
+        p0, p1 = self._last_ball_positions, self.ball_positions
+        self.ball_mesh_positions[:] = p0 + alpha * (p1 - p0)
+        q0, q1 = self._last_ball_quaternions, self._ball_quaternions
+        # normalized linear interpolation along the shorter arc:
+        sign = np.where(np.einsum('ij,ij->i', q0, q1) < 0, -1.0, 1.0)[:,np.newaxis]
+        q = (1 - alpha) * sign * q0 + alpha * q1
+        q /= np.sqrt(np.einsum('ij,ij->i', q, q))[:,np.newaxis]
+        self.ball_quaternions[:] = q
+        self._update_matrices()
+
+    def _update_matrices(self):
+        self.ball_world_matrices[:,3,:3] = self.ball_mesh_positions
+        set_matrix_from_quaternion(self.ball_quaternions, out=self.ball_rotation_matrices)
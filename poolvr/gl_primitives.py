@@ -3,13 +3,45 @@ from logging import getLogger
 _logger = getLogger(__name__)
 import numpy as np
 import OpenGL.GL as gl
+from OpenGL import contextdata
 
 
 from .gl_rendering import Primitive, Mesh, Material, CubeTexture
-from .gl_techniques import SKYBOX_TECHNIQUE
+from .gl_techniques import SKYBOX_TECHNIQUE, PLANAR_SHADOW_TECHNIQUE
 from .fake_ode import ode_or_fake_it
 
 
+# geometry arrays of the procedurally generated primitives, keyed by type and parameters:
+_GEOMETRY_CACHE = {}
+_GEOMETRY_BUFFERS_KEY = 'poolvr.gl_primitives.geometry_buffers'
+
+
+def cached_geometry(key, generate):
+    """
+    The arrays (``indices`` and vertex attributes) of the geometry identified by *key* (its type and parameters):
+    they are computed by *generate* (a function returning a dict of the arrays) only the first time, and made
+    read-only, as all primitives with that geometry share them.
+    """
+    geometry = _GEOMETRY_CACHE.get(key)
+    if geometry is None:
+        geometry = generate()
+        for values in geometry.values():
+            values.flags.writeable = False
+        _GEOMETRY_CACHE[key] = geometry
+    return geometry
+
+
+def geometry_buffers():
+    """
+    The buffer objects of the cached geometry arrays in the current GL context, keyed by the ``id`` of the array.
+    """
+    buffers = contextdata.getValue(_GEOMETRY_BUFFERS_KEY)
+    if buffers is None:
+        buffers = {}
+        contextdata.setValue(_GEOMETRY_BUFFERS_KEY, buffers)
+    return buffers
+
+
 def triangulate_quad(quad_face, flip_normals=False):
     if flip_normals:
         return [[quad_face[0], quad_face[2], quad_face[1]], [quad_face[0], quad_face[3], quad_face[2]]]
@@ -17,6 +49,35 @@ def triangulate_quad(quad_face, flip_normals=False):
         return [[quad_face[0], quad_face[1], quad_face[2]], [quad_face[0], quad_face[2], quad_face[3]]]
 
 
+class CachedGeometryPrimitive(Primitive):
+    def __init__(self, mode, geometry, **attributes):
+        """
+        A :ref:`Primitive` whose indices and vertex attributes are those of a :func:`cached_geometry`:
+        all primitives with the same geometry share its arrays, and the buffer objects of the arrays
+        (per GL context, see :func:`geometry_buffers`).
+
+        :param **attributes: additional (e.g. per-instance) attributes
+        """
+        self.geometry = geometry
+        self._geometry_ids = set(id(values) for values in geometry.values())
+        attributes = dict({name: values for name, values in geometry.items() if name != 'indices'}, **attributes)
+        Primitive.__init__(self, mode, geometry['indices'], **attributes)
+    def init_gl(self, force=False):
+        if force:
+            buffers = geometry_buffers()
+            for values in self.geometry.values():
+                buffers.pop(id(values), None)
+        Primitive.init_gl(self, force=force)
+    def _init_buffer(self, target, values, usage):
+        if id(values) not in self._geometry_ids:
+            return Primitive._init_buffer(self, target, values, usage)
+        buffers = geometry_buffers()
+        buffer_id = buffers.get(id(values))
+        if buffer_id is None:
+            buffer_id = buffers[id(values)] = Primitive._init_buffer(self, target, values, usage)
+        return buffer_id
+
+
 class SingleMaterialMesh(Mesh):
     def __init__(self, material, primitives, *args, **kwargs):
         Mesh.__init__(self, {material: primitives}, *args, **kwargs)
@@ -103,29 +164,38 @@ class BoxMesh(SingleMaterialMesh):
         return body
 
 
-class CylinderPrimitive(Primitive):
-    def __init__(self, radius=0.5, height=1.0, num_radial=12):
+def cylinder_geometry(radius=0.5, height=1.0, num_radial=12, center=(0.0, 0.0, 0.0)):
+    theta = np.linspace(0, 2*np.pi, num_radial+1)[:-1]
+    directions = np.stack([np.cos(theta), np.zeros(num_radial), np.sin(theta)], axis=-1)
+    vertices = np.empty((2*num_radial+2, 3), dtype=np.float32)
+    vertices[:-2:2] = radius * directions
+    vertices[1:-2:2] = radius * directions
+    vertices[:-2:2,1] = -0.5*height
+    vertices[1:-2:2,1] = 0.5*height
+    vertices[-2:] = [[0.0, -0.5*height, 0.0],
+                     [0.0,  0.5*height, 0.0]]
+    vertices += center
+    normals = np.empty((2*num_radial+2, 3), dtype=np.float32)
+    normals[:-2:2] = normals[1:-2:2] = directions
+    normals[-2:] = [[0.0, -1.0, 0.0],
+                    [0.0,  1.0, 0.0]]
+    i = 2 * np.arange(num_radial)
+    j = (i + 2) % (2*num_radial)
+    bottom, top = np.full(num_radial, len(vertices)-2), np.full(num_radial, len(vertices)-1)
+    indices = np.concatenate([np.stack([i, i+1, j, j, i+1, j+1], axis=-1).ravel(),
+                              np.stack([bottom, i, j], axis=-1).ravel(),
+                              np.stack([top, i+1, j+1], axis=-1).ravel()]).astype(np.uint16)
+    return {'indices': indices, 'vertices': vertices, 'normals': normals}
+
+
+class CylinderPrimitive(CachedGeometryPrimitive):
+    def __init__(self, radius=0.5, height=1.0, num_radial=12, center=(0.0, 0.0, 0.0)):
         self.radius = radius
         self.height = height
         self.num_radial = num_radial
-        vertices = np.array([[radius*np.cos(theta), -0.5*height, radius*np.sin(theta),
-                              radius*np.cos(theta), 0.5*height, radius*np.sin(theta)]
-                             for theta in np.linspace(0, 2*np.pi, num_radial+1)[:-1]] + [[0.0, -0.5*height, 0.0,
-                                                                                          0.0,  0.5*height, 0.0]],
-                            dtype=np.float32).reshape(-1, 3)
-        normals = np.array([2*[np.cos(theta), 0.0, np.sin(theta)]
-                            for theta in np.linspace(0, 2*np.pi, num_radial+1)[:-1]] + [[0.0, -1.0, 0.0,
-                                                                                         0.0,  1.0, 0.0]],
-                           dtype=np.float32).reshape(-1, 3)
-        indices = np.array([[i, i+1, i+2, i+2, i+1, i+3] for i in range(0, 2*(num_radial-1), 2)] +
-                           [[2*num_radial-2, 2*num_radial-1, 0, 0, 2*num_radial-1, 1]],
-                           dtype=np.uint16).ravel()
-        indices = np.concatenate([indices,
-                                  np.array([(len(vertices)-2, i, i+2) for i in range(0, 2*(num_radial-1), 2)], dtype=np.uint16).reshape(-1),
-                                  np.array([(len(vertices)-2, 2*num_radial-2, 0)], dtype=np.uint16).reshape(-1),
-                                  np.array([(len(vertices)-1, i+1, i+3) for i in range(0, 2*(num_radial-1), 2)], dtype=np.uint16).reshape(-1),
-                                  np.array([(len(vertices)-1, 2*num_radial-1, 1)], dtype=np.uint16).reshape(-1)])
-        Primitive.__init__(self, gl.GL_TRIANGLES, indices, vertices=vertices, normals=normals)
+        geometry = cached_geometry(('cylinder', radius, height, num_radial, tuple(center)),
+                                   lambda: cylinder_geometry(radius, height, num_radial, center))
+        CachedGeometryPrimitive.__init__(self, gl.GL_TRIANGLES, geometry)
 
     @ode_or_fake_it
     def create_ode_mass(self, total_mass, direction=3):
@@ -144,43 +214,58 @@ class CylinderMesh(SingleMaterialMesh):
         primitives = [CylinderPrimitive(radius=radius, height=height, num_radial=num_radial)]
         if bottom_closed:
             basis = np.eye(3); basis[1,1] *= -1; basis[2,2] *= -1
-            circle = CirclePrimitive(radius=radius, num_radial=num_radial, basis=basis)
-            circle.attributes['vertices'][:,1] -= 0.5*height
-            primitives.append(circle)
+            primitives.append(CirclePrimitive(radius=radius, num_radial=num_radial, basis=basis,
+                                              center=(0.0, -0.5*height, 0.0)))
         if top_closed:
-            circle = CirclePrimitive(radius=radius, num_radial=num_radial)
-            circle.attributes['vertices'][:,1] += 0.5*height
-            primitives.append(circle)
+            primitives.append(CirclePrimitive(radius=radius, num_radial=num_radial,
+                                              center=(0.0, 0.5*height, 0.0)))
         super().__init__(material, primitives)
 
 
-class CirclePrimitive(Primitive):
-    def __init__(self, radius=0.5, num_radial=12, basis=None):
+def fan_geometry(radius=0.5, num_radial=12, apex=(0.0, 0.0, 0.0)):
+    """
+    A triangle fan from *apex* around a circle in the xz-plane.
+    """
+    theta = np.linspace(0, 2*np.pi, num_radial+1)[:-1]
+    vertices = np.zeros((num_radial+1, 3), dtype=np.float32)
+    vertices[0] = apex
+    vertices[1:,0] = radius * np.cos(theta)
+    vertices[1:,2] = radius * np.sin(theta)
+    indices = np.append(np.arange(num_radial+1), 1).astype(np.uint16)
+    return {'indices': indices, 'vertices': vertices}
+
+
+def circle_geometry(radius=0.5, num_radial=12, basis=None, center=(0.0, 0.0, 0.0)):
+    geometry = fan_geometry(radius, num_radial)
+    vertices = geometry['vertices']
+    normals = np.zeros((len(vertices), 3), dtype=np.float32)
+    normals[:,1] = 1
+    if basis is not None:
+        basis = np.asarray(basis, dtype=np.float32)
+        vertices[:] = vertices.dot(basis.T).dot(basis)
+        normals[:] = basis[1]
+    vertices += center
+    geometry['normals'] = normals
+    return geometry
+
+
+class CirclePrimitive(CachedGeometryPrimitive):
+    def __init__(self, radius=0.5, num_radial=12, basis=None, center=(0.0, 0.0, 0.0)):
         self.radius = radius
         self.num_radial = num_radial
-        vertices = np.concatenate([np.array([[0.0, 0.0, 0.0]], dtype=np.float32),
-                                   np.array([[radius*np.cos(theta), 0.0, radius*np.sin(theta)]
-                                             for theta in np.linspace(0, 2*np.pi, num_radial+1)[:-1]], dtype=np.float32)]).reshape(-1, 3)
-        normals = np.array(len(vertices) * [0.0, 1.0, 0.0], dtype=np.float32)
-        indices = np.array(list(range(len(vertices)))+[1], dtype=np.uint16)
-        if basis is not None:
-            i, j, k = basis
-            for iv, v in enumerate(vertices):
-                vertices[iv] = np.dot(v, i) * i + np.dot(v, j) * j + np.dot(v, k) * k
-            normals.reshape(-1,3)[:] = j
-        Primitive.__init__(self, gl.GL_TRIANGLE_FAN, indices, vertices=vertices, normals=normals)
-
-
-class ConePrimitive(Primitive):
+        key = ('circle', radius, num_radial, None if basis is None else tuple(np.ravel(basis)), tuple(center))
+        geometry = cached_geometry(key, lambda: circle_geometry(radius, num_radial, basis, center))
+        CachedGeometryPrimitive.__init__(self, gl.GL_TRIANGLE_FAN, geometry)
+
+
+class ConePrimitive(CachedGeometryPrimitive):
     def __init__(self, radius=0.5, height=1.0, num_radial=12):
         self.radius = radius
         self.height = height
         self.num_radial = num_radial
-        vertices = np.concatenate([np.array([[0.0, height, 0.0]], dtype=np.float32),
-                                   np.array([[radius*np.cos(theta), 0.0, radius*np.sin(theta)]
-                                             for theta in np.linspace(0, 2*np.pi, num_radial+1)[:-1]], dtype=np.float32)]).reshape(-1, 3)
-        indices = np.array(list(range(len(vertices)))+[1], dtype=np.uint16)
-        Primitive.__init__(self, gl.GL_TRIANGLE_FAN, indices, vertices=vertices)
+        geometry = cached_geometry(('cone', radius, height, num_radial),
+                                   lambda: fan_geometry(radius, num_radial, apex=(0.0, height, 0.0)))
+        CachedGeometryPrimitive.__init__(self, gl.GL_TRIANGLE_FAN, geometry)
 
 
 class ConeMesh(SingleMaterialMesh):
@@ -241,7 +326,39 @@ class PlaneMesh(SingleMaterialMesh):
         self.primitive = primitive
 
 
-class SpherePrimitive(Primitive):
+def sphere_geometry(radius=0.5,
+                    widthSegments=16,
+                    heightSegments=12,
+                    phiStart=0.0,
+                    phiLength=2*np.pi,
+                    thetaStart=0.0,
+                    thetaLength=np.pi):
+    thetaEnd = thetaStart + thetaLength
+    u = np.arange(widthSegments+1) / widthSegments
+    v = np.arange(heightSegments+1) / heightSegments
+    phi = (phiStart + u * phiLength)[np.newaxis,:]
+    theta = (thetaStart + v * thetaLength)[:,np.newaxis]
+    vertices = np.empty((heightSegments+1, widthSegments+1, 3), dtype=np.float32)
+    vertices[...,0] = -radius * np.cos(phi) * np.sin(theta)
+    vertices[...,1] = radius * np.cos(theta)
+    vertices[...,2] = radius * np.sin(phi) * np.sin(theta)
+    uvs = np.empty((heightSegments+1, widthSegments+1, 2), dtype=np.float32)
+    uvs[...,0] = u[np.newaxis,:]
+    uvs[...,1] = 1 - v[:,np.newaxis]
+    grid = np.arange((heightSegments+1) * (widthSegments+1)).reshape(heightSegments+1, widthSegments+1)
+    v1, v2, v3, v4 = grid[:-1,1:], grid[:-1,:-1], grid[1:,:-1], grid[1:,1:]
+    # the two triangles of each quad of the grid (the degenerate ones at the poles are omitted):
+    triangles = np.stack([np.stack([v1, v2, v4], axis=-1),
+                          np.stack([v2, v3, v4], axis=-1)], axis=2)
+    rows = np.arange(heightSegments)
+    mask = np.stack([(rows != 0) | (thetaStart > 0),
+                     (rows != heightSegments - 1) | (thetaEnd < np.pi)], axis=-1)
+    mask = np.broadcast_to(mask[:,np.newaxis,:], triangles.shape[:3])
+    indices = triangles[mask].astype(np.uint16).ravel()
+    return {'indices': indices, 'vertices': vertices.reshape(-1, 3), 'uvs': uvs.reshape(-1, 2)}
+
+
+class SpherePrimitive(CachedGeometryPrimitive):
     """
     Sphere geometry based on three.js implementation:
     https://github.com/mrdoob/three.js/blob/44ec6fa7a277a3ee0d2883d9686978655bdac235/src/geometries/SphereGeometry.js
@@ -261,41 +378,9 @@ class SpherePrimitive(Primitive):
         self.phiLength = phiLength
         self.thetaStart = thetaStart
         self.thetaLength = thetaLength
-        thetaEnd = thetaStart + thetaLength
-        index = 0
-        vertices = []
-        uvs = []
-        positions = []
-        # *** TODO *** vectorize:
-        for iy in range(0, heightSegments+1):
-            verticesRow = []
-            v = iy / heightSegments
-            for ix in range(0, widthSegments+1):
-                u = ix / widthSegments
-                px = -radius * np.cos(phiStart + u * phiLength) * np.sin(thetaStart + v * thetaLength)
-                py = radius * np.cos(thetaStart + v * thetaLength)
-                pz = radius * np.sin(phiStart + u * phiLength) * np.sin(thetaStart + v * thetaLength)
-                positions.append([px, py, pz])
-                uvs.append([u, 1-v])
-                verticesRow.append(index)
-                index += 1
-            vertices.append(verticesRow)
-        indices = []
-        for iy in range(heightSegments):
-            for ix in range(widthSegments):
-                v1 = vertices[iy][ix+1]
-                v2 = vertices[iy][ix]
-                v3 = vertices[iy+1][ix]
-                v4 = vertices[iy+1][ix+1]
-                if iy != 0 or thetaStart > 0:
-                    indices.append([v1, v2, v4])
-                if iy != heightSegments - 1 or thetaEnd < np.pi:
-                    indices.append([v2, v3, v4])
-        indices = np.array(indices, dtype=np.uint16).ravel()
-        vertices = np.array(positions, dtype=np.float32)
-        uvs = np.array(uvs, dtype=np.float32)
-        Primitive.__init__(self, gl.GL_TRIANGLE_STRIP, indices,
-                           vertices=vertices, uvs=uvs)
+        params = (radius, widthSegments, heightSegments, phiStart, phiLength, thetaStart, thetaLength)
+        geometry = cached_geometry(('sphere',) + params, lambda: sphere_geometry(*params))
+        CachedGeometryPrimitive.__init__(self, gl.GL_TRIANGLE_STRIP, geometry)
 
     @ode_or_fake_it
     def create_ode_mass(self, total_mass):
@@ -326,46 +411,77 @@ class SphereMesh(SingleMaterialMesh):
 
 
 class ProjectedMesh(SingleMaterialMesh):
-    def __init__(self, mesh, material, primitives=None,
+    def __init__(self, mesh, material=None, primitives=None,
                  normal=(0.0, 1.0, 0.0), c=1.02*0.77,
                  light_position=(0.0, 100.2, 0.0, 0.1)):
+        """
+        The shadow of *mesh* (by default, of all of its primitives) cast by a light at (homogeneous)
+        *light_position* onto the plane ``dot(normal, x) = c``.
+
+        The projection onto the plane is done by the vertex shader of *material*'s technique
+        (by default :ref:`PLANAR_SHADOW_TECHNIQUE`), which is given the plane and light as uniforms,
+        and the shadow shares the world transformation of *mesh*, so that it follows *mesh*
+        without any per-frame updates.
+        """
+        if material is None:
+            material = Material(PLANAR_SHADOW_TECHNIQUE)
         if primitives is None:
             primitives = list(itertools.chain.from_iterable(mesh.primitives.values()))
         super().__init__(material, primitives)
         self.mesh = mesh
+        self.bind_world_matrix(mesh.world_matrix)
+        # the shadow is not within the bounds of the primitives:
+        self.cullable = False
         self.normal = np.array(normal)
         self.c = c
-        self._plane = np.array(list(self.normal[:]) + [-self.c])
-        self._shadow_matrix = np.eye(4, dtype=np.float32)
-        self.light_position = light_position
+        self._plane = np.array(list(self.normal[:]) + [-self.c], dtype=np.float32)
+        self.light_position = np.array(light_position, dtype=np.float32)
+        material.values['u_shadow_plane'] = self._plane
+        material.values['u_light_position'] = self.light_position
 
     def update(self, c=None):
+        """
+        Move the plane onto which the shadow is cast to ``dot(normal, x) = c``.
+        """
         if c is not None:
             self.c = c
-            self._plane = np.array(list(self.normal[:]) + [-self.c])
-        light_position = self.light_position
-        v = self._plane.dot(light_position)
-        shadow_matrix = self._shadow_matrix
-        shadow_matrix[:,0] = -light_position[0] * self._plane
-        shadow_matrix[0,0] += v
-        shadow_matrix[:,1] = -light_position[1] * self._plane
-        shadow_matrix[1,1] += v
-        shadow_matrix[:,2] = -light_position[2] * self._plane
-        shadow_matrix[2,2] += v
-        shadow_matrix[:,3] = -light_position[3] * self._plane
-        shadow_matrix[3,3] += v
-        self.mesh.world_matrix.dot(shadow_matrix, out=self.world_matrix)
+            self._plane[3] = -c
+
+    def update_world_matrices(self, world_matrix=None):
+        # the world transformation is that of the shadow-casting mesh, which updates it:
+        for child in self.children:
+            child.update_world_matrices(world_matrix=self.world_matrix)
 
 
 class ArrowMesh(SingleMaterialMesh):
     def __init__(self, material=None, head_radius=0.05, tail_radius=0.02,
                  head_length=0.1, tail_length=1, num_radial=12):
         head = ConePrimitive(radius=head_radius, height=head_length, num_radial=num_radial)
-        tail = CylinderPrimitive(radius=tail_radius, height=tail_length, num_radial=num_radial)
-        tail.attributes['vertices'][:,1] -= 0.5*tail_length
+        tail = CylinderPrimitive(radius=tail_radius, height=tail_length, num_radial=num_radial,
+                                 center=(0.0, -0.5*tail_length, 0.0))
         super().__init__(material, [head, tail])
 
 
+def arrow_geometry(head_radius=0.05, tail_radius=0.02, head_length=0.1, tail_length=1, num_radial=12):
+    """
+    The geometry of an :class:`ArrowMesh` as a single list of triangles.
+    """
+    head = fan_geometry(head_radius, num_radial, apex=(0.0, head_length, 0.0))
+    tail = cylinder_geometry(tail_radius, tail_length, num_radial, center=(0.0, -0.5*tail_length, 0.0))
+    k = np.arange(1, num_radial+1)
+    head_indices = np.stack([np.zeros(num_radial, dtype=np.int64), k, k % num_radial + 1], axis=-1).ravel()
+    return {'indices': np.concatenate([head_indices, tail['indices'] + len(head['vertices'])]).astype(np.uint16),
+            'vertices': np.concatenate([head['vertices'], tail['vertices']])}
+
+
+class ArrowPrimitive(CachedGeometryPrimitive):
+    def __init__(self, head_radius=0.05, tail_radius=0.02, head_length=0.1, tail_length=1, num_radial=12):
+        "A :ref:`Primitive` with the geometry of an :class:`ArrowMesh`, which is drawn by a single draw call."
+        params = (head_radius, tail_radius, head_length, tail_length, num_radial)
+        geometry = cached_geometry(('arrow',) + params, lambda: arrow_geometry(*params))
+        CachedGeometryPrimitive.__init__(self, gl.GL_TRIANGLES, geometry)
+
+
 class SkyBoxMesh(SingleMaterialMesh):
     def __init__(self, cube_map_image_paths):
         primitive = BoxPrimitive(400,400,400)
@@ -1,14 +1,25 @@
 import re
 import copy
-from ctypes import c_float, POINTER, c_void_p
+import itertools
+from ctypes import c_float, c_ubyte, POINTER, c_void_p
 from contextlib import contextmanager
 import logging
 import numpy as np
-import PIL.Image as Image
 import OpenGL.GL as gl
 
 
+from .texture_cache import load_texture_levels
+from .rotations import set_matrix_from_quaternion, set_quaternion_from_matrix
+from . import program_cache
+
+
 CHECK_GL_ERRORS = False
+USE_PERSISTENT_MAPPING = True
+USE_TEXTURE_CACHE = True
+USE_PROGRAM_CACHE = True
+
+
+STREAMING_USAGES = (gl.GL_DYNAMIC_DRAW, gl.GL_STREAM_DRAW)
 
 
 DTYPE_COMPONENT_TYPE = {
@@ -32,6 +43,26 @@ GLSL_TYPE_SPEC = {
     'sampler2D': gl.GL_SAMPLER_2D,
     'samplerCube': gl.GL_SAMPLER_CUBE
 }
+SAMPLER_TEXTURE_TARGET = {
+    gl.GL_SAMPLER_2D: gl.GL_TEXTURE_2D,
+    gl.GL_SAMPLER_CUBE: gl.GL_TEXTURE_CUBE_MAP
+}
+
+
+STD140_LAYOUT = {
+    # GL type: (base alignment in bytes, size in bytes, shape)
+    gl.GL_FLOAT: (4, 4, ()),
+    gl.GL_FLOAT_VEC2: (8, 8, (2,)),
+    gl.GL_FLOAT_VEC3: (16, 12, (3,)),
+    gl.GL_FLOAT_VEC4: (16, 16, (4,)),
+    gl.GL_FLOAT_MAT4: (16, 64, (4,4)),
+}
+FRAME_UNIFORM_BLOCK = 'FrameData'
+UNIFORM_BLOCK_BINDINGS = {
+    FRAME_UNIFORM_BLOCK: 0
+}
+# GLSL sources which are substituted for the lines "#include <name>" of shader sources (see Program):
+SHADER_INCLUDES = {}
 
 
 TYPE_TO_UNIFORM_FN = {
@@ -77,12 +108,20 @@ class GLRendering(object):
 class Program(GLRendering):
     ATTRIBUTE_DECL_RE = re.compile(r"\s*attribute\s+(?P<type_spec>\w+)\s+(?P<attribute_name>\w+)\s*;")
     UNIFORM_DECL_RE = re.compile(r"\s*uniform\s+(?P<type_spec>\w+)(?P<array_spec>\[\d+\])?\s+(?P<uniform_name>\w+)\s*(=\s*(?P<initialization>.*)\s*;|;)")
+    UNIFORM_BLOCK_DECL_RE = re.compile(r"\s*(layout\s*\([^)]*\)\s*)?uniform\s+(?P<block_name>\w+)\s*(\{.*)?$")
+    STEREO_DECL_RE = re.compile(r"^\s*mat4\s+u_eye_projections\s*\[2\]\s*;", re.MULTILINE)
+    INCLUDE_RE = re.compile(r"^[ \t]*#include\s+<(?P<name>\w+)>[ \t]*$", re.MULTILINE)
     _current = None
     def __init__(self, vs_src, fs_src, parse_attributes=True, parse_uniforms=True, name=None):
         """
         GLSL program
+
+        The lines ``#include <name>`` of the shader sources are replaced by ``SHADER_INCLUDES[name]``
+        (e.g. ``#include <frame_data>``, see :ref:`FrameUniformBuffer`).
         """
         super().__init__(name=name)
+        vs_src = self.expand_includes(vs_src)
+        fs_src = self.expand_includes(fs_src)
         self.vs_src = vs_src
         self.fs_src = fs_src
         self.program_id = None
@@ -112,14 +151,35 @@ class Program(GLRendering):
             self.uniforms = uniforms
         else:
             self.uniforms = {}
+        self.uniform_blocks = []
+        for line in vs_src.split('\n') + fs_src.split('\n'):
+            m = self.UNIFORM_BLOCK_DECL_RE.match(line)
+            if m and m.group('block_name') not in self.uniform_blocks:
+                self.uniform_blocks.append(m.group('block_name'))
+        # whether the vertex shader selects the eye of each instance for single-pass stereo rendering
+        # (see FrameUniformBuffer):
+        self.supports_stereo = FRAME_UNIFORM_BLOCK in self.uniform_blocks \
+                               and self.STEREO_DECL_RE.search(vs_src) is not None
         self._initialized = False
         _logger.debug('self.uniforms:\n%s', '\n'.join('%s: %s' % it for it in self.uniforms.items()))
+    @classmethod
+    def expand_includes(cls, src):
+        return cls.INCLUDE_RE.sub(lambda m: SHADER_INCLUDES[m.group('name')], src)
     def init_gl(self, force=False):
         if force:
             self.program_id = None
         if self.program_id is not None:
             return self.program_id
         Program._current = None
+        use_cache = USE_PROGRAM_CACHE and program_cache.is_supported()
+        if use_cache:
+            cache_key = program_cache.program_cache_key(self.vs_src, self.fs_src)
+            program_id = gl.glCreateProgram()
+            if program_cache.load_program_binary(program_id, cache_key):
+                self.program_id = program_id
+                _logger.debug('%s.init_gl: OK (loaded cached binary)', self.__class__.__name__)
+                return
+            gl.glDeleteProgram(program_id)
         vs = gl.glCreateShader(gl.GL_VERTEX_SHADER)
         gl.glShaderSource(vs, self.vs_src)
         gl.glCompileShader(vs)
@@ -133,11 +193,17 @@ class Program(GLRendering):
         program_id = gl.glCreateProgram()
         gl.glAttachShader(program_id, vs)
         gl.glAttachShader(program_id, fs)
+        if use_cache:
+            gl.glProgramParameteri(program_id, gl.GL_PROGRAM_BINARY_RETRIEVABLE_HINT, gl.GL_TRUE)
         gl.glLinkProgram(program_id)
         if not gl.glGetProgramiv(program_id, gl.GL_LINK_STATUS):
             raise Exception('failed to link program')
         gl.glDetachShader(program_id, vs)
         gl.glDetachShader(program_id, fs)
+        gl.glDeleteShader(vs)
+        gl.glDeleteShader(fs)
+        if use_cache:
+            program_cache.save_program_binary(program_id, cache_key)
         self.program_id = program_id
         _logger.debug('%s.init_gl: OK', self.__class__.__name__)
     def use(self):
@@ -194,6 +260,12 @@ class Technique(GLRendering):
         _logger.debug(self.attributes)
         self.attribute_locations = {name: gl.glGetAttribLocation(program_id, name) for name in self.attributes.keys()}
         self.uniform_locations = {name: gl.glGetUniformLocation(program_id, name) for name in self.uniforms.keys()}
+        for block_name in self.program.uniform_blocks:
+            if block_name not in UNIFORM_BLOCK_BINDINGS:
+                continue
+            block_index = gl.glGetUniformBlockIndex(program_id, block_name)
+            if block_index != gl.GL_INVALID_INDEX:
+                gl.glUniformBlockBinding(program_id, block_index, UNIFORM_BLOCK_BINDINGS[block_name])
         self._initialized = True
         _logger.debug('%s.init_gl: OK', self.__class__.__name__)
     def use(self):
@@ -208,6 +280,26 @@ class Technique(GLRendering):
         if self._on_release:
             self._on_release(self)
         Technique._current = None
+    def set_uniform(self, uniform_name, value):
+        uniform = self.uniforms[uniform_name]
+        if 'array_size' in uniform:
+            ARRAY_TYPE_TO_UNIFORM_FN[uniform['type']](self.uniform_locations[uniform_name],
+                                                      uniform['array_size'], value)
+        else:
+            TYPE_TO_UNIFORM_FN[uniform['type']](self.uniform_locations[uniform_name], value)
+
+
+def tex_image_levels(target, levels):
+    """
+    Specify all mip levels of a texture image (of the currently bound texture).
+
+    :param levels: list of arrays of shape (height, width, 3 or 4), e.g. as returned by :func:`load_texture_levels`
+    """
+    for level, data in enumerate(levels):
+        height, width, num_components = data.shape
+        fmt = gl.GL_RGB if num_components == 3 else gl.GL_RGBA
+        gl.glTexImage2D(target, level, fmt, width, height, 0, fmt, gl.GL_UNSIGNED_BYTE,
+                        np.ascontiguousarray(data))
 
 
 class Texture(GLRendering):
@@ -226,6 +318,14 @@ class Texture(GLRendering):
         self.mag_filter = mag_filter
         self.wrap_s = wrap_s
         self.wrap_t = wrap_t
+        self._levels = None
+    def load(self):
+        """
+        Load the texture image data (without requiring a GL context, e.g. on a worker thread),
+        so that :meth:`init_gl` only needs to upload it.
+        """
+        if self._levels is None:
+            self._levels = load_texture_levels(self.uri, use_cache=USE_TEXTURE_CACHE)
     def init_gl(self, force=False):
         """
         Perform initialization for the texture on the current GL context
@@ -235,7 +335,8 @@ class Texture(GLRendering):
         """
         if self.texture_id is not None:
             if not force: return
-        image = Image.open(self.uri)
+        self.load()
+        levels, self._levels = self._levels, None
         texture_id = gl.glGenTextures(1)
         self.texture_id = texture_id
         gl.glBindTexture(gl.GL_TEXTURE_2D, texture_id)
@@ -246,13 +347,7 @@ class Texture(GLRendering):
         gl.glSamplerParameteri(sampler_id, gl.GL_TEXTURE_WRAP_S, self.wrap_s)
         gl.glSamplerParameteri(sampler_id, gl.GL_TEXTURE_WRAP_T, self.wrap_t)
         gl.glPixelStorei(gl.GL_UNPACK_ALIGNMENT, 1)
-        gl.glTexImage2D(gl.GL_TEXTURE_2D, 0,
-                        gl.GL_RGB if image.mode == 'RGB' else gl.GL_RGBA,
-                        image.width, image.height, 0,
-                        gl.GL_RGB if image.mode == 'RGB' else gl.GL_RGBA,
-                        gl.GL_UNSIGNED_BYTE,
-                        np.array(image.getdata(), dtype=np.ubyte))
-        gl.glGenerateMipmap(gl.GL_TEXTURE_2D)
+        tex_image_levels(gl.GL_TEXTURE_2D, levels)
         err = gl.glGetError()
         if err != gl.GL_NO_ERROR:
             raise Exception('failed to init texture: 0x%02x' % err)
@@ -277,6 +372,10 @@ class CubeTexture(Texture):
         self.uris = uris
         self.texture_id = None
         self.sampler_id = None
+        self._levels = None
+    def load(self):
+        if self._levels is None:
+            self._levels = [load_texture_levels(uri, use_cache=USE_TEXTURE_CACHE) for uri in self.uris]
     def init_gl(self, force=False):
         """
         Perform initialization for the texture within the current GL context
@@ -296,15 +395,10 @@ class CubeTexture(Texture):
         gl.glSamplerParameteri(sampler_id, gl.GL_TEXTURE_WRAP_S, gl.GL_REPEAT)
         gl.glSamplerParameteri(sampler_id, gl.GL_TEXTURE_WRAP_T, gl.GL_REPEAT)
         gl.glPixelStorei(gl.GL_UNPACK_ALIGNMENT, 1)
-        for uri, target in zip(self.uris, self.TARGETS):
-            image = Image.open(uri)
-            gl.glTexImage2D(target, 0,
-                            gl.GL_RGB if image.mode == 'RGB' else gl.GL_RGBA,
-                            image.width, image.height, 0,
-                            gl.GL_RGB if image.mode == 'RGB' else gl.GL_RGBA,
-                            gl.GL_UNSIGNED_BYTE,
-                            np.array(image.getdata(), dtype=np.ubyte))
-        gl.glGenerateMipmap(gl.GL_TEXTURE_CUBE_MAP)
+        self.load()
+        for levels, target in zip(self._levels, self.TARGETS):
+            tex_image_levels(target, levels)
+        self._levels = None
         err = gl.glGetError()
         if err != gl.GL_NO_ERROR:
             raise Exception('failed to init cube texture: %s' % err)
@@ -350,8 +444,16 @@ class Material(GLRendering):
             raise Exception('failed to init material: %s' % err)
         self._initialized = True
         _logger.debug('%s.init_gl: OK', self.__class__.__name__)
-    def use(self,
+    def use(self, uniform_names=None,
             **frame_data):
+        """
+        Make this material's technique current, bind its textures and set its uniforms.
+
+        Uniform values are taken from the material's values or, if not defined there, from *frame_data*.
+
+        :param uniform_names: if specified, only the (non-sampler) uniforms with these names are set
+        :returns: the number of ``glUniform*`` calls made
+        """
         # if Material._current is self:
         #     return
         if not self._initialized:
@@ -360,16 +462,20 @@ class Material(GLRendering):
         if self._on_use:
             self._on_use(self, **frame_data)
         tex_unit = 0
+        num_uniform_calls = 0
         for uniform_name, location in self.technique.uniform_locations.items():
             uniform = self.technique.uniforms[uniform_name]
             uniform_type = uniform['type']
             if uniform_type in (gl.GL_SAMPLER_2D, gl.GL_SAMPLER_CUBE):
                 texture = self.textures[uniform_name]
                 gl.glActiveTexture(gl.GL_TEXTURE0+tex_unit)
-                gl.glBindTexture(uniform_type, texture.texture_id)
+                gl.glBindTexture(SAMPLER_TEXTURE_TARGET[uniform_type], texture.texture_id)
                 gl.glBindSampler(tex_unit, texture.sampler_id)
                 gl.glUniform1i(location, tex_unit)
                 tex_unit += 1
+                num_uniform_calls += 1
+                continue
+            elif uniform_names is not None and uniform_name not in uniform_names:
                 continue
             elif uniform_name in self.values:
                 value = self.values[uniform_name]
@@ -381,25 +487,309 @@ class Material(GLRendering):
                 ARRAY_TYPE_TO_UNIFORM_FN[uniform_type](location, uniform['array_size'], value)
             else:
                 TYPE_TO_UNIFORM_FN[uniform_type](location, value)
+            num_uniform_calls += 1
         if CHECK_GL_ERRORS:
             err = gl.glGetError()
             if err != gl.GL_NO_ERROR:
                 raise Exception('error setting material state: %d' % err)
         Material._current = self
+        return num_uniform_calls
     def release(self):
         if self._on_release:
             self._on_release(self)
         Material._current = None
 
 
+class StreamingBuffer(GLRendering):
+    NUM_SEGMENTS = 3
+    FENCE_TIMEOUT_NS = 1000000000
+    def __init__(self, nbytes, num_segments=NUM_SEGMENTS, target=gl.GL_ARRAY_BUFFER,
+                 usage=gl.GL_STREAM_DRAW, persistent=None, name=None):
+        """
+        A vertex buffer for data which is rewritten (e.g. every frame).
+
+        If the GL implementation supports ``glBufferStorage`` (GL 4.4 / ARB_buffer_storage),
+        the buffer is allocated as a ring of *num_segments* persistently mapped segments of
+        *nbytes* each: every :meth:`update` writes into the next segment directly from NumPy memory,
+        waiting on a fence only if the GPU may still be reading that segment.
+        Otherwise the buffer is "orphaned" with ``glBufferData`` before each ``glBufferSubData``.
+
+        :param nbytes: size in bytes of the data written by each :meth:`update`
+        :param persistent: whether to use persistent mapping, defaults to :ref:`USE_PERSISTENT_MAPPING`
+        """
+        super().__init__(name=name)
+        self.nbytes = nbytes
+        self.num_segments = num_segments
+        self.target = target
+        self.usage = usage
+        if persistent is None:
+            persistent = USE_PERSISTENT_MAPPING
+        self.persistent = persistent
+        self.buffer_id = None
+        self.segment = 0
+        self.offset = 0
+        self._mapped = None
+        self._fences = None
+    def init_gl(self, force=False):
+        if not force and self.buffer_id is not None:
+            return
+        self.buffer_id = gl.glGenBuffers(1)
+        gl.glBindBuffer(self.target, self.buffer_id)
+        self.segment = 0
+        self.offset = 0
+        self._mapped = None
+        if self.persistent and bool(gl.glBufferStorage):
+            flags = gl.GL_MAP_WRITE_BIT | gl.GL_MAP_PERSISTENT_BIT | gl.GL_MAP_COHERENT_BIT
+            size = self.num_segments * self.nbytes
+            gl.glBufferStorage(self.target, size, None, flags)
+            address = gl.glMapBufferRange(self.target, 0, size, flags)
+            if address:
+                self._mapped = np.ctypeslib.as_array((c_ubyte * size).from_address(address))
+                self._fences = self.num_segments * [None]
+            else:
+                _logger.warning('%s: failed to map buffer, falling back to orphaning', self.__class__.__name__)
+                gl.glDeleteBuffers(1, [self.buffer_id])
+                self.buffer_id = gl.glGenBuffers(1)
+                gl.glBindBuffer(self.target, self.buffer_id)
+        if self._mapped is None:
+            gl.glBufferData(self.target, self.nbytes, None, self.usage)
+        gl.glBindBuffer(self.target, 0)
+        if gl.glGetError() != gl.GL_NO_ERROR:
+            raise Exception('failed to init gl buffer')
+        _logger.debug('%s.init_gl: OK (persistently mapped: %s)', self.__class__.__name__, self._mapped is not None)
+    @property
+    def is_mapped(self):
+        return self._mapped is not None
+    def update(self, values):
+        """
+        Write the contents of the array *values* to the next segment of the buffer.
+        After the update, :ref:`offset` is the byte offset at which the data may be sourced.
+        """
+        values = np.ascontiguousarray(values)
+        nbytes = values.nbytes
+        if nbytes > self.nbytes:
+            raise Exception('%d bytes do not fit in streaming buffer of %d bytes' % (nbytes, self.nbytes))
+        if self._mapped is None:
+            gl.glBindBuffer(self.target, self.buffer_id)
+            gl.glBufferData(self.target, self.nbytes, None, self.usage)
+            gl.glBufferSubData(self.target, 0, nbytes, values)
+            gl.glBindBuffer(self.target, 0)
+            return
+        fences = self._fences
+        if fences[self.segment] is not None:
+            gl.glDeleteSync(fences[self.segment])
+        fences[self.segment] = gl.glFenceSync(gl.GL_SYNC_GPU_COMMANDS_COMPLETE, 0)
+        self.segment = (self.segment + 1) % self.num_segments
+        fence = fences[self.segment]
+        if fence is not None:
+            if gl.glClientWaitSync(fence, gl.GL_SYNC_FLUSH_COMMANDS_BIT,
+                                   self.FENCE_TIMEOUT_NS) == gl.GL_TIMEOUT_EXPIRED:
+                _logger.warning('%s: timed out waiting for fence', self.__class__.__name__)
+            gl.glDeleteSync(fence)
+            fences[self.segment] = None
+        self.offset = self.segment * self.nbytes
+        self._mapped[self.offset:self.offset+nbytes] = values.reshape(-1).view(np.uint8)
+    def release(self):
+        if self.buffer_id is None:
+            return
+        if self._mapped is not None:
+            for fence in self._fences:
+                if fence is not None:
+                    gl.glDeleteSync(fence)
+            gl.glBindBuffer(self.target, self.buffer_id)
+            gl.glUnmapBuffer(self.target)
+            gl.glBindBuffer(self.target, 0)
+            self._mapped = None
+        gl.glDeleteBuffers(1, [self.buffer_id])
+        self.buffer_id = None
+
+
+def std140_dtype(fields):
+    """
+    NumPy structured dtype with the std140 layout of a uniform block.
+
+    :param fields: sequence of (name, GL type) or (name, GL type, array size) of the members of the block,
+                   in order of declaration -- arrays are supported only of types whose size is a multiple of 16 bytes
+                   (for which the std140 array stride is the size of the type)
+    """
+    names, formats, offsets = [], [], []
+    offset = 0
+    for name, gl_type, *array_size in fields:
+        alignment, size, shape = STD140_LAYOUT[gl_type]
+        if array_size:
+            if size % 16:
+                raise ValueError('std140 arrays of GL type %s are not supported' % gl_type)
+            shape = (array_size[0],) + shape
+            size *= array_size[0]
+        offset += -offset % alignment
+        names.append(name)
+        formats.append((np.float32, shape) if shape else np.float32)
+        offsets.append(offset)
+        offset += size
+    return np.dtype({'names': names, 'formats': formats, 'offsets': offsets,
+                     'itemsize': offset + -offset % 16})
+
+
+class UniformBuffer(GLRendering):
+    def __init__(self, block_name, fields, name=None):
+        """
+        Uniform buffer object holding the values of a std140 uniform block, e.g.:
+
+        .. code-block:: glsl
+
+            layout(std140) uniform FrameData {
+              mat4 u_view;
+              ...
+            };
+
+        The buffer is bound to the binding point of the block in :ref:`UNIFORM_BLOCK_BINDINGS`,
+        which every :ref:`Technique` whose program declares the block is set to use.
+        Each :meth:`update` writes the values to the next segment of a :ref:`StreamingBuffer`,
+        so that updating the values several times per frame (e.g. once per eye) does not stall.
+
+        :param fields: sequence of (name, GL type) of the members of the block, in order of declaration
+        """
+        super().__init__(name=name)
+        self.block_name = block_name
+        self.binding = UNIFORM_BLOCK_BINDINGS[block_name]
+        self.dtype = std140_dtype(fields)
+        self.values = np.zeros(1, dtype=self.dtype)
+        self._stream = None
+    def init_gl(self, force=False):
+        if self._stream is not None:
+            if not force:
+                return
+            self._stream.release()
+        alignment = int(gl.glGetIntegerv(gl.GL_UNIFORM_BUFFER_OFFSET_ALIGNMENT))
+        nbytes = self.dtype.itemsize + -self.dtype.itemsize % alignment
+        self._stream = StreamingBuffer(nbytes, target=gl.GL_UNIFORM_BUFFER, usage=gl.GL_DYNAMIC_DRAW)
+        self._stream.init_gl()
+        _logger.debug('%s.init_gl: OK', self.__class__.__name__)
+    def update(self, **values):
+        """
+        Set the given members of the block, upload the block and bind it.
+        """
+        if self._stream is None:
+            self.init_gl()
+        for name, value in values.items():
+            self.values[name] = value
+        stream = self._stream
+        stream.update(self.values)
+        gl.glBindBufferRange(gl.GL_UNIFORM_BUFFER, self.binding, stream.buffer_id,
+                             stream.offset, self.dtype.itemsize)
+    def release(self):
+        if self._stream is not None:
+            self._stream.release()
+            self._stream = None
+
+
+class FrameUniformBuffer(UniformBuffer):
+    FIELDS = (('u_view', gl.GL_FLOAT_MAT4),
+              ('u_projection', gl.GL_FLOAT_MAT4),
+              ('u_camera', gl.GL_FLOAT_MAT4),
+              ('u_projection_lrbt', gl.GL_FLOAT_VEC4),
+              ('u_window_size', gl.GL_FLOAT_VEC2),
+              ('u_znear', gl.GL_FLOAT),
+              ('u_zfar', gl.GL_FLOAT),
+              ('u_stereo', gl.GL_FLOAT),
+              ('u_eye_transforms', gl.GL_FLOAT_MAT4, 2),
+              ('u_eye_projections', gl.GL_FLOAT_MAT4, 2))
+    FRAME_DATA_KEYS = (('u_view', 'view_matrix'),
+                       ('u_projection', 'projection_matrix'),
+                       ('u_camera', 'camera_matrix'),
+                       ('u_projection_lrbt', 'projection_lrbt'),
+                       ('u_window_size', 'window_size'),
+                       ('u_znear', 'znear'),
+                       ('u_zfar', 'zfar'))
+    STEREO_FRAME_DATA_KEYS = (('u_eye_transforms', 'eye_transforms'),
+                              ('u_eye_projections', 'projection_matrices'))
+    GLSL_EXTENSIONS = ('GL_ARB_uniform_buffer_object',
+                       'GL_ARB_draw_instanced',
+                       'GL_ARB_shader_viewport_layer_array',
+                       'GL_AMD_vertex_shader_viewport_index')
+    STEREO_EYE_GLSL = """int stereo_eye(void) {
+  int eye = int(u_stereo) * int(mod(float(gl_InstanceIDARB), 2.0));
+#if defined(GL_ARB_shader_viewport_layer_array) || defined(GL_AMD_vertex_shader_viewport_index)
+  gl_ViewportIndex = eye;
+#endif
+  return eye;
+}
+"""
+    def __init__(self, name=None):
+        """
+        The per-frame (per-eye) uniforms shared by all techniques, which vertex shaders declare
+        with the line ``#include <frame_data>`` (see :meth:`glsl_declaration`), as the block:
+
+        .. code-block:: glsl
+
+            layout(std140) uniform FrameData {
+              mat4 u_view;
+              mat4 u_projection;
+              mat4 u_camera;
+              vec4 u_projection_lrbt;
+              vec2 u_window_size;
+              float u_znear;
+              float u_zfar;
+              float u_stereo;
+              mat4 u_eye_transforms[2];
+              mat4 u_eye_projections[2];
+            };
+
+        The last three members are used for single-pass stereo rendering (see :meth:`RenderQueue.draw`):
+        when ``u_stereo`` is 1, every primitive is drawn with twice its number of instances, and the
+        vertex shader transforms each odd instance for the right eye and each even one for the left eye,
+        i.e. the view transformation of ``eye = stereo_eye()`` (which is ``int(u_stereo) * (gl_InstanceID % 2)``,
+        and also selects the viewport of the eye where supported) is ``u_eye_transforms[eye] * u_view``
+        and its projection is ``u_eye_projections[eye]``.
+        Otherwise (when rendering a single view) ``u_eye_transforms[0]`` is the identity and
+        ``u_eye_projections[0]`` is ``u_projection``.
+        """
+        super().__init__(FRAME_UNIFORM_BLOCK, self.FIELDS, name=name)
+    @classmethod
+    def glsl_declaration(cls):
+        """
+        The GLSL source (generated from :attr:`FIELDS`) which is included by ``#include <frame_data>``:
+        the extensions it requires, the declaration of the uniform block and the function ``int stereo_eye()``.
+        """
+        glsl_types = {gl_type: type_spec for type_spec, gl_type in GLSL_TYPE_SPEC.items()}
+        members = ''.join('  %s %s%s;\n' % (glsl_types[field[1]], field[0],
+                                            '[%d]' % field[2] if len(field) > 2 else '')
+                          for field in cls.FIELDS)
+        return ''.join('#extension %s : enable\n' % extension for extension in cls.GLSL_EXTENSIONS) \
+            + 'layout(std140) uniform %s {\n%s};\n' % (FRAME_UNIFORM_BLOCK, members) \
+            + cls.STEREO_EYE_GLSL
+    def update_frame_data(self, frame_data):
+        values = {name: frame_data[key] for name, key in self.FRAME_DATA_KEYS
+                  if frame_data.get(key, None) is not None}
+        if frame_data.get('stereo', False):
+            values['u_stereo'] = 1.0
+            values.update({name: frame_data[key] for name, key in self.STEREO_FRAME_DATA_KEYS})
+        else:
+            values['u_stereo'] = 0.0
+            self.values['u_eye_transforms'][0,0] = np.eye(4, dtype=np.float32)
+            if 'u_projection' in values:
+                self.values['u_eye_projections'][0,0] = values['u_projection']
+        self.update(**values)
+
+
+SHADER_INCLUDES['frame_data'] = FrameUniformBuffer.glsl_declaration()
+
+
 class Primitive(GLRendering):
+    POSITION_ATTRIBUTES = ('a_position', 'vertices')
     def __init__(self, mode, indices=None, index_buffer=None,
                  attribute_usage=None, attribute_divisors=None,
+                 num_instances=None, bounds=None,
                  name=None, **attributes):
         """
 
         A class for specifying GL vertex attribute objects and providing vertex buffer data
 
+        :param attribute_divisors: dict mapping attribute name to instance divisor
+                                   (overriding those specified by the :ref:`Technique`)
+        :param num_instances: if specified, the primitive is drawn with ``glDrawElementsInstanced``
+        :param bounds: shape (2, 3) axis-aligned bounding box of the vertex positions, for primitives whose
+                       positions are not specified by array data (e.g. glTF primitives) -- see :meth:`calc_bounds`
         :param **attributes: all other passed keywords are interpreted as providing
                              array data for the named (by keyword) attribute:
                              ``<attribute_name>=<ndarray of data>``
@@ -412,47 +802,210 @@ class Primitive(GLRendering):
         if attribute_usage is None:
             attribute_usage = {}
         self.attribute_usage = attribute_usage
+        if attribute_divisors is None:
+            attribute_divisors = {}
+        self.attribute_divisors = attribute_divisors
+        self.num_instances = num_instances
         self.attributes = attributes
+        self._bounds = None if bounds is None else np.array(bounds, dtype=np.float32).reshape(2, 3)
+        self.bounds = self._bounds
         self.buffers = None
+        self.streams = {}
         self.vaos = {}
+        self._vao_offsets = {}
     def init_gl(self, force=False):
         if not force and self.buffers is not None:
             return
+        self.bounds = self.calc_bounds()
         self.buffers = {}
+        self.streams = {}
+        self._vao_offsets = {}
         for name, values in self.attributes.items():
-            values = values.tobytes()
-            vbo = gl.glGenBuffers(1)
-            gl.glBindBuffer(gl.GL_ARRAY_BUFFER, vbo)
             if name in self.attribute_usage:
                 usage = self.attribute_usage[name]
             else:
                 usage = gl.GL_STATIC_DRAW
-            gl.glBufferData(gl.GL_ARRAY_BUFFER, len(values), values, usage)
-            if gl.glGetError() != gl.GL_NO_ERROR:
-                raise Exception('failed to init gl buffer')
-            self.buffers[name] = vbo
-            gl.glBindBuffer(gl.GL_ARRAY_BUFFER, 0)
+            if usage in STREAMING_USAGES:
+                stream = StreamingBuffer(values.nbytes, usage=usage, name=name)
+                stream.init_gl()
+                stream.update(values)
+                self.streams[name] = stream
+                self.buffers[name] = stream.buffer_id
+                continue
+            self.buffers[name] = self._init_buffer(gl.GL_ARRAY_BUFFER, values, usage)
         if force or (self.index_buffer is None and self.indices is not None):
-            indices = self.indices.tobytes()
-            vao = gl.glGenBuffers(1)
-            gl.glBindBuffer(gl.GL_ELEMENT_ARRAY_BUFFER, vao)
-            gl.glBufferData(gl.GL_ELEMENT_ARRAY_BUFFER,
-                            len(indices), indices, gl.GL_STATIC_DRAW)
-            if gl.glGetError() != gl.GL_NO_ERROR:
-                raise Exception('failed to init gl buffer')
-            self.index_buffer = vao
-            gl.glBindBuffer(gl.GL_ELEMENT_ARRAY_BUFFER, 0)
+            self.index_buffer = self._init_buffer(gl.GL_ELEMENT_ARRAY_BUFFER, self.indices, gl.GL_STATIC_DRAW)
         _logger.debug('%s.init_gl: OK', self.__class__.__name__)
+    def _init_buffer(self, target, values, usage):
+        """
+        Create a buffer object bound to *target*, containing *values*.
+
+        :returns: the buffer object
+        """
+        values = np.ascontiguousarray(values)
+        buffer_id = gl.glGenBuffers(1)
+        gl.glBindBuffer(target, buffer_id)
+        gl.glBufferData(target, values.nbytes, values, usage)
+        if gl.glGetError() != gl.GL_NO_ERROR:
+            raise Exception('failed to init gl buffer')
+        gl.glBindBuffer(target, 0)
+        return buffer_id
     def alias(self, attribute_name, alias):
         if attribute_name not in self.attributes:
             raise Exception('attribute "%s" is not defined' % attribute_name)
         self.attributes[alias] = self.attributes[attribute_name]
-    def update_buffer_data(self, name, buffer_data):
-        vbo = self.buffers[name]
-        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, vbo)
-        buffer_data = buffer_data.tobytes()
-        gl.glBufferSubData(gl.GL_ARRAY_BUFFER, 0, len(buffer_data), buffer_data)
+    def calc_bounds(self):
+        """
+        Compute the axis-aligned bounding box of the primitive's vertex positions (the first of
+        :attr:`POSITION_ATTRIBUTES` which it defines).
+
+        :returns: shape (2, 3) array of the minimum and maximum corners of the box (the *bounds* which
+                  were specified for the primitive, if any), or ``None`` if the primitive is instanced
+                  (i.e. positioned by per-instance attributes) or has no vertex positions
+        """
+        if self._bounds is not None:
+            return self._bounds
+        if self.num_instances is not None:
+            return None
+        for name in self.POSITION_ATTRIBUTES:
+            positions = self.attributes.get(name)
+            if positions is not None:
+                break
+        else:
+            return None
+        if positions.size == 0 or positions.shape[-1] < 3:
+            return None
+        positions = positions.reshape(-1, positions.shape[-1])[:,:3]
+        return np.array([positions.min(axis=0), positions.max(axis=0)], dtype=np.float32)
+    def update_buffer_data(self, name, buffer_data=None):
+        """
+        Upload new data for the named attribute (by default, the current contents of ``attributes[name]``).
+
+        Attributes with a dynamic usage (see :ref:`STREAMING_USAGES`) are written through a
+        :ref:`StreamingBuffer`, so the byte offset at which their data is sourced may change
+        with each update -- see :meth:`bind_streams`.
+        """
+        if buffer_data is None:
+            buffer_data = self.attributes[name]
+        if name in self.streams:
+            self.streams[name].update(buffer_data)
+            return
+        buffer_data = np.ascontiguousarray(buffer_data)
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.buffers[name])
+        gl.glBufferSubData(gl.GL_ARRAY_BUFFER, 0, buffer_data.nbytes, buffer_data)
         gl.glBindBuffer(gl.GL_ARRAY_BUFFER, 0)
+    def init_vao(self, technique, num_views=1):
+        """
+        Create the vertex array object for drawing the primitive with *technique*.
+
+        :param num_views: number of views drawn by each draw call (see :meth:`draw_elements`) -- the
+                          divisors of per-instance attributes are multiplied by it, so that every
+                          instance is drawn once for each view
+        :returns: the vertex array object, which is stored in :attr:`vaos` (keyed by *technique*,
+                  or by ``(technique, num_views)`` if *num_views* > 1)
+        """
+        key = technique if num_views == 1 else (technique, num_views)
+        vao = gl.glGenVertexArrays(1)
+        self.vaos[key] = vao
+        gl.glBindVertexArray(vao)
+        offsets = self._vao_offsets.setdefault(key, {})
+        for attribute_name, location in technique.attribute_locations.items():
+            attribute = self.attributes[attribute_name]
+            offset = self.streams[attribute_name].offset if attribute_name in self.streams else 0
+            offsets[attribute_name] = offset
+            gl.glEnableVertexAttribArray(location)
+            gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.buffers[attribute_name])
+            gl.glVertexAttribPointer(location, attribute.shape[-1],
+                                     DTYPE_COMPONENT_TYPE[attribute.dtype], False,
+                                     attribute.dtype.itemsize * attribute.shape[-1],
+                                     c_void_p(offset))
+            if attribute_name in self.attribute_divisors:
+                gl.glVertexAttribDivisor(location, num_views * self.attribute_divisors[attribute_name])
+            elif attribute_name in technique.attribute_divisors:
+                gl.glVertexAttribDivisor(location, num_views * technique.attribute_divisors[attribute_name])
+        gl.glBindVertexArray(0)
+        for location in technique.attribute_locations.values():
+            gl.glDisableVertexAttribArray(location)
+        return vao
+    def draw_elements(self, num_views=1):
+        """
+        :param num_views: if > 1, each instance is drawn *num_views* times (as consecutive instances),
+                          for single-pass stereo rendering (see :ref:`FrameUniformBuffer`)
+        """
+        if self.num_instances is None and num_views == 1:
+            gl.glDrawElements(self.mode, self.indices.size, DTYPE_COMPONENT_TYPE[self.indices.dtype],
+                              NULL_PTR)
+        else:
+            gl.glDrawElementsInstanced(self.mode, self.indices.size, DTYPE_COMPONENT_TYPE[self.indices.dtype],
+                                       NULL_PTR, (self.num_instances or 1) * num_views)
+    def bind_streams(self, technique, num_views=1):
+        """
+        Point the (currently bound) vertex array object for *technique* (and *num_views*) at the current
+        segments of the streamed attribute buffers.
+        """
+        if not self.streams:
+            return
+        offsets = self._vao_offsets.setdefault(technique if num_views == 1 else (technique, num_views), {})
+        for name, stream in self.streams.items():
+            location = technique.attribute_locations.get(name)
+            if location is None or offsets.get(name, 0) == stream.offset:
+                continue
+            attribute = self.attributes[name]
+            gl.glBindBuffer(gl.GL_ARRAY_BUFFER, stream.buffer_id)
+            gl.glVertexAttribPointer(location, attribute.shape[-1],
+                                     DTYPE_COMPONENT_TYPE[attribute.dtype], False,
+                                     attribute.dtype.itemsize * attribute.shape[-1],
+                                     c_void_p(stream.offset))
+            offsets[name] = stream.offset
+
+
+def transform_bounds(bounds, matrices):
+    """
+    Compute the axis-aligned bounding boxes of (arrays of) axis-aligned boxes transformed by (arrays of)
+    affine transformations.
+
+    :param bounds: shape (..., 2, 3) array of the minimum and maximum corners of the boxes
+    :param matrices: shape (..., 4, 4) array of transformations (applied to row vectors, as world matrices are)
+    :returns: shape (..., 2, 3) array of the minimum and maximum corners of the transformed boxes
+    """
+    center = 0.5 * (bounds[...,0,:] + bounds[...,1,:])
+    extent = 0.5 * (bounds[...,1,:] - bounds[...,0,:])
+    rotation = matrices[...,:3,:3]
+    center = np.einsum('...i,...ij->...j', center, rotation) + matrices[...,3,:3]
+    extent = np.einsum('...i,...ij->...j', extent, np.abs(rotation))
+    return np.stack([center - extent, center + extent], axis=-2)
+
+
+def calc_frustum_planes(view, projection):
+    """
+    Calculate the planes which bound the view frustum of the given view and projection matrices
+    (which are applied to row vectors, as in *frame_data*).
+
+    :returns: shape (6, 4) array of the left, right, bottom, top, near and far planes, whose normals point
+              into the frustum, i.e. a point *p* is in the frustum if ``planes.dot((p[0], p[1], p[2], 1)) >= 0``
+    """
+    matrix = view.dot(projection)
+    planes = np.empty((6, 4), dtype=np.float32)
+    planes[0::2] = matrix[:,3] + matrix[:,:3].T
+    planes[1::2] = matrix[:,3] - matrix[:,:3].T
+    return planes
+
+
+def bounds_in_frustum(bounds, planes):
+    """
+    Test whether (arrays of) axis-aligned boxes intersect a view frustum.
+
+    The test is conservative: a box is only rejected if it lies entirely outside of one of the frustum's planes.
+
+    :param bounds: shape (..., 2, 3) array of the minimum and maximum corners of the boxes
+    :param planes: shape (6, 4) array of frustum planes (see :func:`calc_frustum_planes`)
+    :returns: boolean array of shape (...)
+    """
+    center = 0.5 * (bounds[...,0,:] + bounds[...,1,:])
+    extent = 0.5 * (bounds[...,1,:] - bounds[...,0,:])
+    distance = center.dot(planes[:,:3].T) + planes[:,3]
+    radius = extent.dot(np.abs(planes[:,:3]).T)
+    return (distance + radius >= 0).all(axis=-1)
 
 
 class Node(GLRendering):
@@ -470,6 +1023,14 @@ class Node(GLRendering):
         self.world_matrix = matrix.copy()
         self.world_position = self.world_matrix[3,:3]
         self.children = []
+    def bind_world_matrix(self, world_matrix):
+        """
+        Use *world_matrix* as the storage for this node's world transformation,
+        e.g. a row of a preallocated array of transformations which is updated elsewhere
+        (see :ref:`PoolGame.ball_world_matrices`).
+        """
+        self.world_matrix = world_matrix
+        self.world_position = world_matrix[3,:3]
     def update_world_matrices(self, world_matrix=None):
         """
         Update all world transformations for the subtree rooted at this node
@@ -495,14 +1056,23 @@ class Mesh(Node):
         """
         A drawable collection of :ref:`Primitive`s, with a :ref:`Material` assigned for each one.
 
+        If the mesh is :attr:`cullable` (the default), it is not drawn in views whose frustum does not intersect
+        its bounds (computed by :meth:`init_gl`) -- a :ref:`RenderQueue` culls each of its primitives separately.
+        Meshes whose vertex shaders move their vertices elsewhere (e.g. :ref:`ProjectedMesh`) should not be cullable.
+
         :param primitives: should be a dict which maps :ref:`Material` to list of :ref:`Primitive` which use that material
         """
         Node.__init__(self, matrix=matrix, name=name)
         self.primitives = primitives
         self.visible = True
+        self.cullable = True
+        self.bounds = None
+        self.world_bounds = None
         self._before_draw = before_draw
         self._after_draw = after_draw
         self._initialized = False
+        self._normal_world = None
+        self._normal_world_key = np.empty((3,3), dtype=np.float32)
     def init_gl(self, force=False):
         if self._initialized and not force:
             return
@@ -514,37 +1084,61 @@ class Mesh(Node):
                 prim.init_gl(force=force)
                 if technique in prim.vaos:
                     continue
-                vao = gl.glGenVertexArrays(1)
-                prim.vaos[technique] = vao
-                gl.glBindVertexArray(vao)
-                for attribute_name, location in technique.attribute_locations.items():
-                    attribute = prim.attributes[attribute_name]
-                    gl.glEnableVertexAttribArray(location)
-                    gl.glBindBuffer(gl.GL_ARRAY_BUFFER, prim.buffers[attribute_name])
-                    gl.glVertexAttribPointer(location, attribute.shape[-1],
-                                             DTYPE_COMPONENT_TYPE[attribute.dtype], False,
-                                             attribute.dtype.itemsize * attribute.shape[-1],
-                                             NULL_PTR)
-                    if attribute_name in technique.attribute_divisors:
-                        gl.glVertexAttribDivisor(location, technique.attribute_divisors[attribute_name])
-                gl.glBindVertexArray(0)
-                for location in technique.attribute_locations.values():
-                    gl.glDisableVertexAttribArray(location)
+                prim.init_vao(technique)
         err = gl.glGetError()
         if err != gl.GL_NO_ERROR:
             raise Exception('failed to init primitive: %s' % err)
+        self.bounds = self.calc_bounds()
+        self.update_world_bounds()
         _logger.debug('%s.init_gl: OK' % self.__class__.__name__)
         self._initialized = True
+    def calc_bounds(self):
+        """
+        Compute the (local) axis-aligned bounding box of the mesh's primitives (see :meth:`Primitive.calc_bounds`).
+
+        :returns: shape (2, 3) array of the minimum and maximum corners of the box, or ``None``
+                  if the bounds of any of the primitives are undetermined
+        """
+        prims = list(itertools.chain.from_iterable(self.primitives.values()))
+        if not prims or any(prim.bounds is None for prim in prims):
+            return None
+        bounds = np.array([prim.bounds for prim in prims])
+        return np.array([bounds[:,0].min(axis=0), bounds[:,1].max(axis=0)], dtype=np.float32)
+    def update_world_matrices(self, world_matrix=None):
+        super().update_world_matrices(world_matrix=world_matrix)
+        self.update_world_bounds()
+    def update_world_bounds(self):
+        """
+        Update the world-space axis-aligned bounding box (:attr:`world_bounds`) of the mesh from its
+        (local) :attr:`bounds` and current world transformation.
+        """
+        if self.bounds is None:
+            self.world_bounds = None
+        else:
+            self.world_bounds = transform_bounds(self.bounds, self.world_matrix)
+        return self.world_bounds
+    def in_frustum(self, frustum_planes):
+        """
+        Whether the mesh (at its current world transformation) may be visible in the view frustum bounded by
+        *frustum_planes* (see :func:`calc_frustum_planes`).  Meshes which are not :attr:`cullable` or whose bounds
+        are undetermined are always considered visible.
+        """
+        if not self.cullable or self.update_world_bounds() is None:
+            return True
+        return bool(bounds_in_frustum(self.world_bounds, frustum_planes))
     def draw(self, **frame_data):
         if not self.visible:
             return super().draw(**frame_data)
+        frustum_planes = frame_data.get('frustum_planes', None)
+        if frustum_planes is not None and not self.in_frustum(frustum_planes):
+            return super().draw(**frame_data)
         view = frame_data.get('view_matrix', None)
         projection = frame_data.get('projection_matrix', None)
         if self._before_draw:
             self._before_draw(self, **frame_data)
         if view is not None:
             self.world_matrix.dot(view, out=self._modelview)
-            self._normal[:] = np.linalg.inv(self._modelview[:3,:3].T)
+            self.update_normal_matrix(view, out=self._normal)
         for material, prims in self.primitives.items():
             material.use(u_view=view, u_projection=projection, u_modelview=self._modelview,
                          u_modelview_inverse_transpose=self._normal, u_model=self.world_matrix,
@@ -552,9 +1146,9 @@ class Mesh(Node):
             technique = material.technique
             for prim in prims:
                 gl.glBindVertexArray(prim.vaos[technique])
+                prim.bind_streams(technique)
                 gl.glBindBuffer(gl.GL_ELEMENT_ARRAY_BUFFER, prim.index_buffer)
-                gl.glDrawElements(prim.mode, prim.indices.size, DTYPE_COMPONENT_TYPE[prim.indices.dtype],
-                                  c_void_p(0))
+                prim.draw_elements()
                 if CHECK_GL_ERRORS:
                     err = gl.glGetError()
                     if err != gl.GL_NO_ERROR:
@@ -569,6 +1163,308 @@ class Mesh(Node):
         super().draw(**frame_data)
 
 
+    @property
+    def is_batchable(self):
+        """
+        Whether the mesh may be drawn by a :ref:`RenderQueue` (i.e. it is drawn by :meth:`Mesh.draw`
+        without any custom drawing hooks).
+        """
+        return type(self).draw is Mesh.draw and self._before_draw is None and self._after_draw is None
+    def update_normal_matrix(self, view, out=None):
+        """
+        Compute the normal matrix (the inverse transpose of the upper-left 3x3 block of the modelview matrix).
+
+        The inverse of the world transformation is cached and only recomputed when it changes
+        (i.e. never for static meshes).  The view transformation is assumed to be rigid, so that its
+        inverse transpose is itself.
+        """
+        world = self.world_matrix[:3,:3]
+        if self._normal_world is None or not (world == self._normal_world_key).all():
+            self._normal_world_key[:] = world
+            self._normal_world = np.linalg.inv(self._normal_world_key.T)
+        if out is None:
+            out = np.empty((3,3), dtype=np.float32)
+        return self._normal_world.dot(view[:3,:3], out=out)
+
+
+def single_pass_stereo_supported():
+    """
+    Whether the current GL context supports single-pass stereo rendering (see :ref:`FrameUniformBuffer`),
+    which requires instanced drawing, multiple viewports and the selection of the viewport by the vertex shader.
+    """
+    try:
+        extensions = {gl.glGetStringi(gl.GL_EXTENSIONS, i).decode()
+                      for i in range(gl.glGetIntegerv(gl.GL_NUM_EXTENSIONS))}
+    except Exception:
+        return False
+    return 'GL_ARB_draw_instanced' in extensions and 'GL_ARB_viewport_array' in extensions \
+        and ('GL_ARB_shader_viewport_layer_array' in extensions
+             or 'GL_AMD_vertex_shader_viewport_index' in extensions)
+
+
+class RenderQueue(object):
+    PER_MESH_UNIFORMS = ('u_modelview', 'u_modelview_inverse_transpose', 'u_model')
+    STAT_NAMES = ('draw_calls', 'technique_changes', 'material_changes', 'vao_changes', 'unbatched_draws',
+                  'uniform_calls', 'uniform_buffer_updates', 'culled_items')
+    def __init__(self, frustum_culling=True):
+        """
+        Sorts the primitives of submitted meshes by technique, material and vertex array object
+        in order to minimize GL state changes (techniques, materials and primitives are ordered
+        by their first submission, so that the draw order is reproducible).
+
+        Meshes which draw themselves (e.g. :ref:`FragBox`, or meshes with drawing hooks) are drawn
+        by their own ``draw`` method, at the same position in the draw order as they were submitted.
+
+        Both eyes of a stereo frame may be drawn in a single pass (see :meth:`draw`).
+
+        If *frustum_culling* is true, the primitives of :attr:`Mesh.cullable` meshes whose bounds
+        (see :meth:`Primitive.calc_bounds`), at the current world transformations of the meshes,
+        do not intersect the view frustum are not drawn, and meshes which draw themselves are
+        passed the frustum planes (``frame_data['frustum_planes']``, see :meth:`Mesh.draw`).
+
+        The number of draw calls (i.e. of drawn primitives), culled primitives and state changes
+        since the last :meth:`reset_stats` are counted in :ref:`stats`.  If :attr:`gpu_timer` is set (to a :ref:`GPUTimerQueries`),
+        the GPU time of each technique's draw calls and of each unbatched mesh is measured.
+
+        The per-frame uniforms are uploaded once per :meth:`draw` (once per eye, for techniques which are
+        drawn for each eye) to a :ref:`FrameUniformBuffer`, from which the built-in techniques read them.
+        """
+        self.frame_uniforms = FrameUniformBuffer()
+        self.frustum_culling = frustum_culling
+        self.gpu_timer = None
+        self._segments = []
+        self._ordinals = {}
+        self._num_stereo_items = []
+        self._cull_data = []
+        self.stats = dict.fromkeys(self.STAT_NAMES, 0)
+    def reset_stats(self):
+        self.stats.update(dict.fromkeys(self.STAT_NAMES, 0))
+    def submit(self, meshes):
+        """
+        Replace the queue's contents with the given meshes (and their descendants).
+        """
+        self._segments = []
+        self._ordinals = {}
+        self._submit(meshes)
+        # the items of techniques which support single-pass stereo rendering are drawn first,
+        # so that for stereo frames each segment splits into a single-pass part and a per-eye part:
+        self._num_stereo_items = []
+        self._cull_data = []
+        for segment in self._segments:
+            if isinstance(segment, list):
+                segment.sort(key=lambda item: (not item[1].program.supports_stereo, item[0]))
+                self._num_stereo_items.append(sum(item[1].program.supports_stereo for item in segment))
+                self._cull_data.append(self._calc_cull_data(segment))
+            else:
+                self._num_stereo_items.append(0)
+                self._cull_data.append(None)
+    def _calc_cull_data(self, items):
+        if not self.frustum_culling:
+            return None
+        indices = [i for i, item in enumerate(items) if item[4].cullable and item[3].bounds is not None]
+        if not indices:
+            return None
+        return (np.array(indices),
+                np.array([items[i][3].bounds for i in indices]),
+                [items[i][4] for i in indices])
+    def _frustum_planes(self, frame_data):
+        view = frame_data.get('view_matrix', None)
+        projection = frame_data.get('projection_matrix', None)
+        if not self.frustum_culling or view is None or projection is None:
+            return None
+        return calc_frustum_planes(view, projection)
+    def _cull(self, i, frustum_planes, start=0, stop=None):
+        """
+        :returns: the items of the *i*-th segment (from *start* to *stop*) which may be visible in any
+                  of the view frusta bounded by *frustum_planes*
+        """
+        items = self._segments[i][start:stop]
+        cull_data = self._cull_data[i]
+        if cull_data is None or any(planes is None for planes in frustum_planes):
+            return items
+        indices, bounds, meshes = cull_data
+        world_bounds = transform_bounds(bounds, np.array([mesh.world_matrix for mesh in meshes]))
+        in_frustum = np.zeros(len(indices), dtype=bool)
+        for planes in frustum_planes:
+            in_frustum |= bounds_in_frustum(world_bounds, planes)
+        visible = np.ones(len(self._segments[i]), dtype=bool)
+        visible[indices] = in_frustum
+        visible = visible[start:stop]
+        num_culled = len(visible) - np.count_nonzero(visible)
+        if num_culled == 0:
+            return items
+        self.stats['culled_items'] += num_culled
+        return [item for item, item_visible in zip(items, visible) if item_visible]
+    def _submit(self, meshes):
+        segments = self._segments
+        # techniques, materials and primitives are sorted by the order in which they were first submitted
+        # (so that the draw order is the same in every run):
+        ordinals = self._ordinals
+        for mesh in meshes:
+            if not (isinstance(mesh, Mesh) and mesh.is_batchable):
+                segments.append(mesh)
+                continue
+            if mesh.visible:
+                if not segments or not isinstance(segments[-1], list):
+                    segments.append([])
+                items = segments[-1]
+                for material, prims in mesh.primitives.items():
+                    technique = material.technique
+                    for prim in prims:
+                        key = tuple(ordinals.setdefault(id(obj), len(ordinals))
+                                    for obj in (technique, material, prim))
+                        items.append((key, technique, material, prim, mesh))
+            self._submit(mesh.children)
+    def draw(self, **frame_data):
+        """
+        Draw the queue's contents.
+
+        If ``frame_data['stereo']`` is true, both eyes are drawn in a single pass: *frame_data* should
+        contain the head's view matrix (``view_matrix``), the transformations from the head's view
+        space to each eye's (``eye_transforms``), the per-eye ``eye_matrices`` (view matrices),
+        ``camera_matrices``, ``projection_matrices`` and ``projection_lrbts``, and the viewport
+        ``(x, y, width, height)`` of each eye (``eye_viewports``, e.g. the halves of a side-by-side
+        render target), which are selected by the vertex shader (see :ref:`FrameUniformBuffer`).
+        Each primitive is then drawn by one instanced draw call for both eyes.  Meshes which draw
+        themselves and techniques whose shaders do not support single-pass stereo rendering
+        (see :attr:`Program.supports_stereo`) are drawn once for each eye.
+        """
+        if frame_data.get('stereo', False):
+            return self._draw_stereo(frame_data)
+        stats = self.stats
+        self.frame_uniforms.update_frame_data(frame_data)
+        stats['uniform_buffer_updates'] += 1
+        frustum_planes = self._frustum_planes(frame_data)
+        frame_data['frustum_planes'] = frustum_planes
+        for i, segment in enumerate(self._segments):
+            if isinstance(segment, list):
+                self._draw_items(self._cull(i, [frustum_planes]), frame_data)
+            else:
+                if self.gpu_timer is not None:
+                    self.gpu_timer.begin(getattr(segment, 'name', None) or segment.__class__.__name__)
+                segment.draw(**frame_data)
+                stats['unbatched_draws'] += 1
+        if self.gpu_timer is not None:
+            self.gpu_timer.end()
+    def _draw_stereo(self, frame_data):
+        stats = self.stats
+        viewports = frame_data['eye_viewports']
+        eye_frame_data = [dict(frame_data, stereo=False,
+                               view_matrix=frame_data['eye_matrices'][eye],
+                               camera_matrix=frame_data['camera_matrices'][eye],
+                               projection_matrix=frame_data['projection_matrices'][eye],
+                               projection_lrbt=frame_data['projection_lrbts'][eye])
+                          for eye in (0,1)]
+        eye_frustum_planes = []
+        for data in eye_frame_data:
+            data['frustum_planes'] = self._frustum_planes(data)
+            eye_frustum_planes.append(data['frustum_planes'])
+        stereo_state = False
+        for i, (segment, num_stereo_items) in enumerate(zip(self._segments, self._num_stereo_items)):
+            if num_stereo_items:
+                if not stereo_state:
+                    for eye, viewport in enumerate(viewports):
+                        gl.glViewportIndexedf(eye, *viewport)
+                    self.frame_uniforms.update_frame_data(frame_data)
+                    stats['uniform_buffer_updates'] += 1
+                    stereo_state = True
+                # the items drawn for both eyes at once are culled by the union of the eyes' frusta:
+                self._draw_items(self._cull(i, eye_frustum_planes, stop=num_stereo_items), frame_data, num_views=2)
+                if num_stereo_items == len(segment):
+                    continue
+            stereo_state = False
+            for eye, viewport in enumerate(viewports):
+                gl.glViewport(*viewport)
+                self.frame_uniforms.update_frame_data(eye_frame_data[eye])
+                stats['uniform_buffer_updates'] += 1
+                if isinstance(segment, list):
+                    self._draw_items(self._cull(i, [eye_frustum_planes[eye]], start=num_stereo_items),
+                                     eye_frame_data[eye])
+                else:
+                    if self.gpu_timer is not None:
+                        self.gpu_timer.begin(getattr(segment, 'name', None) or segment.__class__.__name__)
+                    segment.draw(**eye_frame_data[eye])
+                    stats['unbatched_draws'] += 1
+        if self.gpu_timer is not None:
+            self.gpu_timer.end()
+    def _draw_items(self, items, frame_data, num_views=1):
+        stats = self.stats
+        view = frame_data.get('view_matrix', None)
+        projection = frame_data.get('projection_matrix', None)
+        frame_data = dict(frame_data, u_view=view, u_projection=projection)
+        modelview, normal = Mesh._modelview, Mesh._normal
+        technique = material = prim = mesh = None
+        for i, (_, item_technique, item_material, item_prim, item_mesh) in enumerate(items):
+            if item_technique is not technique:
+                if technique is not None:
+                    material.release()
+                    technique.release()
+                technique = item_technique
+                material = None
+                prim = None
+                if not item_material._initialized:
+                    item_material.init_gl()
+                if self.gpu_timer is not None:
+                    self.gpu_timer.begin(technique.name or 'technique_%x' % id(technique))
+                technique.use()
+                stats['technique_changes'] += 1
+                # frame uniforms which are not overridden by any material of the technique are set only once:
+                overridden = set()
+                for _, other_technique, other_material, _, _ in items[i:]:
+                    if other_technique is not technique:
+                        break
+                    overridden.update(other_material.values.keys())
+                frame_names = [name for name in technique.uniform_locations
+                               if name in frame_data
+                               and name not in overridden
+                               and name not in self.PER_MESH_UNIFORMS
+                               and technique.uniforms[name]['type'] not in (gl.GL_SAMPLER_2D, gl.GL_SAMPLER_CUBE)]
+                for name in frame_names:
+                    technique.set_uniform(name, frame_data[name])
+                stats['uniform_calls'] += len(frame_names)
+                material_names = [name for name in technique.uniform_locations
+                                  if name not in frame_names and name not in self.PER_MESH_UNIFORMS]
+                mesh_names = [name for name in self.PER_MESH_UNIFORMS if name in technique.uniform_locations]
+            if item_material is not material:
+                if material is not None:
+                    material.release()
+                material = item_material
+                stats['uniform_calls'] += material.use(uniform_names=material_names, **frame_data)
+                stats['material_changes'] += 1
+                mesh = None
+            if item_mesh is not mesh:
+                mesh = item_mesh
+                if view is not None:
+                    mesh.world_matrix.dot(view, out=modelview)
+                    mesh.update_normal_matrix(view, out=normal)
+                mesh_values = {'u_modelview': modelview,
+                               'u_modelview_inverse_transpose': normal,
+                               'u_model': mesh.world_matrix}
+                for name in mesh_names:
+                    technique.set_uniform(name, mesh_values[name])
+                stats['uniform_calls'] += len(mesh_names)
+            if item_prim is not prim:
+                prim = item_prim
+                if num_views == 1:
+                    vao = prim.vaos[technique]
+                else:
+                    vao = prim.vaos.get((technique, num_views)) or prim.init_vao(technique, num_views)
+                gl.glBindVertexArray(vao)
+                prim.bind_streams(technique, num_views)
+                gl.glBindBuffer(gl.GL_ELEMENT_ARRAY_BUFFER, prim.index_buffer)
+                stats['vao_changes'] += 1
+            prim.draw_elements(num_views)
+            stats['draw_calls'] += 1
+            if CHECK_GL_ERRORS:
+                err = gl.glGetError()
+                if err != gl.GL_NO_ERROR:
+                    raise Exception('error drawing primitive elements: %d' % err)
+        if technique is not None:
+            gl.glBindVertexArray(0)
+            material.release()
+            technique.release()
+
+
 class FragBox(Node):
     _VS_SRC = r"""#version 410 core
 const vec2 quadVertices[4] = vec2[4](vec2(-1.0, -1.0), vec2( 1.0, -1.0), vec2(-1.0,  1.0), vec2( 1.0,  1.0));
@@ -634,6 +1530,13 @@ class OpenGLRenderer(object):
         self.update_projection_matrix()
         self._gl_states = {}
         self._nframes = 0
+        self.render_queue = RenderQueue()
+    @property
+    def frame_stats(self):
+        """
+        Draw call and state change counts for the last rendered frame (see :ref:`RenderQueue`).
+        """
+        return self.render_queue.stats
     def update_projection_matrix(self):
         window_size, znear, zfar = self.window_size, self.znear, self.zfar
         self.projection_matrix[:] = calc_projection_matrix(np.pi / 180 * 60, window_size[0] / window_size[1], znear, zfar).T
@@ -645,7 +1548,7 @@ class OpenGLRenderer(object):
     def init_gl(self, clear_color=(0.0, 0.0, 0.0, 0.0)):
         gl.glClearColor(*clear_color)
         gl.glEnable(gl.GL_DEPTH_TEST)
-        gl.glViewport(0, 0, self.window_size[0], self.window_size[1])
+        gl.glViewport(0, 0, int(self.window_size[0]), int(self.window_size[1]))
     @contextmanager
     def render(self, meshes=None, **kwargs):
         """
@@ -678,9 +1581,10 @@ class OpenGLRenderer(object):
         #                   '\n'.join('%s:\n%s' % it for it in frame_data.items()))
         yield frame_data
         gl.glClear(gl.GL_COLOR_BUFFER_BIT | gl.GL_DEPTH_BUFFER_BIT)
+        self.render_queue.reset_stats()
         if meshes is not None:
-            for mesh in meshes:
-                mesh.draw(**frame_data)
+            self.render_queue.submit(meshes)
+            self.render_queue.draw(**frame_data)
         self._nframes += 1
     def process_input(self, **kwargs):
         pass
@@ -702,68 +1606,3 @@ def calc_projection_matrix(yfov, aspectRatio, znear, zfar):
                      [0, f, 0, 0],
                      [0, 0, (znear + zfar) / (znear - zfar), 2 * znear * zfar / (znear - zfar)],
                      [0, 0, -1, 0]], dtype=np.float32)
-
-
-def set_matrix_from_quaternion(quat, out=None):
-    """
-    Set the values of a 3x3 matrix to those of a rotation matrix.
-    """
-    if out is None:
-        out = np.empty((3,3), dtype=quat.dtype)
-    x, y, z, w = quat
-    yy = y**2
-    xx = x**2
-    zz = z**2
-    xy = x * y
-    xz = x * z
-    yz = y * z
-    wx = w * x
-    wy = w * y
-    wz = w * z
-    out[0] = [1.0 - 2.0 * (yy + zz),
-              2.0 * (xy - wz),
-              2.0 * (xz + wy)]
-    out[1] = [2.0 * (xy + wz),
-              1.0 - 2.0 * (xx + zz),
-              2.0 * (yz - wx)]
-    out[2] = [2.0 * (xz - wy),
-              2.0 * (yz + wx),
-              1.0 - 2.0 * (xx + yy)]
-    return out
-
-
-def set_quaternion_from_matrix(U, out=None):
-    """
-    http://www.euclideanspace.com/maths/geometry/rotations/conversions/matrixToQuaternion/index.htm
-
-    assumes the upper 3x3 of m is a pure rotation matrix (i.e, unscaled)
-    """
-    if out is None:
-        out = np.empty(4, dtype=U.dtype)
-    trace = U.trace()
-    if trace > 0:
-        s = 0.5 / np.sqrt(trace + 1.0)
-        w = 0.25 / s
-        x = (U[2,1] - U[1,2]) * s
-        y = (U[0,2] - U[2,0]) * s
-        z = (U[1,0] - U[0,1]) * s
-    elif U[0,0] > U[1,1] and U[0,0] > U[2,2]:
-        s = 2.0 * np.sqrt(1.0 + U[0,0] - U[1,1] - U[2,2])
-        w = (U[2,1] - U[1,2]) / s
-        x = 0.25 * s
-        y = (U[0,1] + U[1,0]) / s
-        z = (U[0,2] + U[2,0]) / s
-    elif U[1,1] > U[2,2]:
-        s = 2.0 * np.sqrt(1.0 + U[1,1] - U[0,0] - U[2,2])
-        w = (U[0,2] - U[2,0]) / s
-        x = (U[0,1] + U[1,0]) / s
-        y = 0.25 * s
-        z = (U[1,2] + U[2,1]) / s
-    else:
-        s = 2.0 * np.sqrt(1.0 + U[2,2] - U[0,0] - U[1,1])
-        w = (U[1,0] - U[0,1]) / s
-        x = (U[0,2] + U[2,0]) / s
-        y = (U[1,2] + U[2,1]) / s
-        z = 0.25 * s
-    out[:] = np.array([x, y, z, w])
-    return out
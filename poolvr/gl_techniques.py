@@ -14,26 +14,78 @@ TEXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
 
 EGA_TECHNIQUE = Technique(Program(pkgutil.get_data('poolvr', 'shaders/ega_vs.glsl').decode(),
                                   pkgutil.get_data('poolvr', 'shaders/ega_fs.glsl').decode()),
-                          uniforms={'u_color': {'value': [1.0, 0.0, 0.0, 0.0]}})
+                          uniforms={'u_color': {'value': [1.0, 0.0, 0.0, 0.0]}},
+                          name='ega')
 
 
 LAMBERT_TECHNIQUE = Technique(Program(pkgutil.get_data('poolvr', 'shaders/lambert_vs.glsl').decode(),
                                       pkgutil.get_data('poolvr', 'shaders/lambert_fs.glsl').decode()),
                               uniforms={'u_color': {'value': [0.0, 1.0, 1.0, 0.0]},
-                                        'u_lightpos': {'value': [1.0, 15.0, 1.5]}})
+                                        'u_lightpos': {'value': [1.0, 15.0, 1.5]}},
+                              name='lambert')
+
+
+BALL_INSTANCED_TECHNIQUE = Technique(Program(pkgutil.get_data('poolvr', 'shaders/ball_instanced_vs.glsl').decode(),
+                                             pkgutil.get_data('poolvr', 'shaders/ball_instanced_fs.glsl').decode()),
+                                     uniforms={'u_base_color': {'value': [1.0, 1.0, 1.0, 0.0]},
+                                               'u_lightpos': {'value': [1.0, 15.0, 1.5]},
+                                               'u_lambert': {'value': 1.0}},
+                                     attribute_divisors={'a_translate': 1,
+                                                         'a_quaternion': 1,
+                                                         'a_color': 1,
+                                                         'a_stripe': 1,
+                                                         'a_visible': 1},
+                                     name='ball_instanced')
+
+
+BALL_SHADOW_INSTANCED_TECHNIQUE = Technique(Program(pkgutil.get_data('poolvr', 'shaders/ball_shadow_instanced_vs.glsl').decode(),
+                                                    pkgutil.get_data('poolvr', 'shaders/ega_fs.glsl').decode()),
+                                            uniforms={'u_color': {'value': [0.01, 0.03, 0.001, 0.0]},
+                                                      'u_shadow_plane': {'value': [0.0, 1.0, 0.0, 0.0]},
+                                                      'u_light_position': {'value': [0.0, 100.2, 0.0, 0.1]}},
+                                            attribute_divisors={'a_translate': 1,
+                                                                'a_visible': 1},
+                                            name='ball_shadow_instanced')
+
+
+PLANAR_SHADOW_TECHNIQUE = Technique(Program(pkgutil.get_data('poolvr', 'shaders/planar_shadow_vs.glsl').decode(),
+                                            pkgutil.get_data('poolvr', 'shaders/ega_fs.glsl').decode()),
+                                    uniforms={'u_color': {'value': [0.01, 0.03, 0.001, 0.0]},
+                                              'u_shadow_plane': {'value': [0.0, 1.0, 0.0, 0.0]},
+                                              'u_light_position': {'value': [0.0, 100.2, 0.0, 0.1]}},
+                                    name='planar_shadow')
+
+
+GLYPH_INSTANCED_TECHNIQUE = Technique(Program(pkgutil.get_data('poolvr', 'shaders/glyph_instanced_vs.glsl').decode(),
+                                              pkgutil.get_data('poolvr', 'shaders/lambert_fs.glsl').decode()),
+                                      uniforms={'u_color': {'value': [1.0, 0.0, 0.0, 0.0]},
+                                                'u_lightpos': {'value': [1.0, 15.0, 1.5]}},
+                                      attribute_divisors={'a_translate': 1,
+                                                          'a_direction': 1},
+                                      name='glyph_instanced')
+
+
+GLYPH_SHADOW_INSTANCED_TECHNIQUE = Technique(Program(pkgutil.get_data('poolvr', 'shaders/glyph_instanced_vs.glsl').decode(),
+                                                     pkgutil.get_data('poolvr', 'shaders/ega_fs.glsl').decode()),
+                                             uniforms={'u_color': {'value': [1.0, 0.75, 0.0, 0.0]},
+                                                       'u_projected': {'value': 1.0}},
+                                             attribute_divisors={'a_translate': 1,
+                                                                 'a_direction': 1},
+                                             name='glyph_shadow_instanced')
 
 
 SKYBOX_TECHNIQUE = Technique(Program(pkgutil.get_data('poolvr', 'shaders/skybox_vs.glsl').decode(),
                                      pkgutil.get_data('poolvr', 'shaders/skybox_fs.glsl').decode()),
                              attributes={'a_position': {'type': gl.GL_FLOAT_VEC3}},
                              uniforms={'u_modelview': {'type': gl.GL_FLOAT_MAT4},
-                                       'u_projection': {'type': gl.GL_FLOAT_MAT4},
                                        'u_map': {'type': gl.GL_SAMPLER_CUBE}},
-                             front_face=gl.GL_CW)
+                             front_face=gl.GL_CW,
+                             name='skybox')
 
 
 PHONG_NORMAL_DIFFUSE_ROUGHNESS_TECHNIQUE = Technique(Program(pkgutil.get_data('poolvr', 'shaders/phong_diffuse_normal_roughness_vs.glsl').decode(),
                                                              pkgutil.get_data('poolvr', 'shaders/phong_diffuse_normal_roughness_fs.glsl').decode()),
                                                      uniforms={'u_diffuse_map': {'texture': Texture(os.path.join(TEXTURES_DIR, 'tile-01-full_render.png'))},
                                                                'u_normal_map': {'texture': Texture(os.path.join(TEXTURES_DIR, 'tile-01-normal.png'))},
-                                                               'u_roughness_map': {'texture': Texture(os.path.join(TEXTURES_DIR, 'tile-01-roughness.png'))}})
+                                                               'u_roughness_map': {'texture': Texture(os.path.join(TEXTURES_DIR, 'tile-01-roughness.png'))}},
+                                                     name='phong_normal_diffuse_roughness')
@@ -1,6 +1,7 @@
 import logging
 import os.path
 import base64
+import json
 from copy import deepcopy
 from ctypes import c_void_p
 try: # python 3.3 or later
@@ -29,6 +30,11 @@ GLTF_BUFFERVIEW_TYPE_SIZES = MappingProxyType({
 })
 
 
+GLB_MAGIC = b'glTF'
+GLB_CHUNK_JSON = 0x4E4F534A
+GLB_CHUNK_BIN = 0x004E4942
+
+
 class GLTFDict(dict):
     pass
 
@@ -93,8 +99,8 @@ class GLTFBufferView(GLTFDict):
             return
         self.id = gl.glGenBuffers(1)
         gl.glBindBuffer(self['target'], self.id)
-        buffer_data = self._load_buffer(self._gltf, self['buffer'], self._uri_path)
-        gl.glBufferData(self['target'], len(buffer_data), buffer_data, gl.GL_STATIC_DRAW)
+        buffer_data = buffer_view_data(self, self._load_buffer(self._gltf, self['buffer'], self._uri_path))
+        gl.glBufferData(self['target'], buffer_data.nbytes, buffer_data, gl.GL_STATIC_DRAW)
         if gl.glGetError() != gl.GL_NO_ERROR:
             raise Exception('failed to init gl buffer')
         gl.glBindBuffer(self['target'], 0)
@@ -102,18 +108,7 @@ class GLTFBufferView(GLTFDict):
         _logger.info('%s.init_gl: OK', self.__class__.__name__)
     @classmethod
     def _load_buffer(cls, gltf, buffer_id, uri_path):
-        uri = gltf['buffers'][buffer_id]['uri']
-        if uri.startswith('data:application/octet-stream;base64,'):
-            data = base64.b64decode(uri.split(',')[1])
-        else:
-            filename = os.path.join(uri_path, uri)
-            if gltf['buffers'][buffer_id]['type'] == 'arraybuffer':
-                with open(filename, 'rb') as f:
-                    data = f.read()
-            elif gltf['buffers'][buffer_id]['type'] == 'text':
-                raise Exception('TODO')
-            _logger.info('loaded buffer "%s" from "%s"', buffer_id, filename)
-        return data
+        return load_buffer(gltf['buffers'][buffer_id], uri_path, buffer_id=buffer_id)
 
 
 class GLTFPrimitive(GLTFDict):
@@ -221,36 +216,122 @@ def setup_programs(gltf, uri_path):
     return programs
 
 
+def read_glb(filename):
+    """
+    Read a binary glTF container (``.glb``): either glTF 2.0 (JSON and BIN chunks)
+    or glTF 1.0 with the ``KHR_binary_glTF`` extension.
+
+    The embedded binary buffer is not read but memory-mapped, and is attached to the
+    buffer which refers to it (under the key ``'_data'``), where :func:`load_buffer` finds it.
+
+    :returns: the glTF JSON object
+    """
+    data = np.memmap(filename, dtype=np.ubyte, mode='r')
+    magic, (version, length) = data[:4].tobytes(), data[4:12].view('<u4')
+    if magic != GLB_MAGIC:
+        raise Exception('"%s" is not a binary glTF file' % filename)
+    if length > len(data):
+        raise Exception('"%s" is truncated (%d of %d bytes)' % (filename, len(data), length))
+    if version == 1:
+        content_length, content_format = data[12:20].view('<u4')
+        gltf = json.loads(data[20:20+content_length].tobytes().decode())
+        gltf['buffers']['binary_glTF']['_data'] = data[20+content_length:length]
+    elif version == 2:
+        gltf, offset = None, 12
+        while offset < length:
+            chunk_length, chunk_type = data[offset:offset+8].view('<u4')
+            chunk = data[offset+8:offset+8+chunk_length]
+            if chunk_type == GLB_CHUNK_JSON:
+                gltf = json.loads(chunk.tobytes().decode())
+            elif chunk_type == GLB_CHUNK_BIN:
+                # the BIN chunk is the first buffer, which has no uri:
+                gltf['buffers'][0]['_data'] = chunk
+            offset += 8 + chunk_length
+        if gltf is None:
+            raise Exception('"%s" has no JSON chunk' % filename)
+    else:
+        raise Exception('unsupported binary glTF version: %d' % version)
+    _logger.info('read binary glTF (version %d) from "%s"', version, filename)
+    return gltf
+
+
+def load_gltf(filename):
+    """
+    Load a glTF 1.0 JSON file (``.gltf``) or binary container (``.glb``, with the ``KHR_binary_glTF`` extension).
+
+    glTF 2.0 assets are rejected: only their buffers could be loaded (see :func:`read_buffers`),
+    as their materials are not based on techniques and programs.
+
+    :returns: tuple of the glTF JSON object and the path relative to which its URIs are resolved
+    """
+    with open(filename, 'rb') as f:
+        magic = f.read(4)
+    if magic == GLB_MAGIC:
+        gltf = read_glb(filename)
+    else:
+        with open(filename) as f:
+            gltf = json.load(f)
+    version = str(gltf.get('asset', {}).get('version', '1.0'))
+    if int(version.split('.')[0]) >= 2:
+        raise Exception('"%s" is a glTF %s asset: only glTF 1.0 is supported' % (filename, version))
+    return gltf, os.path.dirname(filename)
+
+
+def load_buffer(buffer, uri_path, buffer_id=None):
+    """
+    Load the data of a glTF buffer as a 1-D ``uint8`` array: external files are memory-mapped
+    (rather than read), and embedded (data URI) buffers are decoded.
+    """
+    if '_data' in buffer:
+        return buffer['_data']
+    uri = buffer['uri']
+    if uri.startswith('data:'):
+        if ';base64,' not in uri:
+            raise Exception('unsupported data URI for buffer "%s"' % buffer_id)
+        return np.frombuffer(base64.b64decode(uri.split(',')[1]), dtype=np.ubyte)
+    if buffer.get('type', 'arraybuffer') != 'arraybuffer':
+        raise Exception('TODO')
+    filename = os.path.join(uri_path, uri)
+    data = np.memmap(filename, dtype=np.ubyte, mode='r')
+    _logger.info('mapped buffer "%s" from "%s"', buffer_id, filename)
+    return data
+
+
+def buffer_view_data(buffer_view, data):
+    """
+    The bytes of a glTF buffer view, as a view of the (memory-mapped) buffer data
+    of exactly ``byteLength`` bytes -- no data is copied.
+    """
+    byte_offset = buffer_view.get('byteOffset', 0)
+    return data[byte_offset:byte_offset+buffer_view['byteLength']]
+
+
+def _items(objects):
+    """
+    The (id, object) pairs of a glTF top-level collection: glTF 1.0 stores them in dicts
+    keyed by name, glTF 2.0 in lists (indexed by position).
+    """
+    return objects.items() if isinstance(objects, dict) else enumerate(objects)
+
+
 def read_buffers(gltf, uri_path):
-    buffers = gltf['buffers']
-    data_buffers = {}
-    for buffer_name, buffer in buffers.items():
-        uri = buffer['uri']
-        if uri.startswith('data:application/octet-stream;base64,'):
-            data_buffers[buffer_name] = base64.b64decode(uri.split(',')[1])
-        else:
-            filename = os.path.join(uri_path, buffer['uri'])
-            if buffer['type'] == 'arraybuffer':
-                data_buffers[buffer_name] = open(filename, 'rb').read()
-            elif buffer['type'] == 'text':
-                raise Exception('TODO')
-                #data_buffers[buffer_name] = open(filename, 'r').read()
-            _logger.info('loaded buffer "%s" (from %s)', buffer_name, filename)
-    return data_buffers
+    return {buffer_name: load_buffer(buffer, uri_path, buffer_id=buffer_name)
+            for buffer_name, buffer in _items(gltf['buffers'])}
 
 
 def setup_buffers(gltf, uri_path):
     data_buffers = read_buffers(gltf, uri_path)
     buffer_ids = {}
-    for bufferView_name, bufferView in gltf['bufferViews'].items():
+    for bufferView_name, bufferView in _items(gltf['bufferViews']):
         buffer_id = gl.glGenBuffers(1)
-        byteOffset, byteLength = bufferView['byteOffset'], bufferView['byteLength']
-        gl.glBindBuffer(bufferView['target'], buffer_id)
-        gl.glBufferData(bufferView['target'], bufferView['byteLength'],
-                        data_buffers[bufferView['buffer']][byteOffset:], gl.GL_STATIC_DRAW)
+        buffer_data = buffer_view_data(bufferView, data_buffers[bufferView['buffer']])
+        # the target is optional in glTF 2.0:
+        target = bufferView.get('target', gl.GL_ARRAY_BUFFER)
+        gl.glBindBuffer(target, buffer_id)
+        gl.glBufferData(target, buffer_data.nbytes, buffer_data, gl.GL_STATIC_DRAW)
         if gl.glGetError() != gl.GL_NO_ERROR:
             raise Exception('failed to create buffer "%s"' % bufferView_name)
-        gl.glBindBuffer(bufferView['target'], 0)
+        gl.glBindBuffer(target, 0)
         _logger.info('created buffer "%s"', bufferView_name)
         buffer_ids[bufferView_name] = buffer_id
     return buffer_ids
@@ -261,18 +342,26 @@ def setup_meshes(gltf, uri_path, buffer_ids, materials):
     accessors = gltf['accessors']
     bufferViews = gltf['bufferViews']
     meshes = {}
-    for mesh_name, mesh in gltf['meshes'].items():
+    for mesh_name, mesh in _items(gltf['meshes']):
         primitives = {}
         for primitive in mesh['primitives']:
             index_accessor = accessors[primitive['indices']]
             vao = buffer_ids[index_accessor['bufferView']]
             material = materials[primitive['material']]
-            primitives[material] = []
             attribute_buffers = {}
             for attribute_name, accessor_name in primitive['attributes'].items():
                 vbo = buffer_ids[accessors[accessor_name]['bufferView']]
                 attribute_buffers[attribute_name] = vbo
-            primitives[material].append(Primitive(primitive['mode'], index_buffer=vao, attribute_buffers=attribute_buffers))
+            # the vertex positions are only in GL buffers, so the bounds (for culling)
+            # are those given by their accessor:
+            bounds = None
+            if 'POSITION' in primitive['attributes']:
+                position_accessor = accessors[primitive['attributes']['POSITION']]
+                if 'min' in position_accessor and 'max' in position_accessor:
+                    bounds = [position_accessor['min'][:3], position_accessor['max'][:3]]
+            prim = Primitive(primitive.get('mode', gl.GL_TRIANGLES), index_buffer=vao, bounds=bounds)
+            prim.buffers = attribute_buffers
+            primitives.setdefault(material, []).append(prim)
         meshes[mesh_name] = Mesh(primitives)
     return meshes
 
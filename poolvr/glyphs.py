@@ -0,0 +1,84 @@
+"""
+Velocity, angular velocity and slip velocity glyphs (arrows) of the balls, for visualizing the simulation.
+"""
+import numpy as np
+import OpenGL.GL as gl
+
+
+from .gl_rendering import Mesh, Material
+from .gl_primitives import ArrowPrimitive
+from .gl_techniques import GLYPH_INSTANCED_TECHNIQUE, GLYPH_SHADOW_INSTANCED_TECHNIQUE
+
+
+class BallGlyphs(Mesh):
+    VELOCITY, ANGULAR_VELOCITY, SLIP_VELOCITY = range(3)
+    ZERO_TOLERANCE = 1e-9
+    SLIP_TOLERANCE = 1e-6
+    def __init__(self, num_balls, ball_radius, shadow_height=0.0,
+                 technique=GLYPH_INSTANCED_TECHNIQUE,
+                 shadow_technique=GLYPH_SHADOW_INSTANCED_TECHNIQUE):
+        """
+        Draws the velocity and angular velocity glyphs of any number of balls, each type with a single
+        instanced draw call, and the slip velocity glyphs of sliding balls (flattened onto the plane at
+        *shadow_height*) with another one.
+
+        The transformations of the glyphs are computed (for all balls at once) by :meth:`update`:
+        each glyph is an instance of one arrow primitive, with per-instance position and direction attributes
+        from which its orientation is computed in the vertex shader.
+        """
+        self.num_balls = num_balls
+        self.ball_radius = ball_radius
+        self.translates = np.zeros((3, num_balls, 3), dtype=np.float32)
+        self.directions = np.zeros((3, num_balls, 3), dtype=np.float32)
+        self._vectors = np.zeros((3, num_balls, 3), dtype=np.float64)
+        R = ball_radius
+        self.glyph_primitives = []
+        for translates, directions in zip(self.translates, self.directions):
+            prim = ArrowPrimitive(head_radius=0.2*R, head_length=0.5*R,
+                                  tail_radius=0.075*R, tail_length=2*R)
+            prim.alias('vertices', 'a_position')
+            prim.attributes.update({'a_translate': translates,
+                                    'a_direction': directions})
+            prim.attribute_usage.update({'a_translate': gl.GL_DYNAMIC_DRAW,
+                                         'a_direction': gl.GL_DYNAMIC_DRAW})
+            prim.num_instances = num_balls
+            self.glyph_primitives.append(prim)
+        self.velocity_material = Material(technique, values={'u_color': [1.0, 0.0, 0.0, 0.0]})
+        self.angular_velocity_material = Material(technique, values={'u_color': [0.0, 0.0, 1.0, 0.0]})
+        self.slip_velocity_material = Material(shadow_technique, values={'u_color': [1.0, 0.75, 0.0, 0.0],
+                                                                         'u_shadow_height': shadow_height})
+        super().__init__({self.velocity_material: [self.glyph_primitives[self.VELOCITY]],
+                          self.angular_velocity_material: [self.glyph_primitives[self.ANGULAR_VELOCITY]],
+                          self.slip_velocity_material: [self.glyph_primitives[self.SLIP_VELOCITY]]})
+    def update(self, positions, velocities, angular_velocities, balls=None):
+        """
+        Compute the positions and directions of the glyphs of *balls* (by default, all balls) from their states
+        (arrays of shape (*len(balls)*, 3)), hiding the glyphs of the other balls and those of zero vectors,
+        and upload them if the mesh has been initialized.
+        """
+        if balls is None:
+            balls = slice(None)
+        R = self.ball_radius
+        vectors = self._vectors
+        vectors[:] = 0
+        vectors[self.VELOCITY, balls] = velocities
+        vectors[self.ANGULAR_VELOCITY, balls] = angular_velocities
+        # slip velocity of the contact point with the table:
+        slip = vectors[self.SLIP_VELOCITY]
+        slip[balls] = velocities
+        slip[balls,0] += R * angular_velocities[:,2]
+        slip[balls,2] -= R * angular_velocities[:,0]
+        magnitudes = np.linalg.norm(vectors, axis=-1)
+        shown = magnitudes > self.ZERO_TOLERANCE
+        shown[self.SLIP_VELOCITY] = magnitudes[self.SLIP_VELOCITY] > self.SLIP_TOLERANCE
+        directions = self.directions
+        directions[:] = 0
+        np.divide(vectors, magnitudes[...,np.newaxis], out=directions, where=shown[...,np.newaxis], casting='unsafe')
+        self.translates[:] = 0
+        self.translates[:,balls] = positions
+        self.translates += (2*R) * directions
+        if self.glyph_primitives[0].buffers is not None:
+            for prim in self.glyph_primitives:
+                prim.update_buffer_data('a_translate')
+                prim.update_buffer_data('a_direction')
+        return shown
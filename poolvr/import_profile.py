@@ -0,0 +1,85 @@
+"""
+Timing of module imports, reported in the format of ``python -X importtime``.
+
+Unlike ``-X importtime``, the profiler can be started and stopped from within the program
+(e.g. by the ``--import-profile`` command-line option), so that it also records modules which
+are imported when first used rather than at startup.
+"""
+import sys
+import time
+import builtins
+import importlib.util
+
+
+class ImportProfiler(object):
+    def __init__(self):
+        """
+        Records the self and cumulative time of every module which is imported
+        (by an ``import`` statement) between :meth:`start` and :meth:`stop`.
+
+        Each record is a tuple ``(depth, module name, self time, cumulative time)`` (times in seconds),
+        and records are in the order in which the imports completed.
+        """
+        self.records = []
+        self._stack = []
+        self._import = None
+    def start(self):
+        if self._import is None:
+            self._import = builtins.__import__
+            builtins.__import__ = self._timed_import
+    def stop(self):
+        if self._import is not None:
+            builtins.__import__ = self._import
+            self._import = None
+    def __enter__(self):
+        self.start()
+        return self
+    def __exit__(self, *exc_info):
+        self.stop()
+    def _timed_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        _import = self._import
+        fullname = name
+        if level:
+            try:
+                fullname = importlib.util.resolve_name('.' * level + name, (globals or {}).get('__package__'))
+            except (ImportError, ValueError):
+                pass
+        if fullname in sys.modules:
+            # "from package import submodule" may still import the submodule:
+            module = sys.modules[fullname]
+            submodules = ['%s.%s' % (fullname, item) for item in (fromlist or ())
+                          if item != '*' and not hasattr(module, item)
+                          and '%s.%s' % (fullname, item) not in sys.modules]
+            if not submodules:
+                return _import(name, globals, locals, fromlist, level)
+            fullname = ', '.join(submodules)
+        record = [len(self._stack), fullname, 0.0]
+        self._stack.append(record)
+        t0 = time.perf_counter()
+        try:
+            return _import(name, globals, locals, fromlist, level)
+        finally:
+            cumulative = time.perf_counter() - t0
+            self._stack.pop()
+            if self._stack:
+                self._stack[-1][2] += cumulative
+            # until now, record[2] has accumulated the time spent importing submodules:
+            self.records.append((record[0], fullname, cumulative - record[2], cumulative))
+    def write(self, file=None):
+        """
+        Write the records in the format of ``python -X importtime`` to *file*
+        (a file object or path, by default ``sys.stderr``).
+        """
+        if file is None or file == '-':
+            return self._write(sys.stderr)
+        if isinstance(file, str):
+            with open(file, 'w') as f:
+                return self._write(f)
+        return self._write(file)
+    def _write(self, f):
+        f.write('import time: self [us] | cumulative | imported package\n')
+        for depth, name, self_time, cumulative in self.records:
+            f.write('import time: %9d | %10d | %s%s\n' % (1e6 * self_time, 1e6 * cumulative,
+                                                          '  ' * depth, name))
+        total = sum(cumulative for depth, _, _, cumulative in self.records if depth == 0)
+        f.write('import time: total %.3f s for %d modules\n' % (total, len(self.records)))
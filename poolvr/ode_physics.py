@@ -9,18 +9,33 @@ import ode
 from .table import PoolTable
 from .physics.events import BallRestEvent, CueStrikeEvent
 try:
-    from .sound import play_ball_ball_collision_sound
+    from .sound import play_ball_ball_collision_sound, collision_sound_volume
 except Exception:
     play_ball_ball_collision_sound = None
 
 
 INCH2METER = 0.0254
 ZERO3 = np.zeros(3, dtype=np.float64)
+# collision categories of geoms -- each category is tested only against those in its collide bits,
+# so that e.g. the static table and cushion geoms are never tested against each other:
+BALL_CATEGORY = 1 << 0
+TABLE_CATEGORY = 1 << 1
+CUSHION_CATEGORY = 1 << 2
+CUE_CATEGORY = 1 << 3
+COLLIDE_BITS = {
+    BALL_CATEGORY: BALL_CATEGORY | TABLE_CATEGORY | CUSHION_CATEGORY | CUE_CATEGORY,
+    TABLE_CATEGORY: BALL_CATEGORY,
+    CUSHION_CATEGORY: BALL_CATEGORY,
+    CUE_CATEGORY: BALL_CATEGORY
+}
+SPACE_TYPES = ('simple', 'hash', 'quadtree')
 _J = np.array([0.0, 1.0, 0.0], dtype=np.float64)
 _logger = logging.getLogger(__name__)
 
 
 class ODEPoolPhysics(object):
+    SUBSTEP_DT = 1.0 / 960
+    MAX_SUBSTEPS = 64
     def __init__(self,
                  num_balls=16,
                  ball_mass=0.17,
@@ -37,7 +52,20 @@ class ODEPoolPhysics(object):
                  balls_on_table=None,
                  initial_positions=None,
                  table=None,
+                 space_type='hash',
+                 substep_dt=SUBSTEP_DT,
+                 max_substeps=MAX_SUBSTEPS,
                  **kwargs):
+        """
+        :param substep_dt: the fixed time step of the ODE world -- :meth:`step` advances the world
+                           by as many whole substeps as have accumulated, so that the simulation
+                           does not depend on the step sizes passed to it (e.g. the frame rate)
+        :param max_substeps: maximum number of substeps per :meth:`step` -- accumulated time beyond
+                             it is dropped (and counted in :attr:`dropped_time`)
+        :param space_type: the type of ODE collision space used for the broad phase of collision detection:
+                           ``'hash'`` (a multi-resolution hash table space, the default), ``'quadtree'``
+                           (a quad tree spanning the table) or ``'simple'`` (which tests all pairs of geoms)
+        """
         if table is None:
             table = PoolTable(num_balls=num_balls, ball_radius=ball_radius)
         self.table = table
@@ -55,6 +83,14 @@ class ODEPoolPhysics(object):
         self.E_Y_b = E_Y_b
         self.g = g
         self.t = 0.0
+        self.substep_dt = substep_dt
+        self.max_substeps = max_substeps
+        self.dropped_time = 0.0
+        self._accumulator = 0.0
+        # the state of all balls, read back after each step:
+        self._positions = np.zeros((num_balls, 3), dtype=np.float64)
+        self._velocities = np.zeros((num_balls, 3), dtype=np.float64)
+        self._angular_velocities = np.zeros((num_balls, 3), dtype=np.float64)
         self._on_table = np.array(num_balls * [False])
         self._balls_on_table = balls_on_table
         self._on_table[np.array(balls_on_table)] = True
@@ -62,14 +98,18 @@ class ODEPoolPhysics(object):
         self.world.setGravity((0.0, -g, 0.0))
         self.world.setLinearDamping(linear_damping)
         self.world.setAngularDamping(angular_damping)
-        self.space = ode.SimpleSpace()
+        self.space = self._create_space(space_type, table, ball_radius)
         self.ball_bodies = []
         self.ball_geoms = []
         for i in range(num_balls):
             body, geom = self._create_ball(self.world, ball_mass, ball_radius, space=self.space)
+            self._set_category(geom, BALL_CATEGORY)
             self.ball_bodies.append(body)
             self.ball_geoms.append(geom)
+        # ball index of each ball geom, for the near callback:
+        self._ball_geom_indices = {geom: i for i, geom in enumerate(self.ball_geoms)}
         self.table_geom = ode.GeomPlane(space=self.space, normal=(0.0, 1.0, 0.0), dist=self.table.H)
+        self._set_category(self.table_geom, TABLE_CATEGORY)
         # self.table_geom = ode.GeomBox(space=self.space, lengths=(self.table.width, self.table.height, self.table.length))
         self._contactgroup = ode.JointGroup()
         self._on_cue_ball_collide = None
@@ -97,6 +137,8 @@ class ODEPoolPhysics(object):
         self.events = list(chain.from_iterable(self.ball_events.values()))
         self._t_last_strike = 0.0
         self.nsteps = 0
+        self._accumulator = 0.0
+        self.dropped_time = 0.0
         for body, geom, position in zip(self.ball_bodies, self.ball_geoms, ball_positions):
             body.enable()
             geom.setPosition(position)
@@ -104,6 +146,7 @@ class ODEPoolPhysics(object):
             body.setLinearVel(ZERO3)
             body.setAngularVel(ZERO3)
         self._contactgroup.empty()
+        self._read_state()
 
     @property
     def balls_on_table(self):
@@ -113,6 +156,12 @@ class ODEPoolPhysics(object):
         self._balls_on_table = set(balls)
         self._on_table[:] = False
         self._on_table[np.array(balls)] = True
+        # balls which are off the table are removed from the broad phase:
+        for geom, on_table in zip(self.ball_geoms, self._on_table):
+            if on_table:
+                geom.enable()
+            else:
+                geom.disable()
 
     def set_cue_ball_collision_callback(self, cb):
         self._on_cue_ball_collide = cb
@@ -120,6 +169,7 @@ class ODEPoolPhysics(object):
     def add_cue(self, cue):
         body, geom = self._create_cue(self.world, cue.mass, cue.radius, cue.length,
                                       space=self.space, kinematic=True)
+        self._set_category(geom, CUE_CATEGORY)
         self.cues = [cue]
         self.cue_bodies = [body]
         self.cue_geoms = [geom]
@@ -151,16 +201,18 @@ class ODEPoolPhysics(object):
         omega[:] = omega_i * _i + omega_j * _j + omega_k * _k
         body.setLinearVel(v)
         body.setAngularVel(omega)
+        self._velocities[i] = v
+        self._angular_velocities[i] = omega
         self._t_last_strike = t
         self._add_event(CueStrikeEvent(t, i, r_i, Q + r_i, V, cue_mass))
         self._add_event(BallRestEvent(t + 12, i, r_0=r_i))
         return 1
 
     def step(self, dt):
-        self.space.collide((self.world, self._contactgroup), self._near_callback)
-        self.world.step(dt)
-        self._contactgroup.empty()
-        self.t += dt
+        """
+        Advance the simulation by *dt* (in whole substeps of :attr:`substep_dt`, the remainder being
+        carried over to the next step) and read back the state of the balls.
+        """
         for cue, body, geom in zip(self.cues, self.cue_bodies, self.cue_geoms):
             body.setPosition(cue.world_position)
             w = cue.quaternion[3]; cue.quaternion[1:] = cue.quaternion[:3]; cue.quaternion[0] = w
@@ -168,33 +220,54 @@ class ODEPoolPhysics(object):
             geom.setQuaternion(cue.quaternion)
             body.setLinearVel(cue.velocity)
             body.setAngularVel(cue.angular_velocity)
-        self.nsteps += 1
+        self._accumulator += dt
+        # (the small tolerance avoids losing a substep to rounding when dt is a multiple of substep_dt)
+        num_substeps = int(self._accumulator / self.substep_dt + 1e-9)
+        if num_substeps > self.max_substeps:
+            self.dropped_time += (num_substeps - self.max_substeps) * self.substep_dt
+            self._accumulator -= (num_substeps - self.max_substeps) * self.substep_dt
+            num_substeps = self.max_substeps
+        substep_dt = self.substep_dt
+        space, world, contactgroup = self.space, self.world, self._contactgroup
+        args = (world, contactgroup)
+        for _ in range(num_substeps):
+            space.collide(args, self._near_callback)
+            world.step(substep_dt)
+            contactgroup.empty()
+        self._accumulator = max(0.0, self._accumulator - num_substeps * substep_dt)
+        self.t += num_substeps * substep_dt
+        self.nsteps += num_substeps
+        if num_substeps:
+            self._read_state()
+
+    def _read_state(self):
+        bodies = self.ball_bodies
+        self._positions[:] = [body.getPosition() for body in bodies]
+        self._velocities[:] = [body.getLinearVel() for body in bodies]
+        self._angular_velocities[:] = [body.getAngularVel() for body in bodies]
 
     def eval_positions(self, t, balls=None, out=None):
-        if balls is None:
-            balls = range(self.num_balls)
-        if out is None:
-            out = np.empty((len(balls), 3), dtype=np.float64)
-        for ii, i in enumerate(balls):
-            out[ii] = self.ball_bodies[i].getPosition()
-        return out
+        return self._eval(self._positions, balls, out)
 
     def eval_velocities(self, t, balls=None, out=None):
-        if balls is None:
-            balls = range(self.num_balls)
-        if out is None:
-            out = np.empty((len(balls), 3), dtype=np.float64)
-        for ii, i in enumerate(balls):
-            out[ii] = self.ball_bodies[i].getLinearVel()
-        return out
+        return self._eval(self._velocities, balls, out)
 
     def eval_angular_velocities(self, t, balls=None, out=None):
+        return self._eval(self._angular_velocities, balls, out)
+
+    @staticmethod
+    def _eval(state, balls, out):
+        """
+        The state (as of the last step, regardless of the time requested) of the given balls.
+        """
         if balls is None:
-            balls = range(self.num_balls)
+            if out is None:
+                return state.copy()
+            out[:] = state
+            return out
         if out is None:
             out = np.empty((len(balls), 3), dtype=np.float64)
-        for ii, i in enumerate(balls):
-            out[ii] = self.ball_bodies[i].getAngularVel()
+        out[:] = state[balls]
         return out
 
     @property
@@ -230,6 +303,27 @@ class ODEPoolPhysics(object):
         tri_mesh_data.build(self.table.rightFootCushionGeom.attributes['vertices'].reshape(-1,3).tolist(),
                             self.table.rightFootCushionGeom.indices.reshape(-1,3)[:,::-1])
         self.right_foot_cushion_geom = ode.GeomTriMesh(tri_mesh_data, space=self.space)
+        for geom in (self.head_cushion_geom, self.left_head_cushion_geom, self.right_head_cushion_geom,
+                     self.foot_cushion_geom, self.left_foot_cushion_geom, self.right_foot_cushion_geom):
+            self._set_category(geom, CUSHION_CATEGORY)
+
+    @staticmethod
+    def _create_space(space_type, table, ball_radius):
+        if space_type == 'simple':
+            return ode.SimpleSpace()
+        if space_type == 'hash':
+            space = ode.HashSpace()
+            # cells range from about the size of a ball to the size of the table:
+            space.setLevels(int(np.floor(np.log2(2*ball_radius))), int(np.ceil(np.log2(max(table.W, table.L)))))
+            return space
+        if space_type == 'quadtree':
+            return ode.QuadTreeSpace((0.0, table.H, 0.0), (table.W + 0.5, 1.0, table.L + 0.5), 4)
+        raise ValueError('unknown space type "%s" (must be one of %s)' % (space_type, ', '.join(SPACE_TYPES)))
+
+    @staticmethod
+    def _set_category(geom, category):
+        geom.setCategoryBits(category)
+        geom.setCollideBits(COLLIDE_BITS[category])
 
     @staticmethod
     def _create_ball(world, ball_mass, ball_radius, space=None):
@@ -264,18 +358,12 @@ class ODEPoolPhysics(object):
 
     def _near_callback(self, args, geom1, geom2):
         world, contactgroup = args
-        try:
-            i = self.ball_geoms.index(geom1)
-            if not self._on_table[i]:
-                return
-        except Exception:
-            pass
-        try:
-            j = self.ball_geoms.index(geom2)
-            if not self._on_table[j]:
-                return
-        except Exception:
-            pass
+        i = self._ball_geom_indices.get(geom1)
+        if i is not None and not self._on_table[i]:
+            return
+        j = self._ball_geom_indices.get(geom2)
+        if j is not None and not self._on_table[j]:
+            return
         contacts = ode.collide(geom1, geom2)
         if contacts:
             body1, body2 = geom1.getBody(), geom2.getBody()
@@ -313,8 +401,8 @@ class ODEPoolPhysics(object):
                 if play_ball_ball_collision_sound is not None:
                     pos, normal, depth, g1, g2 = c.getContactGeomParams()
                     v_n = abs(np.array(normal).dot(np.array(body1.getLinearVel()) - np.array(body2.getLinearVel())))
-                    vol = max(0.02, min(0.8, 0.45*v_n + 0.55*v_n**2))
+                    vol = collision_sound_volume(v_n)
                     if vol > 0.02:
-                        play_ball_ball_collision_sound(vol=vol)
+                        play_ball_ball_collision_sound(vol=vol, position=pos)
             j = ode.ContactJoint(world, contactgroup, c)
             j.attach(body1, body2)
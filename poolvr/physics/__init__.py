@@ -167,8 +167,7 @@ class PoolPhysics(object):
             ( 2,  1,  self._rhsz, self._bndx, self._r_cp[2], self._r_cp_len_sqrd[2] ),
             ( 0, -1, -self._rhsx, self._bndz, self._r_cp[3], self._r_cp_len_sqrd[3] )
         )
-        self._velocity_meshes = None
-        self._angular_velocity_meshes = None
+        self._glyphs = None
         if ball_collision_model_kwargs:
             self._ball_collision_model_kwargs = ball_collision_model_kwargs
         else:
@@ -867,77 +866,19 @@ class PoolPhysics(object):
 
 
     def glyph_meshes(self, t):
-        from ..gl_primitives import ProjectedMesh
-        R = self.ball_radius
-        if self._velocity_meshes is None:
-            from ..gl_rendering import Material, Mesh
-            from ..gl_primitives import ArrowMesh
-            from ..gl_techniques import LAMBERT_TECHNIQUE, EGA_TECHNIQUE
-            self._velocity_material = Material(LAMBERT_TECHNIQUE, values={"u_color": [1.0, 0.0, 0.0, 0.0]})
-            self._angular_velocity_material = Material(LAMBERT_TECHNIQUE, values={'u_color': [0.0, 0.0, 1.0, 0.0]})
-            self._slip_velocity_material = Material(EGA_TECHNIQUE, values={"u_color": [1.0, 0.75, 0.0, 0.0]})
-            self._velocity_meshes = {
-                i: ArrowMesh(material=self._velocity_material,
-                             head_radius=0.2*R,
-                             head_length=0.5*R,
-                             tail_radius=0.075*R,
-                             tail_length=2*R)
-                for i in range(self.num_balls)
-            }
-            self._angular_velocity_meshes = {
-                i: Mesh({self._angular_velocity_material: self._velocity_meshes[i].primitives[self._velocity_material]})
-                for i in range(self.num_balls)
-            }
-            self._slip_velocity_meshes = {
-                i: ProjectedMesh(ArrowMesh(material=self._velocity_material,
-                                           head_radius=0.2*R,
-                                           head_length=0.5*R,
-                                           tail_radius=0.075*R,
-                                           tail_length=2*R), self._slip_velocity_material)
-                for i in range(self.num_balls)
-            }
-            for mesh in chain(self._velocity_meshes.values(), self._angular_velocity_meshes.values(),
-                              self._slip_velocity_meshes.values()):
-                for prim in chain.from_iterable(mesh.primitives.values()):
-                    prim.alias('vertices', 'a_position')
-                mesh.init_gl()
-        glyph_events = self.find_active_events(t)
-        meshes = []
-        for event in glyph_events:
-            if isinstance(event, BallMotionEvent):
-                tau = t - event.t
-                r = event.eval_position(tau)
-                v = event.eval_velocity(tau)
-                omega = event.eval_angular_velocity(tau)
-                glyphs = [(v, sqrt(dot(v, v)), self._velocity_meshes),
-                          (omega, sqrt(dot(omega, omega)), self._angular_velocity_meshes)]
-                if isinstance(event, BallSlidingEvent):
-                    u = v + R * np.array((omega[2], 0.0, -omega[0]), dtype=np.float64)
-                    glyphs.append((u, sqrt(dot(u, u)), self._slip_velocity_meshes))
-                for (vec, vec_mag, vec_meshes) in glyphs:
-                    if vec_mag > self._ZERO_TOLERANCE:
-                        mesh = vec_meshes[event.i]
-                        _mesh = mesh
-                        if isinstance(mesh, ProjectedMesh):
-                            mesh = mesh.mesh
-                        M = mesh.world_matrix
-                        y = vec / vec_mag
-                        M[:] = 0
-                        M[0,0] = M[1,1] = M[2,2] = M[3,3] = 1
-                        M[1,:3] = y
-                        x, z = mesh.world_matrix[0,:3], mesh.world_matrix[2,:3]
-                        ydotx, ydotz = y.dot(x), y.dot(z)
-                        if abs(ydotx) >= abs(ydotz):
-                            M[2,:3] -= ydotz * y
-                            M[2,:3] /= sqrt(M[2,:3].dot(M[2,:3]))
-                            M[0,:3] = np.cross(M[1,:3], M[2,:3])
-                        else:
-                            M[0,:3] -= ydotx * y
-                            M[0,:3] /= sqrt(M[0,:3].dot(M[0,:3]))
-                            M[2,:3] = np.cross(M[0,:3], M[1,:3])
-                        M[3,:3] = r + (2*self.ball_radius)*y
-                        if isinstance(_mesh, ProjectedMesh):
-                            mesh = _mesh
-                            mesh.update(c=self.table.H+0.0012)
-                        meshes.append(mesh)
-        return meshes
+        """
+        The mesh which draws the velocity, angular velocity and slip velocity glyphs of the balls at game time *t*.
+        """
+        if self._glyphs is None:
+            from ..glyphs import BallGlyphs
+            self._glyphs = BallGlyphs(self.num_balls, self.ball_radius, shadow_height=self.table.H+0.0012)
+            self._glyphs.init_gl()
+            self._glyph_states = np.zeros((3, self.num_balls, 3), dtype=np.float64)
+        balls = self.balls_on_table
+        positions, velocities, angular_velocities = self._glyph_states
+        self.eval_positions(t, balls=balls, out=positions)
+        self.eval_velocities(t, balls=balls, out=velocities)
+        self.eval_angular_velocities(t, balls=balls, out=angular_velocities)
+        n = len(balls)
+        self._glyphs.update(positions[:n], velocities[:n], angular_velocities[:n], balls=balls)
+        return [self._glyphs]
@@ -0,0 +1,106 @@
+"""
+On-disk cache of linked GLSL program binaries (``glGetProgramBinary`` / ``glProgramBinary``).
+
+A cache entry is keyed by a hash of the program's vertex and fragment shader sources together with
+the GL vendor, renderer and version strings, so that programs are recompiled whenever a shader source
+changes or the driver is updated.  Drivers may still reject a cached binary (e.g. after an update which
+does not change the version string), in which case :ref:`Program` falls back to compiling from source.
+
+The cache directory is ``$POOLVR_CACHE_DIR/programs`` if the environment variable ``POOLVR_CACHE_DIR``
+is set, ``~/.cache/poolvr/programs`` otherwise.
+"""
+import os
+import os.path
+import hashlib
+import logging
+import numpy as np
+import OpenGL.GL as gl
+
+
+_logger = logging.getLogger(__name__)
+
+
+_driver_id = None
+
+
+def get_cache_dir():
+    cache_dir = os.environ.get('POOLVR_CACHE_DIR', None)
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.expanduser('~'), '.cache', 'poolvr')
+    return os.path.join(cache_dir, 'programs')
+
+
+def is_supported():
+    """
+    Whether the current GL context supports at least one program binary format.
+    """
+    try:
+        return bool(gl.glGetIntegerv(gl.GL_NUM_PROGRAM_BINARY_FORMATS))
+    except Exception:
+        return False
+
+
+def get_driver_id():
+    """
+    The vendor, renderer and version strings of the current GL context.
+    """
+    global _driver_id
+    if _driver_id is None:
+        _driver_id = b'\n'.join(gl.glGetString(name) or b''
+                                for name in (gl.GL_VENDOR, gl.GL_RENDERER, gl.GL_VERSION))
+    return _driver_id
+
+
+def program_cache_key(vs_src, fs_src):
+    sha1 = hashlib.sha1(get_driver_id())
+    for src in (vs_src, fs_src):
+        sha1.update(b'\0')
+        sha1.update(src.encode())
+    return sha1.hexdigest()
+
+
+def load_program_binary(program_id, key):
+    """
+    Load the cached binary with the given key into the (newly created) program.
+
+    :returns: ``True`` if the binary was loaded and the program is linked, ``False`` otherwise
+    """
+    path = os.path.join(get_cache_dir(), key + '.bin')
+    if not os.path.exists(path):
+        return False
+    try:
+        with open(path, 'rb') as f:
+            binary_format = int(np.frombuffer(f.read(4), dtype=np.uint32)[0])
+            binary = np.frombuffer(f.read(), dtype=np.ubyte)
+        gl.glProgramBinary(program_id, binary_format, binary, len(binary))
+        if gl.glGetProgramiv(program_id, gl.GL_LINK_STATUS):
+            return True
+        _logger.info('cached program binary "%s" was rejected by the driver', path)
+    except Exception as err:
+        _logger.warning('could not load cached program binary "%s": %s', path, err)
+    return False
+
+
+def save_program_binary(program_id, key):
+    """
+    Write the binary of a linked program to the cache.
+    """
+    path = os.path.join(get_cache_dir(), key + '.bin')
+    try:
+        size = gl.glGetProgramiv(program_id, gl.GL_PROGRAM_BINARY_LENGTH)
+        if not size:
+            return
+        length = np.zeros(1, dtype=np.int32)
+        binary_format = np.zeros(1, dtype=np.uint32)
+        binary = np.empty(size, dtype=np.ubyte)
+        gl.glGetProgramBinary(program_id, size, length, binary_format, binary)
+        os.makedirs(get_cache_dir(), exist_ok=True)
+        # write to a temporary file first, so that incompletely written entries are never used:
+        tmp_path = '%s.%d.tmp' % (path, os.getpid())
+        with open(tmp_path, 'wb') as f:
+            f.write(binary_format.tobytes())
+            f.write(binary[:length[0]].tobytes())
+        os.replace(tmp_path, path)
+        _logger.debug('cached program binary in "%s"', path)
+    except Exception as err:
+        _logger.warning('could not cache program binary: %s', err)
@@ -11,12 +11,23 @@ from openvr.gl_renderer import OpenVrFramebuffer as OpenVRFramebuffer
 from openvr.gl_renderer import matrixForOpenVrMatrix as matrixForOpenVRMatrix
 
 
+from .gl_rendering import RenderQueue, single_pass_stereo_supported
+
+
 c_float_p = POINTER(c_float)
 
 
 class OpenVRRenderer(object):
-    def __init__(self, multisample=0, znear=0.1, zfar=1000, window_size=(960,1080)):
+    def __init__(self, multisample=0, znear=0.1, zfar=1000, window_size=(960,1080),
+                 single_pass_stereo=True):
+        """
+        :param single_pass_stereo: if ``True`` (and supported by the GL context, see
+                                   :ref:`single_pass_stereo_supported`), both eyes are rendered in a single
+                                   pass to the halves of a side-by-side render target (see :ref:`RenderQueue`),
+                                   rather than by drawing the scene once for each eye
+        """
         self.multisample = multisample
+        self.single_pass_stereo = single_pass_stereo
         self.znear, self.zfar = znear, zfar
         self.window_size = np.array(window_size, dtype=np.int64)
         poses_t = openvr.TrackedDevicePose_t * openvr.k_unMaxTrackedDeviceCount
@@ -30,18 +41,35 @@ class OpenVRRenderer(object):
         self._controller_poll_interval = 0.25
         self._nframes = 0
         self._time_to_poll = 0.0
+        self.render_queue = RenderQueue()
+
+    @property
+    def frame_stats(self):
+        """
+        Draw call and state change counts (for both eyes) for the last rendered frame (see :ref:`RenderQueue`).
+        """
+        return self.render_queue.stats
 
     def init_gl(self, clear_color=(0.0, 0.0, 0.0, 0.0)):
         self.vr_system = openvr.init(openvr.VRApplication_Scene)
         w, h = self.vr_system.getRecommendedRenderTargetSize()
         self.render_target_size = np.array((w, h), dtype=np.float32)
-        self.vr_framebuffers = (OpenVRFramebuffer(w, h, multisample=self.multisample),
-                                OpenVRFramebuffer(w, h, multisample=self.multisample))
+        self.single_pass_stereo = self.single_pass_stereo and single_pass_stereo_supported()
+        if self.single_pass_stereo:
+            # a single side-by-side framebuffer, whose halves are submitted for the eyes:
+            self.vr_framebuffers = (OpenVRFramebuffer(2*w, h, multisample=self.multisample),)
+            self.eye_viewports = ((0, 0, w, h), (w, 0, w, h))
+            self.eye_texture_bounds = (openvr.VRTextureBounds_t(0.0, 0.0, 0.5, 1.0),
+                                       openvr.VRTextureBounds_t(0.5, 0.0, 1.0, 1.0))
+        else:
+            self.vr_framebuffers = (OpenVRFramebuffer(w, h, multisample=self.multisample),
+                                    OpenVRFramebuffer(w, h, multisample=self.multisample))
+        _logger.info('single-pass stereo rendering: %s', 'enabled' if self.single_pass_stereo else 'disabled')
         self.vr_compositor = openvr.VRCompositor()
         if self.vr_compositor is None:
             raise Exception('unable to create compositor')
-        self.vr_framebuffers[0].init_gl()
-        self.vr_framebuffers[1].init_gl()
+        for vr_framebuffer in self.vr_framebuffers:
+            vr_framebuffer.init_gl()
         self.update_projection_matrix()
         self.eye_to_head_transforms = (asarray(matrixForOpenVRMatrix(self.vr_system.getEyeToHeadTransform(openvr.Eye_Left))),
                                        asarray(matrixForOpenVRMatrix(self.vr_system.getEyeToHeadTransform(openvr.Eye_Right))))
@@ -106,6 +134,13 @@ class OpenVRRenderer(object):
         # if self._nframes % 90 == 0: _logger.debug('yielding frame_data:\n%s\n', '\n'.join('%s:\n%s' % it for it in frame_data.items()))
         yield frame_data
 
+        self.render_queue.reset_stats()
+        if meshes is not None:
+            self.render_queue.submit(meshes)
+        if self.single_pass_stereo:
+            self._render_single_pass(meshes, frame_data)
+            self._nframes += 1
+            return
         for eye in (0,1):
             gl.glViewport(0, 0, self.vr_framebuffers[eye].width, self.vr_framebuffers[eye].height)
             gl.glBindFramebuffer(gl.GL_FRAMEBUFFER, self.vr_framebuffers[eye].fb)
@@ -116,8 +151,7 @@ class OpenVRRenderer(object):
             frame_data['projection_lrbt'] = self.projection_lrbts[eye]
             # if self._nframes % 90 == 0: _logger.debug('drawing for eye %d with frame_data:\n%s\n', eye, '\n'.join('%s:\n%s' % item for item in frame_data.items()))
             if meshes is not None:
-                for mesh in meshes:
-                    mesh.draw(**frame_data)
+                self.render_queue.draw(**frame_data)
         #self.vr_compositor.submit(openvr.Eye_Left, self.vr_framebuffers[0].texture)
         #self.vr_compositor.submit(openvr.Eye_Right, self.vr_framebuffers[1].texture)
         self.vr_framebuffers[0].submit(openvr.Eye_Left)
@@ -133,6 +167,40 @@ class OpenVRRenderer(object):
                              gl.GL_NEAREST)
         self._nframes += 1
 
+    def _render_single_pass(self, meshes, frame_data):
+        vr_framebuffer = self.vr_framebuffers[0]
+        gl.glBindFramebuffer(gl.GL_FRAMEBUFFER, vr_framebuffer.fb)
+        gl.glViewport(0, 0, vr_framebuffer.width, vr_framebuffer.height)
+        gl.glClear(gl.GL_COLOR_BUFFER_BIT | gl.GL_DEPTH_BUFFER_BIT)
+        frame_data['view_matrix'] = self.hmd_matrix_inv
+        frame_data['camera_matrix'] = self.hmd_matrix
+        frame_data['projection_matrix'] = self.projection_matrices[0]
+        frame_data['projection_lrbt'] = self.projection_lrbts[0]
+        frame_data['stereo'] = True
+        frame_data['eye_transforms'] = self.eye_transforms
+        frame_data['eye_viewports'] = self.eye_viewports
+        if meshes is not None:
+            self.render_queue.draw(**frame_data)
+        gl.glViewport(0, 0, vr_framebuffer.width, vr_framebuffer.height)
+        if vr_framebuffer.multisample:
+            gl.glBindFramebuffer(gl.GL_READ_FRAMEBUFFER, vr_framebuffer.fb)
+            gl.glBindFramebuffer(gl.GL_DRAW_FRAMEBUFFER, vr_framebuffer.resolve_fb)
+            gl.glBlitFramebuffer(0, 0, vr_framebuffer.width, vr_framebuffer.height,
+                                 0, 0, vr_framebuffer.width, vr_framebuffer.height,
+                                 gl.GL_COLOR_BUFFER_BIT, gl.GL_LINEAR)
+        self.vr_compositor.submit(openvr.Eye_Left, vr_framebuffer.texture, self.eye_texture_bounds[0])
+        self.vr_compositor.submit(openvr.Eye_Right, vr_framebuffer.texture, self.eye_texture_bounds[1])
+        # mirror left eye (half of the framebuffer) to screen:
+        w, h = self.eye_viewports[0][2:]
+        gl.glBindFramebuffer(gl.GL_READ_FRAMEBUFFER,
+                             vr_framebuffer.resolve_fb if vr_framebuffer.multisample
+                             else vr_framebuffer.fb)
+        gl.glBindFramebuffer(gl.GL_DRAW_FRAMEBUFFER, 0)
+        gl.glBlitFramebuffer(0, 0, w, h,
+                             0, 0, self.window_size[0], self.window_size[1],
+                             gl.GL_COLOR_BUFFER_BIT,
+                             gl.GL_NEAREST)
+
     def process_input(self, dt, button_press_callbacks=None, axis_callbacks=None):
         if len(self._controller_indices) < 2:
             if self._time_to_poll <= 0.0:
@@ -0,0 +1,76 @@
+"""
+Conversions between rotation matrices and quaternions.
+
+These only depend on NumPy, so that they may be used (e.g. by :ref:`PoolGame`) without importing
+the rendering modules; they are also available from :mod:`poolvr.gl_rendering`.
+"""
+import numpy as np
+
+
+def set_matrix_from_quaternion(quat, out=None):
+    """
+    Set the values of a 3x3 matrix to those of a rotation matrix.
+
+    *quat* may also be an array of quaternions with shape (..., 4), in which case
+    the rotation matrices for all of them are set at once, i.e. *out* should then
+    have shape (..., 3, 3).
+    """
+    if out is None:
+        out = np.empty(quat.shape[:-1] + (3,3), dtype=quat.dtype)
+    x, y, z, w = quat[...,0], quat[...,1], quat[...,2], quat[...,3]
+    yy = y**2
+    xx = x**2
+    zz = z**2
+    xy = x * y
+    xz = x * z
+    yz = y * z
+    wx = w * x
+    wy = w * y
+    wz = w * z
+    out[...,0,0] = 1.0 - 2.0 * (yy + zz)
+    out[...,0,1] = 2.0 * (xy - wz)
+    out[...,0,2] = 2.0 * (xz + wy)
+    out[...,1,0] = 2.0 * (xy + wz)
+    out[...,1,1] = 1.0 - 2.0 * (xx + zz)
+    out[...,1,2] = 2.0 * (yz - wx)
+    out[...,2,0] = 2.0 * (xz - wy)
+    out[...,2,1] = 2.0 * (yz + wx)
+    out[...,2,2] = 1.0 - 2.0 * (xx + yy)
+    return out
+
+
+def set_quaternion_from_matrix(U, out=None):
+    """
+    http://www.euclideanspace.com/maths/geometry/rotations/conversions/matrixToQuaternion/index.htm
+
+    assumes the upper 3x3 of m is a pure rotation matrix (i.e, unscaled)
+    """
+    if out is None:
+        out = np.empty(4, dtype=U.dtype)
+    trace = U.trace()
+    if trace > 0:
+        s = 0.5 / np.sqrt(trace + 1.0)
+        w = 0.25 / s
+        x = (U[2,1] - U[1,2]) * s
+        y = (U[0,2] - U[2,0]) * s
+        z = (U[1,0] - U[0,1]) * s
+    elif U[0,0] > U[1,1] and U[0,0] > U[2,2]:
+        s = 2.0 * np.sqrt(1.0 + U[0,0] - U[1,1] - U[2,2])
+        w = (U[2,1] - U[1,2]) / s
+        x = 0.25 * s
+        y = (U[0,1] + U[1,0]) / s
+        z = (U[0,2] + U[2,0]) / s
+    elif U[1,1] > U[2,2]:
+        s = 2.0 * np.sqrt(1.0 + U[1,1] - U[0,0] - U[2,2])
+        w = (U[0,2] - U[2,0]) / s
+        x = (U[0,1] + U[1,0]) / s
+        y = 0.25 * s
+        z = (U[1,2] + U[2,1]) / s
+    else:
+        s = 2.0 * np.sqrt(1.0 + U[2,2] - U[0,0] - U[1,1])
+        w = (U[1,0] - U[0,1]) / s
+        x = (U[0,2] + U[2,0]) / s
+        y = (U[1,2] + U[2,1]) / s
+        z = 0.25 * s
+    out[:] = np.array([x, y, z, w])
+    return out
@@ -0,0 +1,137 @@
+import logging
+import numpy as np
+
+
+_logger = logging.getLogger(__name__)
+
+
+from .table import PoolTable
+from .game import PoolGame
+from .gl_rendering import Mesh, set_quaternion_from_matrix
+from .gl_techniques import LAMBERT_TECHNIQUE
+from .ball_instancing import InstancedBallMesh
+
+
+def calc_table_matrices(num_tables, table, spacing=None):
+    """
+    Calculate world transformations which place *num_tables* tables side-by-side along the x-axis,
+    centered about the origin.
+    """
+    if spacing is None:
+        spacing = table.W + 2*table.w + 2*table.width_rail + 1.0
+    matrices = np.array(num_tables * [np.eye(4)], dtype=np.float32)
+    matrices[:,3,0] = spacing * (np.arange(num_tables) - 0.5*(num_tables - 1))
+    return matrices
+
+
+def quaternion_multiply(q1, q2, out=None):
+    """
+    Hamilton product of (arrays of) quaternions stored as ``(x, y, z, w)``.
+    """
+    if out is None:
+        out = np.empty(np.broadcast(q1, q2).shape, dtype=np.result_type(q1, q2))
+    x1, y1, z1, w1 = q1[...,0], q1[...,1], q1[...,2], q1[...,3]
+    x2, y2, z2, w2 = q2[...,0], q2[...,1], q2[...,2], q2[...,3]
+    x = w1*x2 + x1*w2 + y1*z2 - z1*y2
+    y = w1*y2 - x1*z2 + y1*w2 + z1*x2
+    z = w1*z2 + x1*y2 - y1*x2 + z1*w2
+    w = w1*w2 - x1*x2 - y1*y2 - z1*z2
+    out[...,0], out[...,1], out[...,2], out[...,3] = x, y, z, w
+    return out
+
+
+class PoolScene(object):
+    def __init__(self, table_matrices=None, num_tables=1, table=None, games=None,
+                 technique=LAMBERT_TECHNIQUE, table_mesh=None, striped_balls=tuple(range(9,16)),
+                 **kwargs):
+        """
+        Several simultaneous pool games (e.g. live tables and replays) drawn in one scene.
+
+        All tables share a single :ref:`PoolTable` and its exported mesh data (programs, materials
+        and static vertex buffers), and the balls of all tables are drawn by a single
+        :ref:`InstancedBallMesh`, so that adding tables costs almost nothing but the state of their games.
+
+        :param table_matrices: array of shape (*T*, 4, 4), world transformation of each table
+                               (tables are assumed to rest on a common floor, i.e. to be rotated only
+                               about the vertical axis); defaults to :func:`calc_table_matrices`
+        :param games: list of :ref:`PoolGame` (one for each table) -- by default new games are created,
+                      with any additional keyword arguments passed to :ref:`PoolGame`
+        :param table_mesh: the table mesh to share among all tables, defaults to one exported
+                           from *table* using *technique*
+        """
+        if table is None:
+            table = PoolTable(**kwargs)
+        self.table = table
+        if table_matrices is None:
+            table_matrices = calc_table_matrices(num_tables, table)
+        self.table_matrices = np.array(table_matrices, dtype=np.float32)
+        num_tables = len(self.table_matrices)
+        self.num_tables = num_tables
+        if games is None:
+            games = [PoolGame(table=table, **kwargs) for _ in range(num_tables)]
+        if len(games) != num_tables:
+            raise Exception('number of games (%d) does not match number of tables (%d)' % (len(games), num_tables))
+        self.games = games
+        num_balls = table.num_balls
+        self.num_balls = num_balls
+        self._table_rotations = self.table_matrices[:,:3,:3]
+        self._table_translations = self.table_matrices[:,3,:3]
+        self._table_quaternions = np.array([set_quaternion_from_matrix(np.array(m[:3,:3].T, dtype=np.float64))
+                                            for m in self.table_matrices], dtype=np.float32)
+        self.ball_positions = np.empty((num_tables*num_balls, 3), dtype=np.float32)
+        self.ball_quaternions = np.empty((num_tables*num_balls, 4), dtype=np.float32)
+        if table_mesh is None:
+            table_mesh = table.export_mesh(surface_technique=technique,
+                                           cushion_technique=technique,
+                                           rail_technique=technique)
+        self.table_mesh = table_mesh
+        self.table_meshes = [Mesh(self.table_mesh.primitives, matrix=matrix)
+                             for matrix in self.table_matrices]
+        self.ball_mesh = InstancedBallMesh(self.ball_positions, self.ball_quaternions,
+                                           num_tables * list(table.ball_colors), table.ball_radius,
+                                           striped_balls=[t*num_balls + i
+                                                          for t in range(num_tables)
+                                                          for i in striped_balls],
+                                           shadow_height=table.H + 0.001 + self._table_translations[0,1],
+                                           lambert=technique is LAMBERT_TECHNIQUE)
+        self.meshes = self.table_meshes + [self.ball_mesh, self.ball_mesh.shadow_mesh]
+        self.update()
+    def table_slice(self, i):
+        """
+        The slice of the scene's ball state arrays which belongs to table *i*.
+        """
+        return slice(i*self.num_balls, (i+1)*self.num_balls)
+    def init_gl(self, force=False):
+        for mesh in self.meshes:
+            mesh.init_gl(force=force)
+    def step(self, dt, **kwargs):
+        for game in self.games:
+            game.step(dt, **kwargs)
+        self.update()
+    def interpolate_render_state(self, alpha):
+        """
+        Interpolate the ball states of all games between their last two steps
+        (see :meth:`PoolGame.interpolate_render_state`).
+        """
+        for game in self.games:
+            game.interpolate_render_state(alpha)
+        self.update()
+    def update(self):
+        """
+        Transform the ball states of all games to world coordinates.
+        """
+        positions = self.ball_positions.reshape(self.num_tables, self.num_balls, 3)
+        quaternions = self.ball_quaternions.reshape(self.num_tables, self.num_balls, 4)
+        for i, game in enumerate(self.games):
+            np.dot(game.ball_mesh_positions, self._table_rotations[i], out=positions[i])
+            quaternion_multiply(self._table_quaternions[i], game.ball_quaternions, out=quaternions[i])
+        positions += self._table_translations[:,np.newaxis,:]
+    def update_gl(self):
+        self.ball_mesh.update_gl()
+    def set_visible(self, i, ball_visible):
+        """
+        Set which balls of table *i* are drawn.
+        """
+        visible = self.ball_mesh.ball_visible[:,0] != 0
+        visible[self.table_slice(i)] = ball_visible
+        self.ball_mesh.set_visible(visible)
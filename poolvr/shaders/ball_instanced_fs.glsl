@@ -0,0 +1,22 @@
+precision highp float;
+
+uniform vec4 u_base_color;
+uniform float u_stripe_half_width;
+uniform float u_lambert = 1.0;
+
+varying vec3 v_position;
+varying vec3 v_lightpos;
+varying vec4 v_color;
+varying float v_stripe;
+varying float v_y;
+
+void main(void) {
+  vec4 color = v_color;
+  if (v_stripe > 0.5 && abs(v_y) > u_stripe_half_width) {
+    color = u_base_color;
+  }
+  vec3 dpdx = dFdx(v_position);
+  vec3 dpdy = dFdy(v_position);
+  float incFactor = clamp(dot(normalize(v_lightpos - v_position), normalize(cross(dpdx, dpdy))), 0.0, 0.9);
+  gl_FragColor = mix(1.0, 0.1 + incFactor, u_lambert) * color;
+}
@@ -0,0 +1,38 @@
+// per-frame uniforms and stereo_eye() (see gl_rendering.FrameUniformBuffer):
+#include <frame_data>
+precision highp float;
+
+uniform vec3 u_lightpos = vec3(3.0, 10.0, -2.0);
+
+attribute vec3 a_position;
+// per-instance attributes:
+attribute vec3 a_translate;
+attribute vec4 a_quaternion;
+attribute vec4 a_color;
+attribute float a_stripe;
+attribute float a_visible;
+
+varying vec3 v_position;
+varying vec3 v_lightpos;
+varying vec4 v_color;
+varying float v_stripe;
+varying float v_y;
+
+vec3 rotate(vec4 q, vec3 v) {
+  return v + 2.0 * cross(q.xyz, cross(q.xyz, v) + q.w * v);
+}
+
+void main(void) {
+  int eye = stereo_eye();
+  mat4 view = u_eye_transforms[eye] * u_view;
+  v_lightpos = (view * vec4(u_lightpos, 1.0)).xyz;
+  vec4 view_pos = view * vec4(rotate(a_quaternion, a_position) + a_translate, 1.0);
+  v_position = view_pos.xyz;
+  v_color = a_color;
+  v_stripe = a_stripe;
+  v_y = a_position.y;
+  gl_Position = u_eye_projections[eye] * view_pos;
+  if (a_visible == 0.0) {
+    gl_Position = vec4(2.0, 2.0, 2.0, 1.0);
+  }
+}
@@ -0,0 +1,24 @@
+// per-frame uniforms and stereo_eye() (see gl_rendering.FrameUniformBuffer):
+#include <frame_data>
+precision highp float;
+
+// the plane {x : dot(u_shadow_plane, vec4(x, 1.0)) = 0} onto which the shadows are cast:
+uniform vec4 u_shadow_plane;
+// homogeneous position of the light (w = 0 for a directional light):
+uniform vec4 u_light_position;
+
+attribute vec3 a_position;
+// per-instance attributes:
+attribute vec3 a_translate;
+attribute float a_visible;
+
+void main(void) {
+  int eye = stereo_eye();
+  // the balls are spheres, so their orientations do not affect their shadows:
+  vec4 position = vec4(a_position + a_translate, 1.0);
+  position = dot(u_shadow_plane, u_light_position) * position - dot(u_shadow_plane, position) * u_light_position;
+  gl_Position = u_eye_projections[eye] * (u_eye_transforms[eye] * u_view * position);
+  if (a_visible == 0.0) {
+    gl_Position = vec4(2.0, 2.0, 2.0, 1.0);
+  }
+}
@@ -1,10 +1,12 @@
+// per-frame uniforms and stereo_eye() (see gl_rendering.FrameUniformBuffer):
+#include <frame_data>
 precision highp float;
 
 uniform mat4 u_modelview;
-uniform mat4 u_projection;
 
 attribute vec3 a_position;
 
 void main(void) {
-  gl_Position = u_projection * (u_modelview * vec4(a_position, 1.0));
+  int eye = stereo_eye();
+  gl_Position = u_eye_projections[eye] * (u_eye_transforms[eye] * u_modelview * vec4(a_position, 1.0));
 }
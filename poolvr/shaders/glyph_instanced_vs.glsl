@@ -0,0 +1,35 @@
+// per-frame uniforms and stereo_eye() (see gl_rendering.FrameUniformBuffer):
+#include <frame_data>
+precision highp float;
+
+uniform vec3 u_lightpos = vec3(3.0, 10.0, -2.0);
+// if non-zero, glyphs are flattened onto the horizontal plane at height u_shadow_height:
+uniform float u_projected = 0.0;
+uniform float u_shadow_height = 0.0;
+
+attribute vec3 a_position;
+// per-instance attributes:
+attribute vec3 a_translate;
+attribute vec3 a_direction; // <-- unit vector along which the glyph points (zero for hidden glyphs)
+
+varying vec3 v_position;
+varying vec3 v_lightpos;
+
+void main(void) {
+  int eye = stereo_eye();
+  // orthonormal basis whose y-axis is the glyph direction:
+  vec3 y = a_direction;
+  vec3 z = normalize(cross(abs(y.x) < 0.9 ? vec3(1.0, 0.0, 0.0) : vec3(0.0, 0.0, 1.0), y));
+  vec3 x = cross(y, z);
+  vec3 position = a_position.x * x + a_position.y * y + a_position.z * z + a_translate;
+  if (u_projected != 0.0) {
+    position.y = u_shadow_height;
+  }
+  v_lightpos = (u_eye_transforms[eye] * u_view * vec4(u_lightpos, 1.0)).xyz;
+  vec4 view_pos = u_eye_transforms[eye] * u_view * vec4(position, 1.0);
+  v_position = view_pos.xyz;
+  gl_Position = u_eye_projections[eye] * view_pos;
+  if (dot(a_direction, a_direction) == 0.0) {
+    gl_Position = vec4(2.0, 2.0, 2.0, 1.0);
+  }
+}
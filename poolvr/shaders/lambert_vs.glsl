@@ -1,9 +1,9 @@
+// per-frame uniforms and stereo_eye() (see gl_rendering.FrameUniformBuffer):
+#include <frame_data>
 precision highp float;
 
-uniform mat4 u_view;
 uniform mat4 u_modelview;
 // uniform mat4 u_modelview_inverse;
-uniform mat4 u_projection;
 uniform vec3 u_lightpos = vec3(3.0, 10.0, -2.0);
 
 attribute vec3 a_position;
@@ -12,8 +12,9 @@ varying vec3 v_position;
 varying vec3 v_lightpos;
 
 void main(void) {
-  v_lightpos = (u_view * vec4(u_lightpos, 1.0)).xyz;
-  vec4 view_pos = u_modelview * vec4(a_position, 1.0);
+  int eye = stereo_eye();
+  v_lightpos = (u_eye_transforms[eye] * u_view * vec4(u_lightpos, 1.0)).xyz;
+  vec4 view_pos = u_eye_transforms[eye] * u_modelview * vec4(a_position, 1.0);
   v_position = view_pos.xyz;
-  gl_Position = u_projection * view_pos;
+  gl_Position = u_eye_projections[eye] * view_pos;
 }
@@ -1,8 +1,9 @@
 #version 120
+// per-frame uniforms and stereo_eye() (see gl_rendering.FrameUniformBuffer):
+#include <frame_data>
 precision highp float;
 
 uniform mat4 u_modelview;
-uniform mat4 u_projection;
 uniform mat3 u_modelview_inverse_transpose;
 
 attribute vec3 a_position;
@@ -17,11 +18,14 @@ varying vec3 v_bitangent;
 varying vec2 v_texcoord;
 
 void main() {
-  vec4 position = u_modelview * vec4(a_position, 1.0);
+  int eye = stereo_eye();
+  vec4 position = u_eye_transforms[eye] * u_modelview * vec4(a_position, 1.0);
   v_position = position.xyz;
-  gl_Position = u_projection * position;
-  v_normal = normalize(u_modelview_inverse_transpose * a_normal);
-  v_tangent = normalize(u_modelview_inverse_transpose * a_tangent);
-  v_bitangent = normalize(u_modelview_inverse_transpose * cross(a_normal, a_tangent));
+  gl_Position = u_eye_projections[eye] * position;
+  // (the eye transformation is rigid, so it is its own inverse transpose):
+  mat3 normal_matrix = mat3(u_eye_transforms[eye]) * u_modelview_inverse_transpose;
+  v_normal = normalize(normal_matrix * a_normal);
+  v_tangent = normalize(normal_matrix * a_tangent);
+  v_bitangent = normalize(normal_matrix * cross(a_normal, a_tangent));
   v_texcoord = a_texcoord;
 }
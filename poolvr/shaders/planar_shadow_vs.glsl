@@ -0,0 +1,18 @@
+// per-frame uniforms and stereo_eye() (see gl_rendering.FrameUniformBuffer):
+#include <frame_data>
+precision highp float;
+
+uniform mat4 u_model;
+// the plane {x : dot(u_shadow_plane, vec4(x, 1.0)) = 0} onto which the shadow is cast:
+uniform vec4 u_shadow_plane;
+// homogeneous position of the light (w = 0 for a directional light):
+uniform vec4 u_light_position;
+
+attribute vec3 a_position;
+
+void main(void) {
+  int eye = stereo_eye();
+  vec4 position = u_model * vec4(a_position, 1.0);
+  position = dot(u_shadow_plane, u_light_position) * position - dot(u_shadow_plane, position) * u_light_position;
+  gl_Position = u_eye_projections[eye] * (u_eye_transforms[eye] * u_view * position);
+}
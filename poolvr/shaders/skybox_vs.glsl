@@ -1,10 +1,12 @@
+// per-frame uniforms and stereo_eye() (see gl_rendering.FrameUniformBuffer):
+#include <frame_data>
 precision highp float;
 uniform mat4 u_modelview;
-uniform mat4 u_projection;
 attribute vec3 a_position;
 varying vec3 v_texcoord;
 void main(void) {
+  int eye = stereo_eye();
   v_texcoord = a_position;
-  vec4 view_pos = u_modelview * vec4(a_position, 1.0);
-  gl_Position = u_projection * view_pos;
+  vec4 view_pos = u_eye_transforms[eye] * u_modelview * vec4(a_position, 1.0);
+  gl_Position = u_eye_projections[eye] * view_pos;
 }
@@ -1,57 +1,297 @@
+"""
+Collision sounds: a :class:`Mixer` with a fixed pool of voices playing pre-decoded samples is run by the
+audio output's callback (on the audio thread), while the game thread only queues playback commands.
+The mixer may be run instead by a :class:`NullOutput` or :class:`WaveFileOutput`, e.g. for testing.
+
+With the event-based physics engine, the sounds of collisions are scheduled ahead of playback from
+the event list by a :class:`CollisionSoundScheduler`.
+"""
 # import pkgutil
 import os.path
 import logging
+import wave
+from collections import deque
 import numpy as np
 
 
 _logger = logging.getLogger(__name__)
 
 
-try:
-    import sounddevice as sd
-except ImportError as err:
-    sd = None
-    _logger.error('could not import sounddevice:\n%s', err)
-try:
-    import soundfile as sf
-except ImportError as err:
-    sf = None
-    _logger.error('could not import soundfile:\n%s', err)
+# the sound libraries are imported when sound is first used (see import_backends):
+sd = None
+sf = None
+_backends_imported = False
 
 
 SOUNDS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
                           os.path.pardir, 'sounds')
+BLOCKSIZE = 256
+# distance (in meters, along the x-axis) from the center of the table at which sounds are panned fully left/right:
+PAN_WIDTH = 1.0
 
 
 _initialized = False
-ballBall_sound = None
-ballBall_sound_fs = None
-ballBall_temp = None
+mixer = None
+ballBall_sample = None
 output_stream = None
 _output_device = None
 
 
+class Mixer(object):
+    NUM_VOICES = 16
+    def __init__(self, num_voices=NUM_VOICES, channels=2, samplerate=44100):
+        """
+        Mixes up to *num_voices* simultaneously playing samples.
+
+        :meth:`play` may be called from any thread: it only appends a command to a queue (a ``deque``,
+        whose appends and pops are atomic, so no lock is taken), which is processed by the next call of
+        :meth:`mix` on the audio thread.  When all voices are playing, a new sound replaces the oldest one.
+
+        Sounds may be started at a given frame (counting all frames mixed, see :attr:`frame`), to the sample.
+        """
+        self.num_voices = num_voices
+        self.channels = channels
+        self.samplerate = samplerate
+        self.samples = []
+        self.frame = 0
+        self.num_stolen = 0
+        self.voice_samples = np.full(num_voices, -1, dtype=np.int32) # <-- -1 for a free voice
+        self.voice_positions = np.zeros(num_voices, dtype=np.int64)
+        self.voice_start_frames = np.zeros(num_voices, dtype=np.int64)
+        self.voice_gains = np.zeros((num_voices, channels), dtype=np.float32)
+        self._commands = deque()
+    def add_sample(self, data):
+        """
+        Add a (pre-decoded) sample, which is mixed down to a single float32 channel.
+
+        :returns: the index of the sample, by which it is played
+        """
+        data = np.asarray(data, dtype=np.float32)
+        if data.ndim == 2:
+            data = data.mean(axis=1)
+        self.samples.append(np.ascontiguousarray(data, dtype=np.float32))
+        return len(self.samples) - 1
+    def play(self, sample, gain=1.0, pan=0.0, start_frame=None):
+        """
+        Queue sample *sample* for playback.
+
+        :param gain: volume of the sound
+        :param pan: -1 (left) to 1 (right)
+        :param start_frame: frame at which the sound starts (if it has passed when the command is processed,
+                            or is not specified, the sound starts at the beginning of the next mixed block)
+        """
+        self._commands.append(((sample, gain, pan, start_frame),))
+    def play_many(self, sounds):
+        """
+        Queue several sounds, specified by tuples of the arguments of :meth:`play`, as a single command,
+        so that they are all started by the same call of :meth:`mix`.
+        """
+        self._commands.append(tuple(sounds))
+    @property
+    def num_active_voices(self):
+        return int((self.voice_samples >= 0).sum())
+    def pan_gains(self, gain, pan):
+        """
+        The gain of each output channel (constant power panning).
+        """
+        if self.channels == 1:
+            return gain
+        angle = 0.25 * np.pi * (min(1.0, max(-1.0, pan)) + 1)
+        return (gain * np.cos(angle), gain * np.sin(angle))
+    def _start_voice(self, sample, gain=1.0, pan=0.0, start_frame=None):
+        free = np.flatnonzero(self.voice_samples < 0)
+        if len(free):
+            v = free[0]
+        else:
+            v = self.voice_start_frames.argmin()
+            self.num_stolen += 1
+        self.voice_samples[v] = sample
+        if start_frame is None or start_frame < self.frame:
+            start_frame = self.frame
+        # (a negative position is the number of frames until the sound starts)
+        self.voice_positions[v] = self.frame - start_frame
+        self.voice_start_frames[v] = start_frame
+        self.voice_gains[v] = self.pan_gains(gain, pan)
+    def mix(self, out):
+        """
+        Mix the next ``len(out)`` frames of all playing voices into *out*, a float32 array of shape
+        (*frames*, *channels*).
+        """
+        commands = self._commands
+        while commands:
+            for sound in commands.popleft():
+                self._start_voice(*sound)
+        out.fill(0)
+        n = len(out)
+        for v in np.flatnonzero(self.voice_samples >= 0):
+            data = self.samples[self.voice_samples[v]]
+            p = self.voice_positions[v]
+            offset, q = max(0, -p), max(0, p)
+            m = min(n - offset, len(data) - q)
+            if m > 0:
+                out[offset:offset+m] += data[q:q+m,np.newaxis] * self.voice_gains[v]
+            if p + n >= len(data):
+                self.voice_samples[v] = -1
+            else:
+                self.voice_positions[v] = p + n
+        np.clip(out, -1.0, 1.0, out=out)
+        self.frame += n
+        return out
+    def callback(self, outdata, frames, time, status):
+        """
+        ``sounddevice.OutputStream`` callback.
+        """
+        self.mix(outdata)
+
+
+class NullOutput(object):
+    BLOCKSIZE = 512
+    def __init__(self, mixer, blocksize=BLOCKSIZE):
+        """
+        Runs a :class:`Mixer` on demand (see :meth:`render`) in place of an audio device.
+        """
+        self.mixer = mixer
+        self.blocksize = blocksize
+        self._block = np.zeros((blocksize, mixer.channels), dtype=np.float32)
+    def render(self, num_frames):
+        """
+        Mix *num_frames* frames, in blocks of :attr:`blocksize` frames.
+
+        :returns: the mixed frames, an array of shape (*num_frames*, *channels*)
+        """
+        out = np.empty((num_frames, self.mixer.channels), dtype=np.float32)
+        for i in range(0, num_frames, self.blocksize):
+            n = min(self.blocksize, num_frames - i)
+            out[i:i+n] = self.mixer.mix(self._block[:n])
+        return out
+    def close(self):
+        pass
+
+
+class WaveFileOutput(NullOutput):
+    def __init__(self, mixer, filename, blocksize=NullOutput.BLOCKSIZE):
+        """
+        Writes the frames rendered by a :class:`Mixer` (see :meth:`render`) to a 16-bit WAV file.
+        """
+        super().__init__(mixer, blocksize=blocksize)
+        self._file = wave.open(filename, 'wb')
+        self._file.setnchannels(mixer.channels)
+        self._file.setsampwidth(2)
+        self._file.setframerate(mixer.samplerate)
+    def render(self, num_frames):
+        out = super().render(num_frames)
+        self._file.writeframes((32767 * out).astype('<i2').tobytes())
+        return out
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class CollisionSoundScheduler(object):
+    RAIL_GAIN = 0.5
+    def __init__(self, mixer, sample, lookahead=None, latency=None):
+        """
+        Schedules the sounds of the ball, rail and corner collisions of the event-based physics engine
+        (whose times are known ahead of playback) as the game time approaches them.
+
+        :param sample: the sample played for every collision (rail and corner collisions at
+                       :attr:`RAIL_GAIN` times the volume of ball collisions)
+        :param lookahead: the collisions within this time (in seconds) of the game time are scheduled
+                          by each :meth:`update` -- by default, the duration of one block of :data:`BLOCKSIZE` frames
+        :param latency: time (in seconds) from the :meth:`update` call to the mixing of the next block,
+                        i.e. by which all scheduled sounds are delayed -- by default, the lookahead
+        """
+        from .physics.events import BallCollisionEvent, RailCollisionEvent, CornerCollisionEvent
+        self._event_classes = (BallCollisionEvent, RailCollisionEvent, CornerCollisionEvent)
+        self.mixer = mixer
+        self.sample = sample
+        self.lookahead = BLOCKSIZE / mixer.samplerate if lookahead is None else lookahead
+        self.latency = self.lookahead if latency is None else latency
+        self._events = None
+        self._next_event = 0
+    def reset(self):
+        self._events = None
+        self._next_event = 0
+    def update(self, events, t, speed=1.0):
+        """
+        Schedule the sounds of the (not yet scheduled) collisions in the chronological list *events* which occur
+        before game time *t* + :attr:`lookahead` * *speed*, all in one batch.
+
+        :param events: the event list of the physics engine (when it is replaced, e.g. by a reset of the engine,
+                       scheduling restarts from its beginning)
+        :param speed: the game time speed-up factor
+        """
+        if events is not self._events:
+            self._events = events
+            self._next_event = 0
+        ball_collision_class, rail_collision_class, corner_collision_class = self._event_classes
+        mixer = self.mixer
+        t_end = t + self.lookahead * speed
+        frame = mixer.frame + int(self.latency * mixer.samplerate)
+        sounds = []
+        k = self._next_event
+        while k < len(events) and events[k].t < t_end:
+            e = events[k]
+            k += 1
+            if isinstance(e, ball_collision_class):
+                v_n, position, gain = e._v_ij_y0, e._r_i, 1.0
+            elif isinstance(e, rail_collision_class):
+                tau = e.t - e.e_i.t
+                v_n = e.e_i.eval_velocity(tau)[e._J_VAR[e.side]]
+                position, gain = e.e_i.eval_position(tau), self.RAIL_GAIN
+            elif isinstance(e, corner_collision_class):
+                v_n, position, gain = np.dot(e.v_0, e.j_loc), e.r_i, self.RAIL_GAIN
+            else:
+                continue
+            sounds.append((self.sample, gain * collision_sound_volume(abs(v_n)), position[0] / PAN_WIDTH,
+                           frame + int(max(0.0, e.t - t) / speed * mixer.samplerate)))
+        self._next_event = k
+        if sounds:
+            mixer.play_many(sounds)
+        return len(sounds)
+
+
+def import_backends():
+    """
+    Import sounddevice (which loads and initializes PortAudio) and soundfile.
+
+    :returns: ``True`` if sound is available
+    """
+    global sd, sf, _backends_imported
+    if not _backends_imported:
+        _backends_imported = True
+        try:
+            import sounddevice as sd
+        except ImportError as err:
+            _logger.error('could not import sounddevice:\n%s', err)
+        try:
+            import soundfile as sf
+        except ImportError as err:
+            _logger.error('could not import soundfile:\n%s', err)
+    return sd is not None
+
+
 def only_if_avail(func):
     from functools import wraps
     @wraps(func)
     def wrapper(*args, **kwargs):
-        if sd is not None:
+        if import_backends():
             return func(*args, **kwargs)
     return wrapper
 
 
-@only_if_avail
 def init_sound():
     global _initialized
-    global ballBall_sound
-    global ballBall_sound_fs
-    global ballBall_temp
+    global mixer
+    global ballBall_sample
     global _output_device
-    if _output_device is not None and not _initialized:
-        ballBall_sound, ballBall_sound_fs = sf.read(os.path.join(SOUNDS_DIR, 'ballBall.ogg'))
-        ballBall_sound = np.array(ballBall_sound, dtype=np.float32)
-        ballBall_temp = ballBall_sound.copy()
-        open_output_stream()
+    # nothing is imported unless an output device has been set:
+    if _output_device is not None and not _initialized and import_backends():
+        ballBall_sound, ballBall_sound_fs = sf.read(os.path.join(SOUNDS_DIR, 'ballBall.ogg'), dtype='float32')
+        mixer = Mixer(samplerate=ballBall_sound_fs)
+        ballBall_sample = mixer.add_sample(ballBall_sound)
+        open_output_stream(mixer)
         _initialized = True
 
 
@@ -64,35 +304,31 @@ def set_output_sound_device(device):
 
 
 @only_if_avail
-def open_output_stream(device=None, channels=2, samplerate=44100):
+def open_output_stream(mixer, device=None, blocksize=BLOCKSIZE):
+    """
+    Open and start a low-latency output stream whose callback runs *mixer*.
+    """
     global output_stream
-    output_stream = sd.OutputStream(dtype='float32')
-    # device=device, samplerate=samplerate, latency='low',
-    # clip_off=True, dither_off=True, never_drop_input=True)
+    output_stream = sd.OutputStream(device=device, samplerate=mixer.samplerate, channels=mixer.channels,
+                                    dtype='float32', blocksize=blocksize, latency='low',
+                                    callback=mixer.callback)
     output_stream.start()
 
 
-# _n = 0
-# _vol = 0.0
-# _vols = []
+def collision_sound_volume(v_n):
+    """
+    Volume of the sound of a collision with relative normal velocity *v_n*.
+    """
+    return max(0.02, min(0.8, 0.45*v_n + 0.55*v_n**2))
 
 
-@only_if_avail
-def play_ball_ball_collision_sound(vol=1.0):
-    # global _n
-    # global _vol
-    # global _vols
-    if output_stream:
-        n = output_stream.write_available
-        # _n += n
-        # q, r = (_n // len(ballBall_sound),
-        #         _n - (_n // len(ballBall_sound)) * len(ballBall_sound))
-        ballBall_temp[:n] = ballBall_sound[:n]
-        ballBall_temp[:n] *= vol
-        # r = min(r, n)
-        # ballBall_temp[n-r:n] += _vol * ballBall_sound[r:n]
-        output_stream.write(ballBall_temp[:n])
-        # _vol = vol
+def play_ball_ball_collision_sound(vol=1.0, position=None):
+    """
+    Queue the sound of a ball-ball collision, panned according to its *position* (if specified) on the table.
+    """
+    if mixer is not None and ballBall_sample is not None:
+        pan = 0.0 if position is None else position[0] / PAN_WIDTH
+        mixer.play(ballBall_sample, gain=vol, pan=pan)
 
 
 @only_if_avail
@@ -225,17 +225,41 @@ class PoolTable(object):
     def export_ball_meshes(self,
                            striped_balls=tuple(range(9,16)),
                            use_bb_particles=False,
-                           technique=None):
+                           technique=None,
+                           use_instancing=False,
+                           ball_positions=None,
+                           ball_quaternions=None):
+        """
+        Create the meshes for drawing the balls.
+
+        If *use_instancing* is True, a single :ref:`InstancedBallMesh` (whose ``shadow_mesh``
+        draws all of the ball shadows) is returned, which draws *ball_positions* and *ball_quaternions*
+        (float32 arrays, e.g. those of :ref:`PoolGame`) when its ``update_gl`` method is called.
+        Otherwise, each ball mesh has a ``shadow_mesh`` (a :ref:`ProjectedMesh` which shares the ball's
+        world transformation -- if that is rebound, the shadow's should be bound to the same matrix).
+        """
         from .gl_rendering import Mesh, Material, Texture
-        from .gl_primitives import SpherePrimitive, CirclePrimitive
-        from .gl_techniques import EGA_TECHNIQUE
-        from .billboards import BillboardParticles
+        from .gl_primitives import SpherePrimitive, ProjectedMesh
+        from .gl_techniques import EGA_TECHNIQUE, PLANAR_SHADOW_TECHNIQUE
         if technique is None:
             technique = EGA_TECHNIQUE
         num_balls = self.num_balls
-        ball_quaternions = np.zeros((num_balls, 4), dtype=np.float32)
-        ball_quaternions[:,3] = 1
+        if ball_quaternions is None:
+            ball_quaternions = np.zeros((num_balls, 4), dtype=np.float32)
+            ball_quaternions[:,3] = 1
+        if use_instancing:
+            from .ball_instancing import InstancedBallMesh
+            if ball_positions is None:
+                ball_positions = np.array(self.calc_racked_positions(), dtype=np.float32)
+            if striped_balls is None:
+                striped_balls = ()
+            return [InstancedBallMesh(ball_positions, ball_quaternions,
+                                      self.ball_colors, self.ball_radius,
+                                      striped_balls=striped_balls,
+                                      shadow_height=self.H + 0.001,
+                                      lambert=technique is not EGA_TECHNIQUE)]
         if use_bb_particles:
+            from .billboards import BillboardParticles
             ball_billboards = BillboardParticles(Texture(os.path.join(TEXTURES_DIR, 'sphere_bb_alpha.png')),
                                                  Texture(os.path.join(TEXTURES_DIR, 'sphere_bb_normal.png')),
                                                  num_particles=num_balls,
@@ -260,19 +284,15 @@ class PoolTable(object):
                                               heightSegments=4,
                                               thetaStart=np.pi/3, thetaLength=np.pi/3)
                 stripe_prim.attributes['a_position'] = stripe_prim.attributes['vertices']
-            circle_prim = CirclePrimitive(radius=self.ball_radius, num_radial=16)
-            circle_prim.attributes['a_position'] = circle_prim.attributes['vertices']
-            shadow_material = Material(EGA_TECHNIQUE, values={'u_color': [0.01, 0.03, 0.001, 0.0]})
+            shadow_material = Material(PLANAR_SHADOW_TECHNIQUE, values={'u_color': [0.01, 0.03, 0.001, 0.0]})
             ball_meshes = [Mesh({material        : [sphere_prim]})
                            if i not in striped_balls else
                            Mesh({ball_materials[0] : [sphere_prim],
                                  material          : [stripe_prim]})
                            for i, material in enumerate(ball_materials)]
-            ball_shadow_meshes = [Mesh({shadow_material : [circle_prim]})
-                                  for i in range(num_balls)]
-            for i, mesh in enumerate(ball_meshes):
-                mesh.shadow_mesh = ball_shadow_meshes[i]
-                mesh.shadow_mesh.world_position[:] = self.H + 0.001
+            for mesh in ball_meshes:
+                mesh.shadow_mesh = ProjectedMesh(mesh, shadow_material, primitives=[sphere_prim],
+                                                 c=self.H + 0.001)
             return ball_meshes
 
     def calc_racked_positions(self, d=None,
@@ -0,0 +1,110 @@
+"""
+On-disk cache of decoded, mip-mapped texture images.
+
+The first time an image is loaded, it is decoded and its complete mip chain is computed
+(by 2x2 box filtering) and written to the cache directory as a raw ``.npy`` array, along with
+a small ``.json`` index of the levels.  The cache entry is keyed by the image's absolute path,
+modification time and size, so it is invalidated whenever the image file changes.
+Subsequent loads memory-map the cached array, so that the mip levels can be passed to GL
+without being decoded or copied.
+
+The cache directory is ``$POOLVR_CACHE_DIR/textures`` if the environment variable ``POOLVR_CACHE_DIR``
+is set, ``~/.cache/poolvr/textures`` otherwise.
+"""
+import os
+import os.path
+import json
+import hashlib
+import logging
+import numpy as np
+
+
+_logger = logging.getLogger(__name__)
+
+
+def get_cache_dir():
+    cache_dir = os.environ.get('POOLVR_CACHE_DIR', None)
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.expanduser('~'), '.cache', 'poolvr')
+    return os.path.join(cache_dir, 'textures')
+
+
+def decode_image(uri):
+    """
+    Decode an image file to an array of shape (height, width, 3 or 4) (RGB or RGBA, respectively).
+    """
+    import PIL.Image as Image
+    image = Image.open(uri)
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA')
+    return np.asarray(image, dtype=np.ubyte)
+
+
+def calc_mip_chain(image):
+    """
+    Calculate the mip chain of an image (by averaging 2x2 blocks of texels),
+    returning a list of arrays of levels 0 (the image itself), 1, ..., down to size 1x1.
+    """
+    levels = [image]
+    while image.shape[0] > 1 or image.shape[1] > 1:
+        height, width = max(1, image.shape[0] // 2), max(1, image.shape[1] // 2)
+        texels = np.array(image, dtype=np.uint16)
+        if image.shape[0] > 1:
+            texels = texels[:2*height:2] + texels[1:2*height:2]
+        else:
+            texels = 2 * texels
+        if image.shape[1] > 1:
+            texels = texels[:,:2*width:2] + texels[:,1:2*width:2]
+        else:
+            texels = 2 * texels
+        image = ((texels + 2) // 4).astype(np.ubyte)
+        levels.append(image)
+    return levels
+
+
+def _cache_key(uri):
+    uri = os.path.abspath(uri)
+    stat = os.stat(uri)
+    return hashlib.sha1(('%s:%d:%d' % (uri, stat.st_mtime_ns, stat.st_size)).encode()).hexdigest()
+
+
+def load_texture_levels(uri, use_cache=True):
+    """
+    Load the mip chain of the image file *uri* (see :func:`calc_mip_chain`), from the cache if possible.
+
+    :returns: list of arrays of shape (height, width, 3 or 4) -- when loaded from the cache,
+              these are views of a read-only memory map
+    """
+    if not use_cache:
+        return calc_mip_chain(decode_image(uri))
+    cache_dir = get_cache_dir()
+    key = _cache_key(uri)
+    index_path = os.path.join(cache_dir, key + '.json')
+    data_path = os.path.join(cache_dir, key + '.npy')
+    if os.path.exists(index_path):
+        try:
+            with open(index_path) as f:
+                index = json.load(f)
+            data = np.load(data_path, mmap_mode='r')
+            return [data[offset:offset+np.prod(shape)].reshape(shape)
+                    for offset, shape in index['levels']]
+        except Exception as err:
+            _logger.warning('could not load cached texture data for "%s": %s', uri, err)
+    levels = calc_mip_chain(decode_image(uri))
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        offsets = np.cumsum([0] + [level.size for level in levels])
+        # both files are written to temporary files first, and the index is replaced last,
+        # so that incompletely written entries are never used:
+        tmp_suffix = '.%d.tmp' % os.getpid()
+        with open(data_path + tmp_suffix, 'wb') as f:
+            np.save(f, np.concatenate([level.ravel() for level in levels]))
+        with open(index_path + tmp_suffix, 'w') as f:
+            json.dump({'uri': os.path.abspath(uri),
+                       'levels': [(int(offset), level.shape) for offset, level in zip(offsets, levels)]}, f)
+        os.replace(data_path + tmp_suffix, data_path)
+        os.replace(index_path + tmp_suffix, index_path)
+        _logger.debug('cached texture data for "%s" in "%s"', uri, data_path)
+    except Exception as err:
+        _logger.warning('could not cache texture data for "%s": %s', uri, err)
+    return levels
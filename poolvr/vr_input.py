@@ -2,6 +2,9 @@ import numpy as np
 import openvr
 
 
+from .vr_pose_sampler import estimate_point_velocity
+
+
 cue_offset = np.zeros(3, dtype=np.float64)
 offset_adjustment_mode = 0
 
@@ -49,6 +52,23 @@ def calc_cue_contact_velocity(r_c, r_0, r_1, v_0, v_1):
     return v_0 + np.cross(omega, r_c - r_0)
 
 
+def estimate_cue_contact_velocity(pose_history, r_c, cue_world_matrix):
+    """
+    Estimate the velocity of the cue at the point of contact *r_c* (in world coordinates)
+    from the recent history of both controllers' poses (see :meth:`PoseRingBuffer.history`).
+
+    :returns: the estimated velocity, or ``None`` if there are not enough samples
+    """
+    times, poses, _, _, valid = pose_history
+    both_valid = valid.all(axis=-1)
+    times, poses = times[both_valid], poses[both_valid]
+    if len(times) < 2:
+        return None
+    world_matrices = np.array([calc_cue_transformation(pose_0, pose_1) for pose_0, pose_1 in poses])
+    point = (r_c - cue_world_matrix[3,:3]).dot(cue_world_matrix[:3,:3].T)
+    return estimate_point_velocity(times, world_matrices, point)
+
+
 axis_callbacks = {
     openvr.k_EButton_Axis0: cue_position_fb_ud,
     #openvr.k_EButton_Axis1: lock_to_cue
@@ -0,0 +1,154 @@
+"""
+High-rate sampling of tracked controller poses.
+
+The renderer obtains poses once per frame (from ``IVRCompositor.waitGetPoses``), i.e. at the display
+rate.  A :class:`PoseSampler` polls the poses of the controllers on a background thread at a higher
+(configurable) rate into a :class:`PoseRingBuffer`, so that e.g. the impact velocity of a cue strike
+can be estimated from the recent history of the stroke rather than from a single sample
+(see :func:`estimate_point_velocity`).
+"""
+import logging
+import threading
+import time
+from ctypes import c_float, cast, POINTER
+import numpy as np
+from numpy.ctypeslib import as_array
+
+
+_logger = logging.getLogger(__name__)
+
+
+c_float_p = POINTER(c_float)
+
+
+class PoseRingBuffer(object):
+    def __init__(self, capacity=1024, num_devices=2):
+        """
+        Fixed-capacity buffer of the most recent pose samples of *num_devices* tracked devices.
+
+        Samples are appended by a single writer (the sampling thread) and may be read concurrently.
+        """
+        self.capacity = capacity
+        self.num_devices = num_devices
+        self.times = np.zeros(capacity, dtype=np.float64)
+        self.poses = np.zeros((capacity, num_devices, 3, 4), dtype=np.float64)
+        self.velocities = np.zeros((capacity, num_devices, 3), dtype=np.float64)
+        self.angular_velocities = np.zeros((capacity, num_devices, 3), dtype=np.float64)
+        self.valid = np.zeros((capacity, num_devices), dtype=np.bool_)
+        self.count = 0
+        self._lock = threading.Lock()
+    def append(self, t, poses, velocities, angular_velocities, valid):
+        with self._lock:
+            i = self.count % self.capacity
+            self.times[i] = t
+            self.poses[i] = poses
+            self.velocities[i] = velocities
+            self.angular_velocities[i] = angular_velocities
+            self.valid[i] = valid
+            self.count += 1
+    def history(self, duration=None, max_samples=None):
+        """
+        The samples of the last *duration* seconds (relative to the most recent sample), or the last
+        *max_samples* samples, in chronological order.
+
+        :returns: a tuple of copies of the ``times``, ``poses``, ``velocities``, ``angular_velocities``
+                  and ``valid`` arrays of those samples
+        """
+        with self._lock:
+            n = min(self.count, self.capacity)
+            if max_samples is not None:
+                n = min(n, max_samples)
+            indices = np.arange(self.count - n, self.count) % self.capacity
+            if duration is not None and n:
+                indices = indices[self.times[indices] >= self.times[indices[-1]] - duration]
+            return (self.times[indices], self.poses[indices], self.velocities[indices],
+                    self.angular_velocities[indices], self.valid[indices])
+    def clear(self):
+        with self._lock:
+            self.count = 0
+
+
+class PoseSampler(object):
+    RATE = 500.0
+    def __init__(self, vr_system, device_indices, rate=RATE, capacity=1024, tracking_universe=None):
+        """
+        Polls the poses of tracked devices on a background thread.
+
+        :param vr_system: the ``openvr.IVRSystem``
+        :param device_indices: list of the (up to two) tracked device indices of the controllers --
+                               it may be a list which is filled in later (e.g. ``OpenVRRenderer._controller_indices``)
+        :param rate: sampling rate (in Hz)
+        :param capacity: number of samples kept in the :attr:`buffer`
+        :param tracking_universe: tracking space of the sampled poses (by default that of the compositor)
+        """
+        import openvr
+        self._openvr = openvr
+        self.vr_system = vr_system
+        self.device_indices = device_indices
+        self.rate = rate
+        if tracking_universe is None:
+            tracking_universe = openvr.VRCompositor().getTrackingSpace()
+        self.tracking_universe = tracking_universe
+        self.buffer = PoseRingBuffer(capacity=capacity, num_devices=2)
+        self._poses = (openvr.TrackedDevicePose_t * openvr.k_unMaxTrackedDeviceCount)()
+        self._thread = None
+        self._running = False
+    def start(self):
+        if self._thread is None:
+            self._running = True
+            self._thread = threading.Thread(target=self._run, name='PoseSampler', daemon=True)
+            self._thread.start()
+    def stop(self):
+        if self._thread is not None:
+            self._running = False
+            self._thread.join()
+            self._thread = None
+    def _run(self):
+        openvr = self._openvr
+        poses = np.zeros((2, 3, 4), dtype=np.float64)
+        velocities = np.zeros((2, 3), dtype=np.float64)
+        angular_velocities = np.zeros((2, 3), dtype=np.float64)
+        valid = np.zeros(2, dtype=np.bool_)
+        interval = 1.0 / self.rate
+        next_t = time.perf_counter()
+        while self._running:
+            self.vr_system.getDeviceToAbsoluteTrackingPose(self.tracking_universe, 0, self._poses,
+                                                           openvr.k_unMaxTrackedDeviceCount)
+            t = time.perf_counter()
+            valid[:] = False
+            for k, i in enumerate(self.device_indices[:2]):
+                pose = self._poses[i]
+                if pose.bPoseIsValid:
+                    poses[k] = as_array(cast(pose.mDeviceToAbsoluteTracking.m, c_float_p), shape=(3,4))
+                    velocities[k] = pose.vVelocity.v
+                    angular_velocities[k] = pose.vAngularVelocity.v
+                    valid[k] = True
+            self.buffer.append(t, poses, velocities, angular_velocities, valid)
+            next_t += interval
+            sleep_time = next_t - time.perf_counter()
+            if sleep_time > 0:
+                time.sleep(sleep_time)
+            else:
+                # fell behind (e.g. the process was descheduled), don't try to catch up:
+                next_t = time.perf_counter()
+
+
+def estimate_point_velocity(times, world_matrices, point, degree=2):
+    """
+    Estimate the velocity, at the time of the last sample, of a point which moves rigidly with
+    a tracked object, by a least-squares polynomial fit to the point's sampled trajectory.
+
+    :param times: sample times, shape (*K*,)
+    :param world_matrices: sampled (row-vector convention) world transformations of the object,
+                           shape (*K*, 4, 4) (or (*K*, 4, 3) -- only the rotation and translation are used)
+    :param point: position of the point in the object's local coordinates
+    :param degree: degree of the fitted polynomial (it is reduced if there are too few samples)
+    :returns: the estimated velocity, or ``None`` if there are fewer than two samples
+    """
+    if len(times) < 2:
+        return None
+    positions = point.dot(world_matrices[:,:3,:3]) + world_matrices[:,3,:3]
+    degree = min(degree, len(times) - 1)
+    # fit in time relative to the last sample, so that the velocity is the linear coefficient:
+    coeffs = np.polynomial.polynomial.polyfit(times - times[-1], positions, degree)
+    return coeffs[1]
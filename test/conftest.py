@@ -45,6 +45,14 @@ def pytest_addoption(parser):
     parser.addoption('--no-distance-check',
                      help="disable checking that every pair of balls is separated by at least one ball diameter",
                      action="store_true")
+    parser.addoption('--headless', help='run GL tests which do not need a window in a headless (EGL) OpenGL context',
+                     action='store_true')
+
+
+def pytest_configure(config):
+    if config.getoption('--headless'):
+        # must happen before anything imports OpenGL.GL:
+        import poolvr.egl_app
 
 
 def pytest_generate_tests(metafunc):
@@ -277,7 +285,6 @@ def gl_rendering(pool_physics, pool_table, request, meshes):
                                           KEY_LEFT, KEY_RIGHT,
                                           KEY_W, KEY_S, KEY_A, KEY_D, KEY_Q, KEY_Z)
     from poolvr.game import PoolGame
-    from poolvr.gl_rendering import set_matrix_from_quaternion
     logging.getLogger('poolvr.gl_rendering').setLevel(logging.WARNING)
     if render_method == 'ega':
         from poolvr.gl_techniques import EGA_TECHNIQUE as technique
@@ -310,9 +317,9 @@ def gl_rendering(pool_physics, pool_table, request, meshes):
         glyphs = False
     for mesh in meshes:
         mesh.init_gl(force=True)
-    ball_mesh_positions = [mesh.world_matrix[3,:3] for mesh in ball_meshes]
-    ball_mesh_rotations = [mesh.world_matrix[:3,:3].T for mesh in ball_meshes]
-    ball_shadow_mesh_positions = [mesh.world_matrix[3,:3] for mesh in ball_shadow_meshes]
+    for i, (ball_mesh, shadow_mesh) in enumerate(zip(ball_meshes, ball_shadow_meshes)):
+        ball_mesh.bind_world_matrix(game.ball_world_matrices[i])
+        shadow_mesh.bind_world_matrix(game.ball_world_matrices[i])
     init_keyboard(window)
     theta = 0.0
     def process_keyboard_input(dt, camera_world_matrix):
@@ -351,10 +358,7 @@ def gl_rendering(pool_physics, pool_table, request, meshes):
             glyph_meshes = []
         game.step(speed*dt)
         with renderer.render(meshes=meshes+glyph_meshes, dt=dt):
-            for i, pos in enumerate(game.ball_positions):
-                ball_mesh_positions[i][:] = pos
-                set_matrix_from_quaternion(game.ball_quaternions[i], out=ball_mesh_rotations[i])
-                ball_shadow_mesh_positions[i][0::2] = pos[0::2]
+            pass
         max_frame_time = max(max_frame_time, dt)
         if nframes == 0:
             st = glfw.GetTime()
@@ -376,10 +380,7 @@ def gl_rendering(pool_physics, pool_table, request, meshes):
             t_end = physics.events[-1].t
         with renderer.render(meshes=meshes):
             physics.eval_positions(t_end, out=game.ball_positions)
-            for i, pos in enumerate(game.ball_positions):
-                ball_mesh_positions[i][:] = pos
-                set_matrix_from_quaternion(game.ball_quaternions[i], out=ball_mesh_rotations[i])
-                ball_shadow_mesh_positions[i][0::2] = pos[0::2]
+            game.update_render_state()
         glfw.SwapBuffers(window)
         capture_window(window, filename=os.path.join(os.path.dirname(__file__), 'screenshots',
                                                      title.replace(' ', '_') + '.png'))
@@ -388,6 +389,16 @@ def gl_rendering(pool_physics, pool_table, request, meshes):
     glfw.Terminate()
 
 
+@pytest.fixture
+def gl_context(request):
+    if not request.config.getoption('--headless'):
+        pytest.skip('requires --headless (EGL)')
+    from poolvr.egl_app import setup_egl, shutdown_egl
+    egl_context, renderer = setup_egl(window_size=(64, 64))
+    yield renderer
+    shutdown_egl(egl_context)
+
+
 @pytest.fixture
 def render_meshes(request):
     should_render = request.config.getoption('--render')
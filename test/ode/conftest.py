@@ -52,7 +52,6 @@ def ode_gl_rendering(ode_pool_physics, pool_table, request):
     for mesh in meshes:
         mesh.init_gl(force=True)
     ball_mesh_positions = [mesh.world_matrix[3,:3] for mesh in ball_meshes]
-    ball_shadow_mesh_positions = [mesh.world_matrix[3,:3] for mesh in ball_shadow_meshes]
     process_keyboard_input = init_keyboard(window)
     def on_keydown(window, key, scancode, action, mods):
         if key == glfw.KEY_R and action == glfw.PRESS:
@@ -75,7 +74,6 @@ def ode_gl_rendering(ode_pool_physics, pool_table, request):
         with renderer.render(meshes=meshes):# as frame_data:
             for i, pos in enumerate(game.ball_positions):
                 ball_mesh_positions[i][:] = pos
-                ball_shadow_mesh_positions[i][0::2] = pos[0::2]
         game.step(dt)
         max_frame_time = max(max_frame_time, dt)
         if nframes == 0:
@@ -89,7 +87,6 @@ def ode_gl_rendering(ode_pool_physics, pool_table, request):
         physics.eval_positions(t_end, out=game.ball_positions)
         for i, pos in enumerate(game.ball_positions):
             ball_mesh_positions[i][:] = pos
-            ball_shadow_mesh_positions[i][0::2] = pos[0::2]
         glfw.SwapBuffers(window)
     capture_window(window,
                    filename=os.path.join(os.path.dirname(__file__), 'screenshots',
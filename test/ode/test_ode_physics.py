@@ -29,6 +29,50 @@ def test_ball_collision(ode_pool_physics, ode_gl_rendering):
     physics.strike_ball(0.0, 0, ball_positions[0], r_c, cue.velocity, cue.mass)
 
 
+def test_space_types(pool_table):
+    import numpy as np
+    from poolvr.ode_physics import ODEPoolPhysics, SPACE_TYPES
+    ball_positions = pool_table.calc_racked_positions()
+    r_c = ball_positions[0].copy()
+    r_c[2] += pool_table.ball_radius
+    cue = PoolCue()
+    cue.velocity[2] = -4.0
+    final_positions = []
+    for space_type in SPACE_TYPES:
+        physics = ODEPoolPhysics(table=pool_table, space_type=space_type, initial_positions=ball_positions)
+        physics.reset(ball_positions=ball_positions, balls_on_table=[0, 1])
+        physics.strike_ball(0.0, 0, ball_positions[0], r_c, cue.velocity, cue.mass)
+        for _ in range(240):
+            physics.step(1.0/240)
+        final_positions.append(physics.eval_positions(physics.t))
+    # the broad phase determines only the order in which contacts are generated:
+    for positions in final_positions[1:]:
+        assert np.allclose(positions[:2], final_positions[0][:2], atol=1e-4)
+    assert not np.allclose(final_positions[0][1], ball_positions[1])
+
+
+def test_substeps(pool_table):
+    import numpy as np
+    from poolvr.ode_physics import ODEPoolPhysics
+    ball_positions = pool_table.calc_racked_positions()
+    r_c = ball_positions[0].copy()
+    r_c[2] += pool_table.ball_radius
+    cue = PoolCue()
+    cue.velocity[2] = -4.0
+    states = []
+    for dt in (1.0/90, 1.0/240):
+        physics = ODEPoolPhysics(table=pool_table, initial_positions=ball_positions, substep_dt=1.0/960)
+        physics.reset(ball_positions=ball_positions, balls_on_table=[0, 1])
+        physics.strike_ball(0.0, 0, ball_positions[0], r_c, cue.velocity, cue.mass)
+        for _ in range(int(round(1.0 / dt))):
+            physics.step(dt)
+        assert physics.nsteps == 960
+        states.append((physics.eval_positions(physics.t), physics.eval_velocities(physics.t, balls=[0, 1])))
+    # the simulation does not depend on the frame rate:
+    assert np.allclose(states[0][0], states[1][0], atol=1e-9)
+    assert np.allclose(states[0][1], states[1][1], atol=1e-9)
+
+
 # class ODEPhysicsTests(TestCase):
 #     show = True
 
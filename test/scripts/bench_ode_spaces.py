@@ -0,0 +1,82 @@
+"""
+Benchmark the ODE physics backend (steps per second, simulating a break shot) with each collision space type:
+
+  - "legacy":   ``ode.SimpleSpace`` without category bits, and a near callback which looks up
+                ball indices with ``list.index`` (the previous setup)
+  - "simple":   ``ode.SimpleSpace`` (all pairs)
+  - "hash":     ``ode.HashSpace``
+  - "quadtree": ``ode.QuadTreeSpace``
+
+Usage: ``python test/scripts/bench_ode_spaces.py [num_steps [dt]]``
+"""
+import sys
+import os.path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.path.pardir, os.path.pardir))
+import logging
+import time
+from poolvr.cue import PoolCue
+from poolvr.table import PoolTable
+from poolvr.ode_physics import ODEPoolPhysics, SPACE_TYPES
+
+
+_logger = logging.getLogger(__name__)
+ALL_BITS = 0xffffffff
+
+
+class LegacyODEPoolPhysics(ODEPoolPhysics):
+    def __init__(self, **kwargs):
+        super().__init__(space_type='simple', **kwargs)
+        for geom in self.ball_geoms + [self.table_geom]:
+            geom.setCategoryBits(ALL_BITS)
+            geom.setCollideBits(ALL_BITS)
+    def _near_callback(self, args, geom1, geom2):
+        try:
+            i = self.ball_geoms.index(geom1)
+            if not self._on_table[i]:
+                return
+        except Exception:
+            pass
+        try:
+            j = self.ball_geoms.index(geom2)
+            if not self._on_table[j]:
+                return
+        except Exception:
+            pass
+        super()._near_callback(args, geom1, geom2)
+
+
+def bench(physics, num_steps, dt):
+    ball_positions = physics.table.calc_racked_positions()
+    physics.reset(ball_positions=ball_positions)
+    r_c = ball_positions[0].copy()
+    r_c[2] += physics.ball_radius
+    cue = PoolCue()
+    cue.velocity[2] = -8.0
+    physics.strike_ball(0.0, 0, ball_positions[0], r_c, cue.velocity, cue.mass)
+    t0 = time.perf_counter()
+    for _ in range(num_steps):
+        physics.step(dt)
+    t = time.perf_counter() - t0
+    return t, physics.eval_positions(physics.t)
+
+
+def main(num_steps=2000, dt=1.0/480):
+    table = PoolTable()
+    _logger.info('%d steps of %.3f ms (break shot)', num_steps, 1e3*dt)
+    reference = None
+    for name in ('legacy',) + SPACE_TYPES:
+        if name == 'legacy':
+            physics = LegacyODEPoolPhysics(table=table)
+        else:
+            physics = ODEPoolPhysics(table=table, space_type=name)
+        t, positions = bench(physics, num_steps, dt)
+        if reference is None:
+            reference = positions
+        _logger.info('%10s: %9.1f steps / s (max. position difference from "legacy": %.3g m)',
+                     name, num_steps / t, abs(positions - reference).max())
+
+
+if __name__ == "__main__":
+    logging.basicConfig(format='%(asctime).19s [%(levelname)s]%(name)s.%(funcName)s:%(lineno)d: %(message)s',
+                        level=logging.INFO)
+    main(*[int(arg) if i == 0 else float(arg) for i, arg in enumerate(sys.argv[1:])])
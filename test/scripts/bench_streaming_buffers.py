@@ -0,0 +1,75 @@
+"""
+Benchmark per-frame vertex buffer uploads in a headless (EGL) OpenGL context:
+
+  - "subdata":    ``tobytes()`` + ``glBufferSubData`` (the previous upload path)
+  - "orphaning":  :ref:`StreamingBuffer` with orphaning
+  - "persistent": :ref:`StreamingBuffer` with a persistently mapped ring buffer
+
+Usage: ``python test/scripts/bench_streaming_buffers.py [num_vertices [num_frames]]``
+"""
+import sys
+import os.path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.path.pardir, os.path.pardir))
+import logging
+import time
+from poolvr.egl_app import setup_egl, shutdown_egl
+import numpy as np
+import OpenGL.GL as gl
+from poolvr.gl_rendering import StreamingBuffer
+
+
+_logger = logging.getLogger(__name__)
+
+
+def bench_subdata(data, num_frames):
+    vbo = gl.glGenBuffers(1)
+    gl.glBindBuffer(gl.GL_ARRAY_BUFFER, vbo)
+    gl.glBufferData(gl.GL_ARRAY_BUFFER, data.nbytes, None, gl.GL_DYNAMIC_DRAW)
+    gl.glBindBuffer(gl.GL_ARRAY_BUFFER, 0)
+    t0 = time.perf_counter()
+    for i in range(num_frames):
+        data[0,0] = i
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, vbo)
+        values = data.tobytes()
+        gl.glBufferSubData(gl.GL_ARRAY_BUFFER, 0, len(values), values)
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, 0)
+        gl.glFlush()
+    gl.glFinish()
+    t = time.perf_counter() - t0
+    gl.glDeleteBuffers(1, [vbo])
+    return t
+
+
+def bench_stream(data, num_frames, persistent):
+    stream = StreamingBuffer(data.nbytes, persistent=persistent)
+    stream.init_gl()
+    if persistent and not stream.is_mapped:
+        _logger.warning('persistent mapping is not supported')
+        return float('nan')
+    t0 = time.perf_counter()
+    for i in range(num_frames):
+        data[0,0] = i
+        stream.update(data)
+        gl.glFlush()
+    gl.glFinish()
+    t = time.perf_counter() - t0
+    stream.release()
+    return t
+
+
+def main(num_vertices=4096, num_frames=2000):
+    egl_context, renderer = setup_egl(window_size=(64, 64))
+    data = np.random.rand(num_vertices, 3).astype(np.float32)
+    _logger.info('%d vertices (%d bytes), %d frames', num_vertices, data.nbytes, num_frames)
+    for name, bench in (('subdata', bench_subdata),
+                        ('orphaning', lambda d, n: bench_stream(d, n, False)),
+                        ('persistent', lambda d, n: bench_stream(d, n, True))):
+        t = bench(data, num_frames)
+        _logger.info('%12s: %9.3f us / upload', name, 1e6 * t / num_frames)
+    shutdown_egl(egl_context)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(format='%(asctime).19s [%(levelname)s]%(name)s.%(funcName)s:%(lineno)d: %(message)s',
+                        level=logging.INFO)
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,175 @@
+"""
+Compare the event-based physics engine (:class:`poolvr.physics.PoolPhysics`) with the ODE backend
+(:class:`poolvr.ode_physics.ODEPoolPhysics`) on a set of canonical shots (the setups of ``test/test_physics.py``):
+
+  - "break":   the break shot of ``test_break_and_following_shot``
+  - "stun":    a centre-ball hit into an object ball 8 ball radii away
+  - "follow":  the same, hit 30 degrees above centre
+  - "english": the strike of ``test_strike_ball_english``
+  - "corner":  a lone ball at the centre of the table, shot into a corner (as in ``test_corner_collision``)
+
+Each shot is run headlessly through both engines, which are given the same ball and friction parameters
+(:data:`PHYSICAL_PARAMETERS`) and table.  The ODE trajectories are recorded by stepping at
+a fixed time step; the event-based trajectories are sampled at the same times, all at once, from the
+motion coefficients of the events.  For each shot the divergence of the ball positions
+(maximum / RMS / final distance between the engines) is reported, along with the time at which the
+balls come to rest, the wall time of each engine and its rate of events (or steps) per second.
+
+Usage: ``python test/scripts/compare_engines.py [dt [max_time]]``
+"""
+import sys
+import os.path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.path.pardir, os.path.pardir))
+import logging
+import time
+import numpy as np
+from poolvr.table import PoolTable
+from poolvr.physics import PoolPhysics
+from poolvr.physics.events import PhysicsEvent, BallMotionEvent, BallStationaryEvent
+from poolvr.ode_physics import ODEPoolPhysics
+
+
+_logger = logging.getLogger(__name__)
+SHOTS = ('break', 'stun', 'follow', 'english', 'corner')
+CUE_MASS = 0.54
+DEG2RAD = np.pi/180
+REST_SPEED = 1e-3
+# the physical parameters shared by both engines (those of the event-based engine),
+# so that the comparison measures the differences between the engines only:
+PHYSICAL_PARAMETERS = {name: getattr(PhysicsEvent, name)
+                       for name in ('ball_mass', 'ball_radius', 'mu_s', 'mu_b', 'mu_r', 'mu_sp', 'g')}
+
+
+def setup_shot(name, physics):
+    """
+    :returns: the balls on the table, the ball positions, and the point of contact and impact velocity
+              of the strike on the cue ball
+    """
+    R = physics.table.ball_radius
+    ball_positions = physics.table.calc_racked_positions()
+    balls_on_table = list(range(physics.num_balls))
+    r_c = ball_positions[0].copy()
+    if name == 'break':
+        r_c[2] += R
+        V = np.array((-0.01, 0.0, -1.6), dtype=np.float64)
+    elif name in ('stun', 'follow'):
+        balls_on_table = [0, 1]
+        ball_positions[1] = ball_positions[0]
+        ball_positions[1,2] -= 8 * R
+        angle = 30*DEG2RAD if name == 'follow' else 0.0
+        r_c[1] += R * np.sin(angle)
+        r_c[2] += R * np.cos(angle)
+        V = np.array((0.0, 0.0, -1.5), dtype=np.float64)
+    elif name == 'english':
+        sy, cy = np.sin(45*DEG2RAD), np.cos(45*DEG2RAD)
+        sxz, cxz = np.sin(80*DEG2RAD), np.cos(80*DEG2RAD)
+        r_c += R * np.array((cy * sxz, sy, cy * cxz))
+        V = np.array((0.0, 0.0, -1.5), dtype=np.float64)
+    elif name == 'corner':
+        balls_on_table = [0]
+        ball_positions[0,::2] = 0
+        r_cp = physics._r_cp[0,0]
+        r_i = r_cp + R * np.array([np.sign(r_cp[0])*np.cos(10*DEG2RAD),
+                                   0.0,
+                                   np.sign(r_cp[2])*np.sin(10*DEG2RAD)])
+        n = r_i - ball_positions[0]
+        n /= np.sqrt(np.dot(n, n))
+        r_c = ball_positions[0] - R * n
+        V = 1.5 * n
+    else:
+        raise Exception('%s: dont know that shot!' % name)
+    return balls_on_table, ball_positions, r_c, V
+
+
+def sample_positions(physics, times, balls):
+    """
+    Evaluate the positions of *balls* at each of the (sorted) *times* from the events of the event-based engine,
+    i.e. the trajectories which :meth:`PoolPhysics.eval_positions` would give when called for each time.
+
+    :returns: shape (*len(times)*, *len(balls)*, 3) array
+    """
+    out = np.empty((len(times), len(balls), 3), dtype=np.float64)
+    for ii, i in enumerate(balls):
+        events = [e for e in physics.ball_events[i] if isinstance(e, (BallMotionEvent, BallStationaryEvent))]
+        t_e = np.array([e.t for e in events])
+        a = np.zeros((len(events), 3, 3), dtype=np.float64)
+        for ie, e in enumerate(events):
+            if isinstance(e, BallMotionEvent):
+                a[ie] = e._a
+            else:
+                a[ie,0] = e._r_0
+        ie = np.maximum(np.searchsorted(t_e, times, side='right') - 1, 0)
+        tau = (times - t_e[ie])[:,np.newaxis]
+        a = a[ie]
+        out[:,ii] = a[:,0] + tau * (a[:,1] + tau * a[:,2])
+    return out
+
+
+def run_event_engine(physics, shot):
+    balls_on_table, ball_positions, r_c, V = shot
+    physics.reset(ball_positions=ball_positions, balls_on_table=balls_on_table)
+    t0 = time.perf_counter()
+    events = physics.strike_ball(0.0, 0, ball_positions[0], r_c, V, CUE_MASS)
+    t = time.perf_counter() - t0
+    return {'wall_time': t,
+            'count': len(events),
+            'rest_time': physics.balls_at_rest_time}
+
+
+def run_ode_engine(physics, shot, times):
+    balls_on_table, ball_positions, r_c, V = shot
+    physics.reset(ball_positions=ball_positions, balls_on_table=balls_on_table)
+    positions = np.empty((len(times), len(balls_on_table), 3), dtype=np.float64)
+    speeds = np.empty(len(times), dtype=np.float64)
+    t0 = time.perf_counter()
+    physics.strike_ball(0.0, 0, ball_positions[0], r_c, V, CUE_MASS)
+    t_last = 0.0
+    for k, t in enumerate(times):
+        physics.step(t - t_last)
+        t_last = t
+        physics.eval_positions(t, balls=balls_on_table, out=positions[k])
+        speeds[k] = np.linalg.norm(physics.eval_velocities(t, balls=balls_on_table), axis=-1).max()
+    t = time.perf_counter() - t0
+    moving = np.flatnonzero(speeds >= REST_SPEED)
+    return {'wall_time': t,
+            'count': physics.nsteps,
+            'rest_time': times[moving[-1]] if len(moving) else 0.0,
+            'positions': positions}
+
+
+def divergence(positions_a, positions_b):
+    """
+    :returns: the maximum, RMS and final distance between the corresponding balls of two trajectories
+    """
+    d = np.linalg.norm(positions_a - positions_b, axis=-1)
+    return d.max(), np.sqrt((d**2).mean()), d[-1].max()
+
+
+def main(dt=1.0/240, max_time=12.0):
+    table = PoolTable(ball_radius=PHYSICAL_PARAMETERS['ball_radius'])
+    physics = PoolPhysics(table=table, ball_collision_model='simple', **PHYSICAL_PARAMETERS)
+    ode_physics = ODEPoolPhysics(table=table, **PHYSICAL_PARAMETERS)
+    _logger.info('sampling every %.3f ms (for at most %.1f s)', 1e3*dt, max_time)
+    for name in SHOTS:
+        shot = setup_shot(name, physics)
+        results = run_event_engine(physics, shot)
+        duration = min(results['rest_time'] or max_time, max_time)
+        times = dt * np.arange(1, int(np.ceil(duration / dt)) + 1)
+        results['positions'] = sample_positions(physics, times, shot[0])
+        ode_results = run_ode_engine(ode_physics, shot, times)
+        _logger.info('''%s:
+    event-based: %6d events in %8.3f s (%9.1f events / s), at rest after %6.3f s
+    ODE:         %6d steps  in %8.3f s (%9.1f steps / s),  at rest after %6.3f s
+    position divergence: max. %.3g m, RMS %.3g m, final %.3g m''',
+                     name,
+                     results['count'], results['wall_time'], results['count'] / results['wall_time'],
+                     results['rest_time'] or float('inf'),
+                     ode_results['count'], ode_results['wall_time'], ode_results['count'] / ode_results['wall_time'],
+                     ode_results['rest_time'],
+                     *divergence(results['positions'], ode_results['positions']))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(format='%(asctime).19s [%(levelname)s]%(name)s.%(funcName)s:%(lineno)d: %(message)s',
+                        level=logging.INFO)
+    main(*[float(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,105 @@
+import time
+import threading
+
+from poolvr.asset_loader import AssetLoader
+
+
+class _Mesh(object):
+    def __init__(self, name, upload_time=0.0):
+        self.name = name
+        self.upload_time = upload_time
+        self.num_init_gl = 0
+    def init_gl(self):
+        time.sleep(self.upload_time)
+        self.num_init_gl += 1
+
+
+def test_out_of_order_completion():
+    loader = AssetLoader(max_workers=2)
+    release_0 = threading.Event()
+    ready = []
+    meshes = [_Mesh('0'), _Mesh('1')]
+    def build_0():
+        release_0.wait(5)
+        return meshes[0]
+    loader.submit_mesh(None, build=build_0, on_ready=ready.append)
+    future_1 = loader.submit_mesh(meshes[1], on_ready=ready.append)
+    future_1.result(5)
+    # the first load is still being prepared, the second is uploaded nonetheless:
+    assert loader.process_uploads() == 1
+    assert ready == [meshes[1]]
+    assert not loader.is_ready(meshes[0]) and loader.is_ready(meshes[1])
+    assert not loader.done
+    assert loader.process_uploads() == 0
+    release_0.set()
+    loader.wait()
+    assert ready == [meshes[1], meshes[0]]
+    assert loader.done
+    assert [mesh.num_init_gl for mesh in meshes] == [1, 1]
+    loader.shutdown()
+
+
+def test_upload_time_budget():
+    loader = AssetLoader(upload_time_budget=0.01)
+    meshes = [_Mesh(str(i), upload_time=0.006) for i in range(5)]
+    futures = [loader.submit_mesh(mesh) for mesh in meshes]
+    for future in futures:
+        future.result(5)
+    # each frame, uploads are performed until the budget is used up (so at least one, even if it exceeds it):
+    num_uploads = []
+    while not loader.done:
+        num_uploads.append(loader.process_uploads())
+    assert num_uploads == [2, 2, 1]
+    loader.submit_mesh(_Mesh('5', upload_time=0.02)).result(5)
+    assert loader.process_uploads() == 1
+    loader.shutdown()
+
+
+def test_upload_time_budget_meshes():
+    loader = AssetLoader(upload_time_budget=0.01)
+    meshes = [_Mesh(str(i), upload_time=0.006) for i in range(5)]
+    ready = []
+    loader.submit_meshes(lambda: meshes, on_ready=ready.append).result(5)
+    # the meshes of a group are uploaded separately, over several frames:
+    num_uploads = []
+    while not loader.done:
+        num_uploads.append(loader.process_uploads())
+        if len(num_uploads) == 1:
+            assert [loader.is_ready(mesh) for mesh in meshes] == [True, True, False, False, False]
+            assert not ready
+    assert num_uploads == [2, 2, 1]
+    assert ready == [meshes]
+    assert [mesh.num_init_gl for mesh in meshes] == [1] * 5
+    loader.shutdown()
+
+
+def test_failed_load(caplog):
+    loader = AssetLoader()
+    ready = []
+    def build():
+        raise IOError('no such mesh')
+    loader.submit_mesh(None, build=build, on_ready=ready.append)
+    mesh = _Mesh('1')
+    loader.submit_mesh(mesh, on_ready=ready.append)
+    # the failed load is logged and dropped:
+    loader.wait()
+    assert loader.done
+    assert ready == [mesh]
+    assert 'no such mesh' in caplog.text
+    loader.shutdown()
+
+
+def test_wait():
+    loader = AssetLoader(max_workers=4, upload_time_budget=0.0)
+    ready = []
+    def build(i):
+        time.sleep(0.001 * (8 - i))
+        return [_Mesh('%d.%d' % (i, j)) for j in range(2)]
+    for i in range(8):
+        loader.submit_meshes(lambda i=i: build(i), on_ready=ready.append)
+    loader.wait()
+    assert loader.done
+    assert sorted(meshes[0].name for meshes in ready) == ['%d.0' % i for i in range(8)]
+    assert all(loader.is_ready(mesh) and mesh.num_init_gl == 1
+               for meshes in ready for mesh in meshes)
+    loader.shutdown()
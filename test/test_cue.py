@@ -0,0 +1,49 @@
+import numpy as np
+
+
+from poolvr.cue import PoolCue
+
+
+def test_swept_contacts():
+    cue = PoolCue()
+    ball_radius = 0.02625
+    positions = np.array([[0.0, 0.0, 0.0],
+                          [0.3, 0.0, 0.0]])
+    # the cue tip passes through the first ball within one step (which per-frame sampling would miss):
+    cue.last_world_matrix[3,:3] = [0, -0.5*cue.length - 0.2, 0]
+    cue.world_matrix[3,:3] = [0, -0.5*cue.length + 0.2 + 2*ball_radius, 0]
+    assert not any(cue.contact(position, ball_radius) is not None
+                   for _, position in cue.aabb_check(positions, ball_radius))
+    contacts = cue.swept_contacts(positions, positions, ball_radius)
+    assert len(contacts) == 1
+    i, s, r_c = contacts[0]
+    assert i == 0
+    assert abs(s - (0.2 - ball_radius) / (0.4 + 2*ball_radius)) < 1e-4
+    assert np.allclose(r_c, [0, -ball_radius, 0], atol=1e-4)
+    # contact on the side of the cue, with the ball moving towards it:
+    cue.last_world_matrix[3,:3] = [0.5, 0, 0]
+    cue.world_matrix[3,:3] = [0.4, 0, 0]
+    contacts = cue.swept_contacts(positions, positions + [[0, 0, 0], [0.1, 0, 0]], ball_radius)
+    assert [i for i, _, _ in contacts] == [1]
+    i, s, r_c = contacts[0]
+    assert abs(s - (0.2 - cue.radius - ball_radius) / 0.2) < 1e-4
+    assert abs(np.linalg.norm(r_c - (positions[1] + [s * 0.1, 0, 0])) - ball_radius) < 1e-6
+
+
+def test_swept_contacts_grazing():
+    cue = PoolCue()
+    ball_radius = 0.02625
+    r = cue.radius + ball_radius
+    # paths almost parallel to the side of the (stationary) cue, on which sphere tracing makes almost no progress:
+    # the first ball slides into the cue, the second passes just clear of it
+    positions0 = np.array([[r + 1e-4, -0.4, 0.0],
+                           [-(r + 2e-5), -0.4, 0.0]])
+    positions1 = np.array([[r - 1e-4, 0.4, 0.0],
+                           [-(r + 2e-5), 0.4, 0.0]])
+    contacts = cue.swept_contacts(positions0, positions1, ball_radius)
+    assert len(contacts) == 1
+    i, s, r_c = contacts[0]
+    assert i == 0
+    s_c = (1e-4 - cue.SWEEP_TOLERANCE) / 2e-4
+    assert abs(s - s_c) < 1e-4
+    assert np.allclose(r_c, [cue.radius + cue.SWEEP_TOLERANCE, -0.4 + 0.8 * s_c, 0.0], atol=1e-5)
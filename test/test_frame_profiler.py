@@ -0,0 +1,52 @@
+import csv
+import numpy as np
+
+
+VS_SRC = """#version 120
+attribute vec3 a_position;
+uniform mat4 u_modelview;
+uniform mat4 u_projection;
+void main(void) {
+  gl_Position = u_projection * u_modelview * vec4(a_position, 1.0);
+}
+"""
+FS_SRC = """#version 120
+uniform vec4 u_color;
+void main(void) {
+  gl_FragColor = u_color;
+}
+"""
+
+def test_frame_profiler(gl_context, tmp_path):
+    import OpenGL.GL as gl
+    from poolvr.frame_profiler import FrameProfiler
+    from poolvr.gl_rendering import Program, Technique, Material, Mesh
+    from poolvr.gl_primitives import PlanePrimitive
+    technique = Technique(Program(VS_SRC, FS_SRC), name='flat')
+    plane = PlanePrimitive()
+    plane.attributes['a_position'] = plane.attributes['vertices']
+    # in front of the camera (so that it is not culled):
+    matrix = np.eye(4, dtype=np.float32)
+    matrix[3,2] = -1.0
+    mesh = Mesh({Material(technique, values={'u_color': [1.0, 0.0, 0.0, 1.0]}): [plane]}, matrix=matrix)
+    mesh.init_gl()
+    csv_file = str(tmp_path / 'frames.csv')
+    profiler = FrameProfiler(csv_file=csv_file)
+    gl_context.render_queue.gpu_timer = profiler.gpu_timer
+    try:
+        for _ in range(3):
+            with gl_context.render(meshes=[mesh]):
+                pass
+            profiler.end_frame({'frame': 0.011, 'render': 0.004})
+        gl.glFinish()
+        profiler.end_frame({})
+    finally:
+        gl_context.render_queue.gpu_timer = None
+        profiler.close()
+    assert profiler.gpu_times['flat'].count == 3
+    assert abs(profiler.cpu_times['frame'].percentiles((50,))[0] - 0.011) < 1e-9
+    with open(csv_file) as f:
+        rows = list(csv.DictReader(f))
+    assert len([row for row in rows if row['source'] == 'gpu']) == 3
+    assert len([row for row in rows if row['source'] == 'cpu']) == 6
+    assert 'flat' in profiler.format()
@@ -0,0 +1,29 @@
+from poolvr.frame_scheduler import FrameScheduler, FrameTimeHistogram
+
+
+def test_frame_scheduler():
+    t = 0.0
+    scheduler = FrameScheduler(tick=0.25, frame_time_budget=0.5, max_ticks_per_frame=4,
+                               clock=lambda: t)
+    num_ticks = []
+    for frame_time in (0.0, 0.375, 0.375, 2.0, 0.375):
+        t += frame_time
+        scheduler.begin_frame()
+        with scheduler.phase('physics'):
+            num_ticks.append(len(list(scheduler.ticks())))
+        scheduler.end_frame()
+    assert num_ticks == [0, 1, 2, 4, 1]
+    assert scheduler.dropped_time == 1.0
+    assert scheduler.alpha == 0.5
+    assert scheduler.num_over_budget == 1
+    assert scheduler.histogram.count == 4
+
+
+def test_frame_time_histogram():
+    histogram = FrameTimeHistogram(bin_width=0.001, num_bins=50)
+    for dt in [0.0105] * 90 + [0.0165] * 9 + [0.2]:
+        histogram.add(dt)
+    assert abs(histogram.percentile(50) - 0.011) < 1e-9
+    assert abs(histogram.percentile(95) - 0.017) < 1e-9
+    assert histogram.percentile(100) == 0.2
+    assert len(histogram.format().splitlines()) == 4
@@ -0,0 +1,119 @@
+import numpy as np
+
+
+def _sphere_reference(radius, widthSegments, heightSegments, thetaStart, thetaLength,
+                      phiStart=0.0, phiLength=2*np.pi):
+    # the (three.js) loops which sphere_geometry vectorizes:
+    thetaEnd = thetaStart + thetaLength
+    positions, uvs, rows, indices = [], [], [], []
+    for iy in range(heightSegments+1):
+        v = iy / heightSegments
+        rows.append([])
+        for ix in range(widthSegments+1):
+            u = ix / widthSegments
+            positions.append([-radius * np.cos(phiStart + u * phiLength) * np.sin(thetaStart + v * thetaLength),
+                              radius * np.cos(thetaStart + v * thetaLength),
+                              radius * np.sin(phiStart + u * phiLength) * np.sin(thetaStart + v * thetaLength)])
+            uvs.append([u, 1-v])
+            rows[-1].append(len(positions) - 1)
+    for iy in range(heightSegments):
+        for ix in range(widthSegments):
+            v1, v2, v3, v4 = rows[iy][ix+1], rows[iy][ix], rows[iy+1][ix], rows[iy+1][ix+1]
+            if iy != 0 or thetaStart > 0:
+                indices.append([v1, v2, v4])
+            if iy != heightSegments - 1 or thetaEnd < np.pi:
+                indices.append([v2, v3, v4])
+    return np.array(indices).ravel(), np.array(positions), np.array(uvs)
+
+
+def test_sphere_geometry():
+    from poolvr.gl_primitives import sphere_geometry
+    for radius, widthSegments, heightSegments, thetaStart, thetaLength in [(0.5, 16, 12, 0.0, np.pi),
+                                                                           (0.03, 7, 4, np.pi/3, np.pi/3)]:
+        geometry = sphere_geometry(radius, widthSegments, heightSegments,
+                                   thetaStart=thetaStart, thetaLength=thetaLength)
+        indices, positions, uvs = _sphere_reference(radius, widthSegments, heightSegments, thetaStart, thetaLength)
+        assert geometry['indices'].dtype == np.uint16 and (geometry['indices'] == indices).all()
+        assert geometry['vertices'].dtype == np.float32 and np.allclose(geometry['vertices'], positions, atol=1e-7)
+        assert np.allclose(geometry['uvs'], uvs)
+
+
+def test_cylinder_geometry():
+    from poolvr.gl_primitives import cylinder_geometry
+    geometry = cylinder_geometry(radius=0.25, height=2.0, num_radial=8, center=(0.0, -1.0, 0.0))
+    vertices, normals, indices = geometry['vertices'], geometry['normals'], geometry['indices']
+    assert vertices.shape == normals.shape == (18, 3)
+    assert np.allclose(np.linalg.norm(vertices[:-2,::2], axis=-1), 0.25)
+    assert np.allclose(vertices[:-2:2,1], -2.0) and np.allclose(vertices[1:-2:2,1], 0.0)
+    # 2 side triangles and 2 cap triangles for each radial segment, all of them non-degenerate:
+    triangles = vertices[indices.reshape(-1, 3)]
+    assert len(triangles) == 4 * 8
+    assert (np.linalg.norm(np.cross(triangles[:,1] - triangles[:,0], triangles[:,2] - triangles[:,0]), axis=-1) > 0).all()
+
+
+def test_geometry_cache():
+    from poolvr.gl_primitives import ArrowMesh, SpherePrimitive
+    arrows = [ArrowMesh(head_radius=0.01, head_length=0.02, tail_radius=0.004, tail_length=0.05)
+              for _ in range(2)]
+    head_0, tail_0 = arrows[0].primitives[None]
+    head_1, tail_1 = arrows[1].primitives[None]
+    assert head_0.attributes['vertices'] is head_1.attributes['vertices']
+    assert tail_0.indices is tail_1.indices
+    assert not tail_0.attributes['vertices'].flags.writeable
+    assert np.allclose(tail_0.attributes['vertices'][:,1].max(), 0.0)
+    assert SpherePrimitive(radius=0.25).attributes['vertices'] is not SpherePrimitive(radius=0.5).attributes['vertices']
+
+
+def test_geometry_buffers(gl_context):
+    from poolvr.gl_primitives import SpherePrimitive, CirclePrimitive
+    spheres = [SpherePrimitive(radius=0.125) for _ in range(3)]
+    circle = CirclePrimitive(radius=0.125, num_radial=16)
+    circle.attributes['a_translate'] = np.zeros((4, 3), dtype=np.float32)
+    circle.alias('vertices', 'a_position')
+    for prim in spheres + [circle]:
+        prim.init_gl()
+    assert all(prim.buffers == spheres[0].buffers for prim in spheres[1:])
+    assert all(prim.index_buffer == spheres[0].index_buffer for prim in spheres[1:])
+    assert circle.buffers['a_position'] == circle.buffers['vertices']
+    assert circle.buffers['a_translate'] not in spheres[0].buffers.values()
+    # re-initializing replaces the shared buffers:
+    spheres[2].init_gl(force=True)
+    assert spheres[2].buffers['vertices'] != spheres[0].buffers['vertices']
+    sphere = SpherePrimitive(radius=0.125)
+    sphere.init_gl()
+    assert sphere.buffers == spheres[2].buffers
+
+
+def test_arrow_geometry():
+    from poolvr.gl_primitives import arrow_geometry, ArrowMesh
+    geometry = arrow_geometry(head_radius=0.01, tail_radius=0.004, head_length=0.02, tail_length=0.05, num_radial=6)
+    head, tail = ArrowMesh(head_radius=0.01, tail_radius=0.004, head_length=0.02, tail_length=0.05,
+                           num_radial=6).primitives[None]
+    assert np.allclose(geometry['vertices'], np.concatenate([head.attributes['vertices'], tail.attributes['vertices']]))
+    # the head's triangle fan as triangles, followed by the tail's triangles:
+    fan = head.indices
+    assert (geometry['indices'][:18].reshape(-1, 3) == [[fan[0], fan[k], fan[k+1]] for k in range(1, 7)]).all()
+    assert (geometry['indices'][18:] == tail.indices + len(head.attributes['vertices'])).all()
+
+
+def test_projected_mesh():
+    from poolvr.gl_primitives import ProjectedMesh, CylinderPrimitive
+    from poolvr.gl_rendering import Mesh, Material
+    from poolvr.gl_techniques import EGA_TECHNIQUE
+    caster = Mesh({Material(EGA_TECHNIQUE): [CylinderPrimitive(radius=0.01, height=1.0)]})
+    shadow = ProjectedMesh(caster, c=0.5)
+    assert shadow.primitives[shadow.material] == caster.primitives[list(caster.primitives)[0]]
+    # the shadow follows the caster without any updates:
+    caster.matrix[3,:3] = [0.25, 1.0, -0.5]
+    caster.update_world_matrices()
+    shadow.update_world_matrices()
+    assert shadow.world_matrix is caster.world_matrix
+    assert np.allclose(shadow.world_matrix[3,:3], [0.25, 1.0, -0.5])
+    assert np.allclose(shadow.material.values['u_shadow_plane'], [0.0, 1.0, 0.0, -0.5])
+    shadow.update(c=0.75)
+    assert np.allclose(shadow.material.values['u_shadow_plane'], [0.0, 1.0, 0.0, -0.75])
+    world_matrices = np.array([np.eye(4)], dtype=np.float32)
+    caster.bind_world_matrix(world_matrices[0])
+    shadow.bind_world_matrix(world_matrices[0])
+    world_matrices[0,3,:3] = [1.0, 2.0, 3.0]
+    assert np.allclose(shadow.world_position, [1.0, 2.0, 3.0])
@@ -83,3 +83,170 @@ def test_arrow_mesh(render_meshes):
         prim.attributes['a_position'] = prim.attributes['vertices']
     mesh.world_matrix[3,2] = -3
     render_meshes.append(mesh)
+
+
+def test_streaming_buffer(gl_context):
+    import numpy as np
+    import OpenGL.GL as gl
+    from poolvr.gl_rendering import StreamingBuffer
+    data = np.arange(3*64, dtype=np.float32).reshape(64, 3)
+    for persistent in (True, False):
+        stream = StreamingBuffer(data.nbytes, persistent=persistent)
+        stream.init_gl()
+        for i in range(2*stream.num_segments):
+            data[0,0] = i
+            stream.update(data)
+            gl.glBindBuffer(gl.GL_ARRAY_BUFFER, stream.buffer_id)
+            gl.glFinish()
+            readback = gl.glGetBufferSubData(gl.GL_ARRAY_BUFFER, stream.offset, data.nbytes)
+            gl.glBindBuffer(gl.GL_ARRAY_BUFFER, 0)
+            assert (np.frombuffer(readback, dtype=np.float32).reshape(data.shape) == data).all()
+            if not stream.is_mapped:
+                assert stream.offset == 0
+        stream.release()
+
+
+def test_std140_dtype():
+    from poolvr.gl_rendering import std140_dtype, FrameUniformBuffer
+    dtype = std140_dtype(FrameUniformBuffer.FIELDS)
+    assert [dtype.fields[name][1] for name, *_ in FrameUniformBuffer.FIELDS] == [0, 64, 128, 192, 208, 216, 220,
+                                                                              224, 240, 368]
+    assert dtype.itemsize == 496
+    import OpenGL.GL as gl
+    dtype = std140_dtype([('a', gl.GL_FLOAT), ('b', gl.GL_FLOAT_VEC3), ('c', gl.GL_FLOAT), ('d', gl.GL_FLOAT_VEC2)])
+    assert [dtype.fields[name][1] for name in 'abcd'] == [0, 16, 28, 32]
+    assert dtype.itemsize == 48
+
+
+def test_frustum_culling():
+    import numpy as np
+    from poolvr.gl_rendering import calc_projection_matrix, calc_frustum_planes, bounds_in_frustum, transform_bounds
+    view = np.eye(4, dtype=np.float32)
+    view[3,:3] = [0.0, -1.0, 0.0]
+    projection = calc_projection_matrix(np.pi/3, 1.0, 0.1, 100.0).T
+    planes = calc_frustum_planes(view, projection)
+    box = np.array([[-0.5, -0.5, -0.5], [0.5, 0.5, 0.5]], dtype=np.float32)
+    positions = np.array([[0.0, 1.0, -5.0],      # in front of the camera
+                          [0.0, 1.0, 5.0],       # behind it
+                          [10.0, 1.0, -5.0],     # to the right
+                          [0.0, 1.0, -200.0],    # beyond the far plane
+                          [0.0, 1.0, 0.0],       # containing the camera
+                          [0.0, 4.0, -5.0]])     # partly above the top plane
+    matrices = np.array(len(positions) * [np.eye(4)], dtype=np.float32)
+    matrices[:,3,:3] = positions
+    assert (bounds_in_frustum(transform_bounds(box, matrices), planes) == [True, False, False, False, True, True]).all()
+    # a rotated box:
+    rotation = np.eye(4, dtype=np.float32)
+    rotation[:2,:2] = [[np.cos(np.pi/4), np.sin(np.pi/4)],
+                       [-np.sin(np.pi/4), np.cos(np.pi/4)]]
+    assert np.allclose(transform_bounds(box, rotation), [[-np.sqrt(0.5), -np.sqrt(0.5), -0.5],
+                                                         [np.sqrt(0.5), np.sqrt(0.5), 0.5]])
+
+
+def test_render_queue_culling(gl_context):
+    import numpy as np
+    from poolvr.gl_rendering import Program, Technique
+    from poolvr.gl_primitives import SpherePrimitive
+    vs_src = """#version 120
+attribute vec3 a_position;
+uniform mat4 u_modelview;
+uniform mat4 u_projection;
+void main(void) {
+  gl_Position = u_projection * u_modelview * vec4(a_position, 1.0);
+}
+"""
+    fs_src = """#version 120
+void main(void) {
+  gl_FragColor = vec4(1.0);
+}
+"""
+    material = Material(Technique(Program(vs_src, fs_src)))
+    sphere = SpherePrimitive(radius=0.25)
+    sphere.alias('vertices', 'a_position')
+    meshes = []
+    for z in (-2.0, 2.0):
+        mesh = Mesh({material: [sphere]})
+        mesh.matrix[3,2] = z
+        mesh.update_world_matrices()
+        mesh.init_gl()
+        meshes.append(mesh)
+    assert np.allclose(meshes[1].world_bounds, [[-0.25, -0.25, 1.75], [0.25, 0.25, 2.25]], atol=1e-6)
+    with gl_context.render(meshes=meshes):
+        pass
+    assert gl_context.frame_stats['draw_calls'] == 1 and gl_context.frame_stats['culled_items'] == 1
+    # the bounds follow the world transformation, however it is updated:
+    meshes[1].world_matrix[3,2] = -3.0
+    with gl_context.render(meshes=meshes):
+        pass
+    assert gl_context.frame_stats['draw_calls'] == 2 and gl_context.frame_stats['culled_items'] == 0
+    meshes[0].cullable = False
+    meshes[0].world_matrix[3,2] = 3.0
+    with gl_context.render(meshes=meshes):
+        pass
+    assert gl_context.frame_stats['draw_calls'] == 2
+
+
+def test_render_queue_order():
+    from poolvr.gl_rendering import Program, Technique, RenderQueue
+    from poolvr.gl_primitives import PlanePrimitive
+    vs_src = """#version 120
+attribute vec3 a_position;
+uniform mat4 u_modelview;
+void main(void) {
+  gl_Position = u_modelview * vec4(a_position, 1.0);
+}
+"""
+    fs_src = """#version 120
+uniform vec4 u_color;
+void main(void) {
+  gl_FragColor = u_color;
+}
+"""
+    techniques = [Technique(Program(vs_src, fs_src)) for _ in range(2)]
+    materials = [Material(techniques[i % 2]) for i in range(4)]
+    prim = PlanePrimitive()
+    meshes = [Mesh({material: [prim]}) for material in materials]
+    render_queue = RenderQueue()
+    for order in ([1, 0, 3, 2], [2, 3, 0, 1]):
+        render_queue.submit([meshes[i] for i in order])
+        items = render_queue._segments[0]
+        # grouped by technique, each in the order in which it was first submitted:
+        expected = [i for i in order if i % 2 == order[0] % 2] + [i for i in order if i % 2 != order[0] % 2]
+        assert [item[2] for item in items] == [materials[i] for i in expected]
+
+
+def test_gltf_primitive_culling():
+    import numpy as np
+    from poolvr.gl_rendering import (Program, Technique, RenderQueue,
+                                     calc_projection_matrix, calc_frustum_planes)
+    from poolvr.gltf_utils import setup_meshes
+    vs_src = """#version 120
+attribute vec3 a_position;
+uniform mat4 u_modelview;
+void main(void) {
+  gl_Position = u_modelview * vec4(a_position, 1.0);
+}
+"""
+    fs_src = """#version 120
+void main(void) {
+  gl_FragColor = vec4(1.0);
+}
+"""
+    gltf = {'accessors': [{'bufferView': 0, 'componentType': 5123, 'count': 3, 'type': 'SCALAR'},
+                          {'bufferView': 1, 'componentType': 5126, 'count': 3, 'type': 'VEC3',
+                           'min': [-0.5, -0.5, 0.0], 'max': [0.5, 0.5, 0.0]}],
+            'bufferViews': [{'buffer': 0, 'byteLength': 6}, {'buffer': 0, 'byteOffset': 8, 'byteLength': 36}],
+            'meshes': [{'primitives': [{'indices': 0, 'attributes': {'POSITION': 1}, 'material': 0}]}]}
+    materials = [Material(Technique(Program(vs_src, fs_src)))]
+    # the meshes are built without any GL calls, given the ids of their (already created) buffers:
+    mesh = setup_meshes(gltf, None, {0: 1, 1: 2}, materials)[0]
+    prim, = mesh.primitives[materials[0]]
+    assert np.allclose(prim.bounds, [[-0.5, -0.5, 0.0], [0.5, 0.5, 0.0]])
+    planes = calc_frustum_planes(np.eye(4, dtype=np.float32),
+                                 calc_projection_matrix(np.pi/3, 1.0, 0.1, 100.0).T)
+    render_queue = RenderQueue()
+    for z, num_visible in ((-2.0, 1), (2.0, 0)):
+        mesh.matrix[3,2] = z
+        mesh.update_world_matrices()
+        render_queue.submit([mesh])
+        assert len(render_queue._cull(0, [planes])) == num_visible
@@ -0,0 +1,95 @@
+import os.path
+import json
+import struct
+import numpy as np
+import pytest
+
+
+from poolvr.gltf_utils import (load_gltf, read_buffers, buffer_view_data,
+                               GLB_MAGIC, GLB_CHUNK_JSON, GLB_CHUNK_BIN)
+
+
+def _write_glb(filename, gltf, bin_data, version=1):
+    json_chunk = json.dumps(gltf).encode()
+    json_chunk += b' ' * (-len(json_chunk) % 4)
+    bin_chunk = bin_data + b'\0' * (-len(bin_data) % 4)
+    with open(filename, 'wb') as f:
+        if version == 1:
+            # KHR_binary_glTF: the binary body follows the (JSON) content
+            f.write(GLB_MAGIC + struct.pack('<II', 1, 20 + len(json_chunk) + len(bin_chunk)))
+            f.write(struct.pack('<II', len(json_chunk), 0) + json_chunk + bin_chunk)
+        else:
+            f.write(GLB_MAGIC + struct.pack('<II', 2, 12 + 8 + len(json_chunk) + 8 + len(bin_chunk)))
+            f.write(struct.pack('<II', len(json_chunk), GLB_CHUNK_JSON) + json_chunk)
+            f.write(struct.pack('<II', len(bin_chunk), GLB_CHUNK_BIN) + bin_chunk)
+
+
+def _buffer_data():
+    vertices = np.arange(24, dtype=np.float32)
+    indices = np.arange(6, dtype=np.uint16)
+    return indices, vertices, indices.tobytes() + b'\0' * 4 + vertices.tobytes()
+
+
+def _buffer_views(buffer_name, indices, vertices):
+    return {'indices': {'buffer': buffer_name, 'byteOffset': 0, 'byteLength': indices.nbytes,
+                        'target': 34963},
+            'vertices': {'buffer': buffer_name, 'byteOffset': 16, 'byteLength': vertices.nbytes,
+                         'target': 34962}}
+
+
+def test_gltf_buffers(tmp_path):
+    indices, vertices, bin_data = _buffer_data()
+    with open(os.path.join(str(tmp_path), 'data.bin'), 'wb') as f:
+        f.write(bin_data)
+    gltf_filename = os.path.join(str(tmp_path), 'model.gltf')
+    with open(gltf_filename, 'w') as f:
+        json.dump({'buffers': {'data': {'uri': 'data.bin', 'byteLength': len(bin_data)}},
+                   'bufferViews': _buffer_views('data', indices, vertices)}, f)
+    glb_filename = os.path.join(str(tmp_path), 'model.glb')
+    _write_glb(glb_filename, {'buffers': {'binary_glTF': {'uri': 'data:,', 'byteLength': len(bin_data)}},
+                              'bufferViews': _buffer_views('binary_glTF', indices, vertices),
+                              'extensionsUsed': ['KHR_binary_glTF']}, bin_data)
+    for filename, buffer_name in ((gltf_filename, 'data'), (glb_filename, 'binary_glTF')):
+        gltf, uri_path = load_gltf(filename)
+        data_buffers = read_buffers(gltf, uri_path)
+        index_data = buffer_view_data(gltf['bufferViews']['indices'], data_buffers[buffer_name])
+        vertex_data = buffer_view_data(gltf['bufferViews']['vertices'], data_buffers[buffer_name])
+        assert isinstance(index_data.base, np.memmap) or isinstance(index_data, np.memmap)
+        assert index_data.nbytes == indices.nbytes and vertex_data.nbytes == vertices.nbytes
+        assert (index_data.view(np.uint16) == indices).all()
+        assert (vertex_data.view(np.float32) == vertices).all()
+
+
+def test_gltf_2_rejected(tmp_path):
+    indices, vertices, bin_data = _buffer_data()
+    glb_filename = os.path.join(str(tmp_path), 'model.glb')
+    _write_glb(glb_filename, {'asset': {'version': '2.0'},
+                              'buffers': [{'byteLength': len(bin_data)}],
+                              'bufferViews': [{'buffer': 0, 'byteLength': indices.nbytes}]},
+               bin_data, version=2)
+    with pytest.raises(Exception, match='only glTF 1.0 is supported'):
+        load_gltf(glb_filename)
+
+
+def test_setup_buffers_glb(tmp_path, gl_context):
+    import OpenGL.GL as gl
+    from poolvr.gltf_utils import setup_buffers
+    indices, vertices, bin_data = _buffer_data()
+    glb_filename = os.path.join(str(tmp_path), 'model.glb')
+    buffer_views = _buffer_views('binary_glTF', indices, vertices)
+    # the target of a buffer view is optional:
+    del buffer_views['vertices']['target']
+    _write_glb(glb_filename, {'buffers': {'binary_glTF': {'uri': 'data:,', 'byteLength': len(bin_data)}},
+                              'bufferViews': buffer_views,
+                              'extensionsUsed': ['KHR_binary_glTF']}, bin_data)
+    gltf, uri_path = load_gltf(glb_filename)
+    buffer_ids = setup_buffers(gltf, uri_path)
+    assert sorted(buffer_ids.keys()) == ['indices', 'vertices']
+    for name, values in (('indices', indices), ('vertices', vertices)):
+        target = gltf['bufferViews'][name].get('target', gl.GL_ARRAY_BUFFER)
+        gl.glBindBuffer(target, buffer_ids[name])
+        assert gl.glGetBufferParameteriv(target, gl.GL_BUFFER_SIZE) == values.nbytes
+        data = np.frombuffer(gl.glGetBufferSubData(target, 0, values.nbytes), dtype=values.dtype)
+        gl.glBindBuffer(target, 0)
+        assert (data == values).all()
+    gl.glDeleteBuffers(len(buffer_ids), list(buffer_ids.values()))
@@ -0,0 +1,29 @@
+import numpy as np
+
+
+from poolvr.glyphs import BallGlyphs
+
+
+def test_glyph_transforms():
+    R = 0.03
+    glyphs = BallGlyphs(num_balls=4, ball_radius=R)
+    balls = np.array([0, 2, 3])
+    positions = np.array([[0.0, 0.8, 0.0], [0.5, 0.8, 0.5], [-0.5, 0.8, 0.5]])
+    velocities = np.array([[0.0, 0.0, -2.0], [0.3, 0.0, 0.4], [0.0, 0.0, 0.0]])
+    # ball 2 is rolling (no slip), ball 0 is sliding, ball 3 only spins:
+    angular_velocities = np.array([[0.0, 0.0, 0.0], [0.4 / R, 0.0, -0.3 / R], [0.0, 5.0, 0.0]])
+    shown = glyphs.update(positions, velocities, angular_velocities, balls=balls)
+    V, W, S = BallGlyphs.VELOCITY, BallGlyphs.ANGULAR_VELOCITY, BallGlyphs.SLIP_VELOCITY
+    assert (shown[V] == [True, False, True, False]).all()
+    assert (shown[W] == [False, False, True, True]).all()
+    assert (shown[S] == [True, False, False, False]).all()
+    assert np.allclose(glyphs.directions[V,0], [0.0, 0.0, -1.0])
+    assert np.allclose(glyphs.directions[V,2], [0.6, 0.0, 0.8])
+    assert np.allclose(glyphs.directions[W,3], [0.0, 1.0, 0.0])
+    assert np.allclose(glyphs.directions[S,0], [0.0, 0.0, -1.0])
+    assert np.allclose(glyphs.translates[V,2], positions[1] + 2*R*np.array([0.6, 0.0, 0.8]))
+    assert np.allclose(glyphs.translates[W,3], positions[2] + [0.0, 2*R, 0.0])
+    # hidden glyphs have no direction:
+    assert (glyphs.directions[:,1] == 0).all() and (glyphs.directions[S,2:] == 0).all()
+    glyphs.update(positions, np.zeros((3, 3)), np.zeros((3, 3)), balls=balls)
+    assert (glyphs.directions == 0).all()
@@ -0,0 +1,29 @@
+import io
+import sys
+
+
+from poolvr.import_profile import ImportProfiler
+
+
+def test_import_profile(tmp_path, monkeypatch):
+    package = tmp_path / 'profiled_pkg'
+    package.mkdir()
+    (package / '__init__.py').write_text('from . import child\n')
+    (package / 'child.py').write_text('import time\ntime.sleep(0.01)\n')
+    monkeypatch.syspath_prepend(str(tmp_path))
+    try:
+        with ImportProfiler() as profiler:
+            import profiled_pkg
+        records = {name: (depth, self_time, cumulative)
+                   for depth, name, self_time, cumulative in profiler.records}
+        assert records['profiled_pkg.child'][0] == records['profiled_pkg'][0] + 1
+        assert records['profiled_pkg.child'][2] >= 0.01
+        assert records['profiled_pkg'][2] >= records['profiled_pkg.child'][2]
+        assert records['profiled_pkg'][1] < records['profiled_pkg.child'][2]
+        f = io.StringIO()
+        profiler.write(f)
+        assert f.getvalue().startswith('import time: self [us] | cumulative | imported package')
+        assert '  profiled_pkg.child' in f.getvalue()
+    finally:
+        sys.modules.pop('profiled_pkg.child', None)
+        sys.modules.pop('profiled_pkg', None)
@@ -0,0 +1,37 @@
+import os
+
+
+VS_SRC = """#version 120
+attribute vec3 a_position;
+uniform mat4 u_modelview;
+void main(void) {
+  gl_Position = u_modelview * vec4(a_position, 1.0);
+}
+"""
+FS_SRC = """#version 120
+uniform vec4 u_color;
+void main(void) {
+  gl_FragColor = u_color;
+}
+"""
+
+
+def test_program_cache(gl_context, tmp_path, monkeypatch):
+    import OpenGL.GL as gl
+    from poolvr import program_cache
+    from poolvr.gl_rendering import Program
+    if not program_cache.is_supported():
+        return
+    monkeypatch.setenv('POOLVR_CACHE_DIR', str(tmp_path))
+    program = Program(VS_SRC, FS_SRC)
+    program.init_gl()
+    key = program_cache.program_cache_key(VS_SRC, FS_SRC)
+    assert os.path.exists(os.path.join(program_cache.get_cache_dir(), key + '.bin'))
+    cached_program = Program(VS_SRC, FS_SRC)
+    program_id = gl.glCreateProgram()
+    assert program_cache.load_program_binary(program_id, key)
+    gl.glDeleteProgram(program_id)
+    cached_program.init_gl()
+    assert gl.glGetUniformLocation(cached_program.program_id, 'u_color') >= 0
+    # a different source must not hit the cache:
+    assert program_cache.program_cache_key(VS_SRC, FS_SRC.replace('u_color', 'u_colour')) != key
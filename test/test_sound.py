@@ -0,0 +1,147 @@
+import os.path
+import wave
+import numpy as np
+
+
+from poolvr.sound import Mixer, NullOutput, WaveFileOutput
+
+
+def _click(n=100):
+    return np.linspace(1.0, 0.0, n, dtype=np.float32)
+
+
+def test_mixer_overlapping_voices():
+    mixer = Mixer(num_voices=4, channels=2)
+    sample = mixer.add_sample(_click())
+    output = NullOutput(mixer, blocksize=32)
+    mixer.play(sample, gain=0.5)
+    first = output.render(50)
+    mixer.play(sample, gain=0.25, pan=1.0)
+    second = output.render(150)
+    assert mixer.num_active_voices == 0
+    # centered: equal power in both channels
+    assert np.allclose(first[:,0], first[:,1])
+    assert np.allclose(first[:,0], 0.5 * np.cos(np.pi/4) * _click()[:50])
+    # the first sound continues under the second (panned fully right):
+    expected = np.zeros((150, 2), dtype=np.float32)
+    expected[:50] = 0.5 * np.cos(np.pi/4) * _click()[50:,np.newaxis]
+    expected[:100,1] += 0.25 * _click()
+    assert np.allclose(second, expected, atol=1e-6)
+
+
+def test_mixer_voice_stealing():
+    mixer = Mixer(num_voices=2, channels=1)
+    sample = mixer.add_sample(np.ones((1000, 2), dtype=np.float32))
+    output = NullOutput(mixer)
+    for gain in (0.1, 0.2):
+        mixer.play(sample, gain=gain)
+        output.render(10)
+    mixer.play(sample, gain=0.4)
+    out = output.render(10)
+    assert mixer.num_active_voices == 2 and mixer.num_stolen == 1
+    # the oldest voice was replaced:
+    assert np.allclose(out, 0.6)
+
+
+def test_wave_file_output(tmpdir):
+    mixer = Mixer(channels=2, samplerate=22050)
+    sample = mixer.add_sample(_click())
+    filename = os.path.join(str(tmpdir), 'mix.wav')
+    output = WaveFileOutput(mixer, filename)
+    mixer.play(sample, gain=1.0, pan=-1.0)
+    output.render(1000)
+    output.close()
+    with wave.open(filename, 'rb') as f:
+        assert (f.getnchannels(), f.getframerate(), f.getnframes()) == (2, 22050, 1000)
+        frames = np.frombuffer(f.readframes(1000), dtype='<i2').reshape(-1, 2)
+    assert (frames[:,1] == 0).all()
+    assert np.abs(frames[:100,0] / 32767 - _click()).max() < 1e-4
+
+
+def test_mixer_start_frames():
+    mixer = Mixer(num_voices=4, channels=1)
+    sample = mixer.add_sample(_click(10))
+    output = NullOutput(mixer, blocksize=16)
+    output.render(16)
+    # both sounds are started by the next block, at their exact frames (the second one continuing into the following block),
+    # the one whose start frame has passed at the beginning of the block:
+    mixer.play_many([(sample, 0.5, 0.0, 16 + 5), (sample, 0.5, 0.0, 16 + 12)])
+    mixer.play(sample, gain=0.25, start_frame=3)
+    out = output.render(32)[:,0]
+    expected = np.zeros(32, dtype=np.float32)
+    expected[:10] += 0.25 * _click(10)
+    expected[5:15] += 0.5 * _click(10)
+    expected[12:22] += 0.5 * _click(10)
+    assert np.allclose(out, expected)
+    assert mixer.num_active_voices == 0
+
+
+def _scheduled_sounds(mixer):
+    sounds = [sound for command in mixer._commands for sound in command]
+    mixer._commands.clear()
+    return sounds
+
+
+def test_collision_sound_scheduler(pool_physics):
+    from poolvr.sound import CollisionSoundScheduler, collision_sound_volume, PAN_WIDTH
+    from poolvr.physics.events import BallSlidingEvent, BallCollisionEvent, RailCollisionEvent, CornerCollisionEvent
+    physics = pool_physics
+    mixer = Mixer(channels=1, samplerate=8000)
+    sample = mixer.add_sample(_click())
+    lookahead, latency, speed = 0.05, 0.02, 2.0
+    scheduler = CollisionSoundScheduler(mixer, sample, lookahead=lookahead, latency=latency)
+    # the break (ball and rail collisions), then a single ball sent into the jaw of a corner pocket:
+    ball_positions = physics.eval_positions(0.0)
+    r_c = ball_positions[0].copy()
+    r_c[2] += physics.ball_radius
+    physics.strike_ball(0.0, 0, ball_positions[0], r_c, np.array((-0.01, 0.0, -1.6)), 0.54)
+    break_events = physics.events
+    ball_positions[0,::2] = 0
+    physics.reset(balls_on_table=[0], ball_positions=ball_positions)
+    r_i = physics._r_cp[0,0] + physics.ball_radius * np.array([-np.cos(np.pi/18), 0.0, -np.sin(np.pi/18)])
+    v_0 = 3.0 * (r_i - ball_positions[0]) / np.linalg.norm(r_i - ball_positions[0])
+    physics.add_event_sequence(BallSlidingEvent(0, 0, r_0=ball_positions[0], v_0=v_0,
+                                                omega_0=np.zeros(3, dtype=np.float64)))
+    corner_events = physics.events
+    assert corner_events is not break_events
+    for events, collision_classes in ((break_events, (BallCollisionEvent, RailCollisionEvent)),
+                                      (corner_events, (CornerCollisionEvent,))):
+        collisions = [e for e in events if isinstance(e, (BallCollisionEvent, RailCollisionEvent, CornerCollisionEvent))]
+        assert all(any(isinstance(e, cls) for e in collisions) for cls in collision_classes)
+        # the game time advances by the lookahead (scaled by the speed) per update, as does the audio
+        # (at the mixer's frame): each collision is scheduled exactly once, by the update whose window contains it
+        sounds = []
+        t = 0.0
+        while t <= events[-1].t:
+            mixer.frame = int(t / speed * mixer.samplerate)
+            t_end = t + lookahead * speed
+            num_scheduled = scheduler.update(events, t, speed=speed)
+            scheduled = _scheduled_sounds(mixer)
+            assert num_scheduled == len(scheduled)
+            assert scheduler._next_event == len([e for e in events if e.t < t_end])
+            assert len(sounds) + num_scheduled == len([e for e in collisions if e.t < t_end])
+            sounds += scheduled
+            t = t_end
+        assert len(sounds) == len(collisions)
+        for e, (sound, gain, pan, start_frame) in zip(collisions, sounds):
+            assert sound == sample
+            assert abs(start_frame - (e.t / speed + latency) * mixer.samplerate) <= 2
+            if isinstance(e, BallCollisionEvent):
+                v_n, x, volume = e._v_ij_y0, e._r_i[0], 1.0
+            elif isinstance(e, RailCollisionEvent):
+                tau = e.t - e.e_i.t
+                v_n, x = e.e_i.eval_velocity(tau)[e._J_VAR[e.side]], e.e_i.eval_position(tau)[0]
+                volume = scheduler.RAIL_GAIN
+            else:
+                v_n, x, volume = np.dot(e.v_0, e.j_loc), e.r_i[0], scheduler.RAIL_GAIN
+            assert abs(gain - volume * collision_sound_volume(abs(v_n))) < 1e-9
+            assert abs(pan - x / PAN_WIDTH) < 1e-9
+    # once the list is replaced (or the scheduler is reset), scheduling restarts from its beginning:
+    collisions = [e for e in break_events if isinstance(e, (BallCollisionEvent, RailCollisionEvent))]
+    t = collisions[0].t
+    num_collisions = len([e for e in collisions if e.t < t + lookahead * speed])
+    for _ in range(2):
+        assert scheduler.update(break_events, t, speed=speed) == num_collisions
+        assert len(_scheduled_sounds(mixer)) == num_collisions
+        assert scheduler.update(break_events, t, speed=speed) == 0
+        scheduler.reset()
@@ -0,0 +1,163 @@
+import numpy as np
+
+
+STEREO_VS_SRC = """#version 120
+#include <frame_data>
+uniform mat4 u_modelview;
+attribute vec3 a_position;
+attribute vec3 a_translate;
+void main(void) {
+  int eye = stereo_eye();
+  gl_Position = u_eye_projections[eye] * (u_eye_transforms[eye] * u_modelview * vec4(a_position + a_translate, 1.0));
+}
+"""
+MONO_VS_SRC = """#version 120
+attribute vec3 a_position;
+uniform mat4 u_modelview;
+uniform mat4 u_projection;
+void main(void) {
+  gl_Position = u_projection * u_modelview * vec4(a_position, 1.0);
+}
+"""
+FS_SRC = """#version 120
+uniform vec4 u_color;
+void main(void) {
+  gl_FragColor = u_color;
+}
+"""
+EYE_SIZE = (64, 32)
+
+
+def _translation(x, y, z):
+    matrix = np.eye(4, dtype=np.float32)
+    matrix[3,:3] = x, y, z
+    return matrix
+
+
+def _quad(size, **attributes):
+    # (a QuadPrimitive shares its index buffer between instances, and so between GL contexts)
+    import OpenGL.GL as gl
+    from poolvr.gl_rendering import Primitive
+    vertices = 0.5 * size * np.array([[-1.0, -1.0, 0.0], [1.0, -1.0, 0.0],
+                                      [1.0, 1.0, 0.0], [-1.0, 1.0, 0.0]], dtype=np.float32)
+    return Primitive(gl.GL_TRIANGLES, indices=np.array([0, 1, 2, 0, 2, 3], dtype=np.uint16),
+                     a_position=vertices, **attributes)
+
+
+def _fake_stereo_frame_data():
+    # a fake two-eye renderer: eyes offset by +/-1/8 along the x axis of the head,
+    # with different (exactly representable) projections:
+    from poolvr.gl_rendering import calc_projection_matrix
+    head_view = _translation(0.0, -0.25, -2.0)
+    eye_transforms = (_translation(0.125, 0.0, 0.0), _translation(-0.125, 0.0, 0.0))
+    projections = (calc_projection_matrix(np.pi/2, 2.0, 0.5, 8.0).T,
+                   calc_projection_matrix(np.pi/2, 2.0, 0.5, 8.0).T)
+    projections[1][2,0] = 0.125
+    w, h = EYE_SIZE
+    return {'stereo': True,
+            'view_matrix': head_view,
+            'projection_matrix': projections[0],
+            'eye_transforms': eye_transforms,
+            'eye_matrices': [head_view.dot(eye_transform) for eye_transform in eye_transforms],
+            'camera_matrices': [np.linalg.inv(head_view.dot(eye_transform)) for eye_transform in eye_transforms],
+            'projection_matrices': projections,
+            'projection_lrbts': (np.zeros(4, dtype=np.float32), np.zeros(4, dtype=np.float32)),
+            'eye_viewports': ((0, 0, w, h), (w, 0, w, h)),
+            'window_size': np.array(EYE_SIZE, dtype=np.float32),
+            'znear': 0.5, 'zfar': 8.0}
+
+
+def test_std140_arrays():
+    import OpenGL.GL as gl
+    from poolvr.gl_rendering import std140_dtype, FrameUniformBuffer
+    dtype = std140_dtype(FrameUniformBuffer.FIELDS)
+    assert [dtype.fields[name][1] for name in ('u_stereo', 'u_eye_transforms', 'u_eye_projections')] == [224, 240, 368]
+    assert dtype.itemsize == 496
+    assert dtype.fields['u_eye_transforms'][0].shape == (2, 4, 4)
+    try:
+        std140_dtype([('a', gl.GL_FLOAT, 4)])
+        assert False, 'std140 arrays of floats should be rejected'
+    except ValueError:
+        pass
+
+
+def test_frame_data_include():
+    from poolvr.gl_rendering import Program, FrameUniformBuffer, FRAME_UNIFORM_BLOCK
+    program = Program(STEREO_VS_SRC, FS_SRC)
+    assert '#include' not in program.vs_src and program.vs_src.startswith('#version 120\n#extension ')
+    assert program.uniform_blocks == [FRAME_UNIFORM_BLOCK] and program.supports_stereo
+    # the block declares the fields of the buffer, in order:
+    block = program.vs_src[program.vs_src.index('uniform %s {' % FRAME_UNIFORM_BLOCK):program.vs_src.index('};')]
+    assert [line.split()[1].rstrip(';').split('[')[0] for line in block.splitlines()[1:]] \
+        == [field[0] for field in FrameUniformBuffer.FIELDS]
+    assert 'mat4 u_eye_transforms[2];' in block
+
+
+def test_single_pass_stereo(gl_context):
+    import OpenGL.GL as gl
+    from poolvr.gl_rendering import (Program, Technique, Material, Mesh, RenderQueue,
+                                     single_pass_stereo_supported)
+    assert single_pass_stereo_supported()
+    stereo_technique = Technique(Program(STEREO_VS_SRC, FS_SRC), attribute_divisors={'a_translate': 1})
+    mono_technique = Technique(Program(MONO_VS_SRC, FS_SRC))
+    assert stereo_technique.program.supports_stereo and not mono_technique.program.supports_stereo
+    plane = _quad(1.0, a_translate=np.zeros((1,3), dtype=np.float32))
+    quad = _quad(0.2, a_translate=np.array([[-0.5, 0.25, 0.125], [0.25, 0.25, 0.25], [0.5, 0.5, -0.5]],
+                                           dtype=np.float32),
+                 num_instances=3)
+    marker = _quad(0.25)
+    meshes = [Mesh({Material(stereo_technique, values={'u_color': [1.0, 0.0, 0.0, 1.0]}): [plane],
+                    Material(stereo_technique, values={'u_color': [0.0, 1.0, 0.0, 1.0]}): [quad]}),
+              Mesh({Material(mono_technique, values={'u_color': [0.0, 0.0, 1.0, 1.0]}): [marker]},
+                   matrix=_translation(0.0, 0.5, 0.25))]
+    for mesh in meshes:
+        mesh.update_world_matrices()
+        mesh.init_gl()
+    w, h = EYE_SIZE
+    fbo = gl.glGenFramebuffers(1)
+    color, depth = gl.glGenRenderbuffers(2)
+    gl.glBindRenderbuffer(gl.GL_RENDERBUFFER, color)
+    gl.glRenderbufferStorage(gl.GL_RENDERBUFFER, gl.GL_RGBA8, 2*w, h)
+    gl.glBindRenderbuffer(gl.GL_RENDERBUFFER, depth)
+    gl.glRenderbufferStorage(gl.GL_RENDERBUFFER, gl.GL_DEPTH_COMPONENT24, 2*w, h)
+    gl.glBindFramebuffer(gl.GL_FRAMEBUFFER, fbo)
+    gl.glFramebufferRenderbuffer(gl.GL_FRAMEBUFFER, gl.GL_COLOR_ATTACHMENT0, gl.GL_RENDERBUFFER, color)
+    gl.glFramebufferRenderbuffer(gl.GL_FRAMEBUFFER, gl.GL_DEPTH_ATTACHMENT, gl.GL_RENDERBUFFER, depth)
+    assert gl.glCheckFramebufferStatus(gl.GL_FRAMEBUFFER) == gl.GL_FRAMEBUFFER_COMPLETE
+    gl.glDisable(gl.GL_CULL_FACE)
+    frame_data = _fake_stereo_frame_data()
+    render_queue = RenderQueue()
+    render_queue.submit(meshes)
+    def read_pixels():
+        gl.glFinish()
+        pixels = gl.glReadPixels(0, 0, 2*w, h, gl.GL_RGBA, gl.GL_UNSIGNED_BYTE)
+        return np.frombuffer(pixels, dtype=np.uint8).reshape(h, 2*w, 4).copy()
+    try:
+        # reference: one pass for each eye
+        gl.glViewport(0, 0, 2*w, h)
+        gl.glClear(gl.GL_COLOR_BUFFER_BIT | gl.GL_DEPTH_BUFFER_BIT)
+        for eye, viewport in enumerate(frame_data['eye_viewports']):
+            gl.glViewport(*viewport)
+            render_queue.draw(**dict(frame_data, stereo=False,
+                                     view_matrix=frame_data['eye_matrices'][eye],
+                                     camera_matrix=frame_data['camera_matrices'][eye],
+                                     projection_matrix=frame_data['projection_matrices'][eye]))
+        two_pass = read_pixels()
+        render_queue.reset_stats()
+        gl.glViewport(0, 0, 2*w, h)
+        gl.glClear(gl.GL_COLOR_BUFFER_BIT | gl.GL_DEPTH_BUFFER_BIT)
+        render_queue.draw(**frame_data)
+        single_pass = read_pixels()
+        assert gl.glGetError() == gl.GL_NO_ERROR
+    finally:
+        gl.glBindFramebuffer(gl.GL_FRAMEBUFFER, 0)
+        gl.glDeleteFramebuffers(1, [fbo])
+        gl.glDeleteRenderbuffers(2, [color, depth])
+        gl.glViewport(0, 0, *(int(x) for x in gl_context.window_size))
+    # the stereo primitives are drawn with one draw call for both eyes, the other one with one per eye:
+    assert render_queue.stats['draw_calls'] == 2 + 2
+    for rgb in ([255, 0, 0], [0, 255, 0], [0, 0, 255]):
+        for half in (single_pass[:,:w], single_pass[:,w:]):
+            assert (half[...,:3] == rgb).all(axis=-1).any()
+    assert (single_pass[:,:w] != single_pass[:,w:]).any()
+    assert (single_pass == two_pass).all()
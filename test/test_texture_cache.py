@@ -0,0 +1,30 @@
+import os.path
+import numpy as np
+
+
+from poolvr.texture_cache import calc_mip_chain, load_texture_levels
+
+
+def test_calc_mip_chain():
+    image = np.random.randint(0, 256, size=(64, 24, 4)).astype(np.ubyte)
+    levels = calc_mip_chain(image)
+    assert [level.shape[:2] for level in levels] == [(64, 24), (32, 12), (16, 6), (8, 3), (4, 1), (2, 1), (1, 1)]
+    assert all(level.dtype == np.ubyte for level in levels)
+    assert np.allclose(levels[1][0,0], image[:2,:2].reshape(-1,4).mean(axis=0), atol=1)
+
+
+def test_load_texture_levels(tmp_path, monkeypatch):
+    import PIL.Image as Image
+    monkeypatch.setenv('POOLVR_CACHE_DIR', str(tmp_path))
+    image = np.random.randint(0, 256, size=(32, 16, 3)).astype(np.ubyte)
+    uri = os.path.join(str(tmp_path), 'image.png')
+    Image.fromarray(image).save(uri)
+    levels = load_texture_levels(uri)
+    assert (levels[0] == image).all()
+    assert sorted(os.path.splitext(name)[1] for name in os.listdir(os.path.join(str(tmp_path), 'textures'))) \
+        == ['.json', '.npy']
+    cached_levels = load_texture_levels(uri)
+    assert isinstance(cached_levels[0].base, np.memmap)
+    assert len(cached_levels) == len(levels)
+    for level, cached_level in zip(levels, cached_levels):
+        assert (level == cached_level).all()
@@ -0,0 +1,37 @@
+import numpy as np
+
+
+from poolvr.vr_pose_sampler import PoseRingBuffer, estimate_point_velocity
+
+
+def test_pose_ring_buffer():
+    buffer = PoseRingBuffer(capacity=8, num_devices=2)
+    pose = np.zeros((2, 3, 4))
+    for k in range(12):
+        pose[:,:,3] = k
+        buffer.append(0.002*k, pose, np.zeros((2,3)), np.zeros((2,3)), [True, k % 2 == 0])
+    times, poses, _, _, valid = buffer.history()
+    assert len(times) == 8
+    assert (np.diff(times) > 0).all() and times[-1] == 0.002*11
+    assert (poses[:,0,0,3] == np.arange(4, 12)).all()
+    assert (valid[:,1] == (np.arange(4, 12) % 2 == 0)).all()
+    times, _, _, _, _ = buffer.history(duration=0.0045)
+    assert len(times) == 3
+    assert len(buffer.history(max_samples=5)[0]) == 5
+
+
+def test_estimate_point_velocity():
+    # an object rotating about the y-axis while translating along x:
+    omega, v = 2.0, np.array([0.5, 0.0, 0.0])
+    times = np.linspace(0.0, 0.03, 16)
+    world_matrices = np.zeros((len(times), 4, 4))
+    for world_matrix, t in zip(world_matrices, times):
+        c, s = np.cos(omega*t), np.sin(omega*t)
+        world_matrix[:3,:3] = [[c, 0, -s], [0, 1, 0], [s, 0, c]]
+        world_matrix[3,:3] = v * t
+        world_matrix[3,3] = 1
+    point = np.array([0.0, 0.0, 1.0])
+    r = point.dot(world_matrices[-1,:3,:3])
+    expected = v + np.cross([0.0, omega, 0.0], r)
+    assert np.allclose(estimate_point_velocity(times, world_matrices, point), expected, atol=1e-3)
+    assert estimate_point_velocity(times[:1], world_matrices[:1], point) is None